@@ -48,6 +48,13 @@ ClusterHealthRedUpgrade = (
 IndexCreationFailed = "failed to create {index} index - deferring index-requested event..."
 UserCreationFailed = "failed to create users for {rel_name} relation {id}"
 PluginConfigChangeError = "Failed to apply config changes on the plugin."
+TLSMinVersionInvalid = "Invalid tls_min_version: {}. Expected one of: TLSv1.2, TLSv1.3."
+PerformanceProfileInvalid = (
+    "Invalid performance_profile: {}. Expected one of: balanced, ingest-heavy, search-heavy."
+)
+MLDedicatedNodeMissing = (
+    "ml_dedicated_nodes is enabled but no node has the ml role without the data role."
+)
 
 CmVoRolesProvidedInvalid = (
     "cluster_manager and voting_only roles cannot be both set on the same nodes."
@@ -89,6 +96,7 @@ PluginConfigCheck = "Plugin configuration check."
 BackupSetupStart = "Backup setup started."
 BackupConfigureStart = "Configuring backup service..."
 BackupInDisabling = "Disabling backup service..."
+KnnWarmupProgress = "Warming up the k-NN graphs of {} ({}/{})..."
 
 # Relation Interfaces
 ClientRelationName = "opensearch-client"
@@ -100,6 +108,9 @@ COSUser = "monitor"
 COSRelationName = "cos-agent"
 COSRole = "readall_and_monitor"
 COSPort = "9200"
+PerformanceAnalyzerPort = 9600
+# seconds a k-NN warmup request is waited for, the warmup goes on in the background past it
+KnnWarmupTimeout = 300
 GeneratedRoles = ["data", "ingest", "ml", "cluster_manager"]
 
 
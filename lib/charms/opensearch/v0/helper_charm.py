@@ -29,7 +29,7 @@ LIBAPI = 0
 
 # Increment this PATCH version before using `charmcraft publish-lib` or reset
 # to 0 if you are raising the major API version
-LIBPATCH = 1
+LIBPATCH = 3
 
 
 logger = logging.getLogger(__name__)
@@ -65,7 +65,11 @@ class Status:
             condition = context.status.message.endswith(status_message)
         elif pattern == Status.CheckPattern.Interpolated:
             condition = (
-                re.fullmatch(status_message.replace("{}", "(?s:.*?)"), status_message) is not None
+                re.fullmatch(
+                    re.escape(status_message).replace(re.escape("{}"), "(?s:.*?)"),
+                    context.status.message,
+                )
+                is not None
             )
         else:
             condition = status_message in context.status.message
@@ -129,6 +133,16 @@ def relation_departure_reason(charm: CharmBase, relation_name: str) -> RelDepart
     return RelDepartureReason.REL_BROKEN
 
 
+def dying_units(charm: CharmBase) -> List[str]:
+    """Names of the units of the current app being removed, as reported by the goal state."""
+    goal_state = charm.model._backend._run("goal-state", return_output=True, use_json=True)
+    return [
+        unit
+        for unit, unit_data in goal_state.get("units", {}).items()
+        if unit_data["status"] == "dying"
+    ]
+
+
 def format_unit_name(unit: Union[Unit, str], app: App) -> str:
     """Format unit_name according the app."""
     if isinstance(unit, Unit):
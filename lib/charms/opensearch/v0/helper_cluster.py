@@ -20,7 +20,7 @@ LIBAPI = 0
 
 # Increment this PATCH version before using `charmcraft publish-lib` or reset
 # to 0 if you are raising the major API version
-LIBPATCH = 1
+LIBPATCH = 2
 
 
 logger = logging.getLogger(__name__)
@@ -51,16 +51,54 @@ class ClusterTopology:
         host: Optional[str] = None,
         alt_hosts: Optional[List[str]] = None,
         include_defaults: bool = False,
+        keys: Optional[List[str]] = None,
     ) -> Dict[str, any]:
-        """Get the cluster settings."""
+        """Get the cluster settings.
+
+        Args:
+            opensearch: the opensearch distribution to query
+            host: the host to query, the current node by default
+            alt_hosts: the hosts to fall back to
+            include_defaults: whether to include the default and node (opensearch.yml) settings
+            keys: the (flat) settings to fetch, through a filter_path, all of them if not set
+        """
+        scopes = ["defaults", "persistent", "transient"]
+        if not keys:
+            settings = opensearch.request(
+                "GET",
+                f"/_cluster/settings?flat_settings=true&include_defaults={str(include_defaults).lower()}",
+                host=host,
+                alt_hosts=alt_hosts,
+            )
+            return dict(
+                settings.get("defaults", {}) | settings["persistent"] | settings["transient"]
+            )
+
+        # filter_path does not apply to the dotted names of flat settings: query them nested
+        filter_path = ",".join(f"{scope}.{key}" for scope in scopes for key in keys)
         settings = opensearch.request(
             "GET",
-            f"/_cluster/settings?flat_settings=true&include_defaults={str(include_defaults).lower()}",
+            f"/_cluster/settings?include_defaults={str(include_defaults).lower()}"
+            f"&filter_path={filter_path}",
             host=host,
             alt_hosts=alt_hosts,
         )
 
-        return dict(settings["defaults"] | settings["persistent"] | settings["transient"])
+        result = {}
+        for scope in scopes:
+            result |= ClusterTopology._flatten_settings(settings.get(scope, {}))
+        return {key: val for key, val in result.items() if key in keys}
+
+    @staticmethod
+    def _flatten_settings(settings: Dict[str, any], prefix: str = "") -> Dict[str, any]:
+        """Flatten nested settings into dotted names, as returned with flat_settings."""
+        result = {}
+        for key, val in settings.items():
+            if isinstance(val, dict):
+                result |= ClusterTopology._flatten_settings(val, prefix=f"{prefix}{key}.")
+            else:
+                result[f"{prefix}{key}"] = val
+        return result
 
     @staticmethod
     def recompute_nodes_conf(app_id: str, nodes: List[Node]) -> Dict[str, Node]:
@@ -85,6 +123,7 @@ class ClusterTopology:
                 app=node.app,
                 unit_number=node.unit_number,
                 temperature=node.temperature,
+                zone=node.zone,
             )
         logger.debug(
             f"Roles after re-balancing {({name: node.roles for name, node in nodes_by_name.items()})=}"
@@ -184,6 +223,7 @@ class ClusterTopology:
                         app=App(id=obj["attributes"]["app_id"]),
                         unit_number=int(obj["name"].split(".")[0].split("-")[-1]),
                         temperature=obj.get("attributes", {}).get("temp"),
+                        zone=obj.get("attributes", {}).get("zone"),
                     )
                     nodes.append(node)
         return nodes
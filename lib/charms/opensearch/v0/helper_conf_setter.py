@@ -25,7 +25,7 @@ LIBAPI = 0
 
 # Increment this PATCH version before using `charmcraft publish-lib` or reset
 # to 0 if you are raising the major API version
-LIBPATCH = 1
+LIBPATCH = 2
 
 
 logger = logging.getLogger(__name__)
@@ -138,7 +138,7 @@ class ConfigSetter(ABC):
             config_file (str): Path to the source config file
             old_val (str): The value we wish to replace
             new_val (any): The new value to replace old_val
-            regex (bool): Whether to treat old_val as a regex.
+            regex (bool): Whether to treat old_val as a (multiline) regex.
             add_line_if_missing (bool): whether to append the new_val if old_val is not found.
             output_type (OutputType): The type of output we're expecting from this operation,
                 i.e, set OutputType.all to have the output on both the console and target file
@@ -265,7 +265,7 @@ class YamlConfigSetter(ConfigSetter):
             config_file (str): Path to the source config file
             old_val (str): The value we wish to replace
             new_val (any): The new value to replace old_val
-            regex (bool): Whether to treat old_val as a regex.
+            regex (bool): Whether to treat old_val as a (multiline) regex.
             add_line_if_missing (bool): whether to append the new_val if old_val is not found.
             output_type (OutputType): The type of output we're expecting from this operation,
                 i.e, set OutputType.all to have the output on both the console and target file
@@ -279,12 +279,12 @@ class YamlConfigSetter(ConfigSetter):
         with open(path, "r+") as f:
             data = f.read()
 
-            if regex and old_val and re.compile(old_val).match(data):
-                data = re.sub(r"{}".format(old_val), f"{new_val}", data)
-            elif old_val and old_val in data:
+            if regex and old_val and re.search(old_val, data, flags=re.MULTILINE):
+                data = re.sub(old_val, f"{new_val}", data, flags=re.MULTILINE)
+            elif not regex and old_val and old_val in data:
                 data = data.replace(old_val, new_val)
             elif add_line_if_missing:
-                data += f"{data.rstrip()}\n{new_val}\n"
+                data = f"{data.rstrip()}\n{new_val}\n"
 
             if output_type in [OutputType.console, OutputType.all]:
                 logger.info(data)
@@ -293,6 +293,7 @@ class YamlConfigSetter(ConfigSetter):
                 if output_file is None or output_file == config_file:
                     f.seek(0)
                     f.write(data)
+                    f.truncate()
                 else:
                     with open(output_file, "w") as g:
                         g.write(data)
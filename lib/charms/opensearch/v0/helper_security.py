@@ -2,17 +2,18 @@
 # See LICENSE file for licensing details.
 
 """Helpers for security related operations, such as password generation etc."""
+import hashlib
+import hmac
 import math
-import os
 import secrets
 import string
-import subprocess
-import tempfile
 from datetime import datetime
-from typing import Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 
 import bcrypt
 from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.serialization import pkcs12
 
 # The unique Charmhub library identifier, never change it
 LIBID = "224ce9884b0d47b997357fec522f11c7"
@@ -22,7 +23,7 @@ LIBAPI = 0
 
 # Increment this PATCH version before using `charmcraft publish-lib` or reset
 # to 0 if you are raising the major API version
-LIBPATCH = 1
+LIBPATCH = 3
 
 
 def hash_string(string: str) -> str:
@@ -78,42 +79,166 @@ def rfc2253_tls_subject(subject: string) -> str:
 
 
 def to_pkcs8(private_key: str, password: Optional[str] = None) -> str:
-    """Convert a PEM key to PKCS8."""
-    command = """openssl pkcs8 \
-        -inform PEM \
-        -outform PEM \
-        -in {tmp_key_filename} \
-        -topk8 \
-        -v1 PBE-SHA1-3DES \
-        -passout pass:"{password}" \
-        -passin pass:"{password}" \
-        -out {tmp_pkcs8_key_filename}"""
-    if password is None:
-        password = ""
-        command = f"{command} -nocrypt"
-
-    tmp_key = tempfile.NamedTemporaryFile(delete=False)
-    tmp_pkcs8_key = tempfile.NamedTemporaryFile(delete=False)
-
-    try:
-        with open(tmp_key.name, "w") as f:
-            f.write(private_key)
-
-        subprocess.run(
-            command.format(
-                password=password,
-                tmp_key_filename=tmp_key.name,
-                tmp_pkcs8_key_filename=tmp_pkcs8_key.name,
-            ),
-            shell=True,
-            text=True,
-            check=True,
-            encoding="utf-8",
-            env=os.environ,
+    """Convert a PEM key to PKCS8, encrypted with the password of the key if any."""
+    pwd = password.encode() if password else None
+    key = serialization.load_pem_private_key(private_key.encode(), password=pwd)
+    return key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=(
+            serialization.BestAvailableEncryption(pwd) if pwd else serialization.NoEncryption()
+        ),
+    ).decode()
+
+
+def pkcs12_keystore(
+    alias: str, key: str, cert: str, password: str, key_password: Optional[str] = None
+) -> bytes:
+    """Build a PKCS12 keystore holding a PEM key and its certificate (chain) under an alias.
+
+    Raises:
+        ValueError if the key or the certificate cannot be parsed.
+    """
+    private_key = serialization.load_pem_private_key(
+        key.encode(), password=key_password.encode() if key_password else None
+    )
+    certs = x509.load_pem_x509_certificates(cert.encode())
+    return pkcs12.serialize_key_and_certificates(
+        name=alias.encode(),
+        key=private_key,
+        cert=certs[0],
+        cas=certs[1:] or None,
+        encryption_algorithm=serialization.PrivateFormat.PKCS12.encryption_builder()
+        .kdf_rounds(PKCS12_ITERATIONS)
+        .key_cert_algorithm(pkcs12.PBES.PBESv2SHA256AndAES256CBC)
+        .hmac_hash(hashes.SHA256())
+        .build(password.encode()),
+    )
+
+
+def pkcs12_truststore(certificates: Dict[str, str], password: str) -> bytes:
+    """Build a PKCS12 truststore holding PEM certificates under their alias.
+
+    The certificates are flagged as trusted for any usage, the same way keytool does: the JDK
+    ignores the certificates of a PKCS12 store without this flag, which neither OpenSSL nor
+    cryptography set. The store is integrity protected with the password (HMAC-SHA256).
+
+    Raises:
+        ValueError if a certificate cannot be parsed.
+    """
+    bags = []
+    for alias, cert in certificates.items():
+        der = x509.load_pem_x509_certificate(cert.encode()).public_bytes(
+            serialization.Encoding.DER
+        )
+        # the attributes are written in the order of keytool, not sorted
+        attributes = _der(
+            0x31,
+            _der_seq(_der_oid(_OID_FRIENDLY_NAME), _der_set(_der(0x1E, alias.encode("utf-16-be"))))
+            + _der_seq(_der_oid(_OID_JDK_TRUSTED_USAGE), _der_set(_der_oid(_OID_ANY_USAGE))),
         )
+        cert_bag = _der_seq(_der_oid(_OID_X509_CERT), _der(0xA0, _der(0x04, der)))
+        bags.append(_der_seq(_der_oid(_OID_CERT_BAG), _der(0xA0, cert_bag), attributes))
+
+    safe_contents = _der_seq(*bags)
+    auth_safe = _der_seq(_der_seq(_der_oid(_OID_DATA), _der(0xA0, _der(0x04, safe_contents))))
+
+    salt = secrets.token_bytes(16)
+    mac_key = _pkcs12_mac_key(password, salt, PKCS12_ITERATIONS)
+    mac = hmac.new(mac_key, auth_safe, hashlib.sha256).digest()
+    mac_data = _der_seq(
+        _der_seq(_der_seq(_der_oid(_OID_SHA256), b"\x05\x00"), _der(0x04, mac)),
+        _der(0x04, salt),
+        _der_int(PKCS12_ITERATIONS),
+    )
+    return _der_seq(
+        _der_int(3),
+        _der_seq(_der_oid(_OID_DATA), _der(0xA0, _der(0x04, auth_safe))),
+        mac_data,
+    )
+
+
+def pkcs12_certificates(store: bytes, password: str) -> Dict[str, str]:
+    """Returns the PEM certificates of a PKCS12 store (keystore or truststore) by alias.
+
+    Raises:
+        ValueError if the store cannot be read with the password.
+    """
+    content = pkcs12.load_pkcs12(store, password.encode())
+    certs = ([content.cert] if content.cert else []) + content.additional_certs
+    return {
+        cert.friendly_name.decode(): cert.certificate.public_bytes(
+            serialization.Encoding.PEM
+        ).decode()
+        for cert in certs
+        if cert.friendly_name
+    }
+
+
+def cert_issuer(cert: str) -> x509.Name:
+    """Returns the issuer of a PEM certificate."""
+    return x509.load_pem_x509_certificate(cert.encode()).issuer
+
+
+# iterations of the key derivations of the PKCS12 stores, same as the JDK
+PKCS12_ITERATIONS = 10000
+
+_OID_DATA = "1.2.840.113549.1.7.1"
+_OID_CERT_BAG = "1.2.840.113549.1.12.10.1.3"
+_OID_X509_CERT = "1.2.840.113549.1.9.22.1"
+_OID_FRIENDLY_NAME = "1.2.840.113549.1.9.20"
+_OID_JDK_TRUSTED_USAGE = "2.16.840.1.113894.746875.1.1"
+_OID_ANY_USAGE = "2.5.29.37.0"
+_OID_SHA256 = "2.16.840.1.101.3.4.2.1"
+
+
+def _der(tag: int, content: bytes) -> bytes:
+    """DER encoding of a value, given its tag and encoded content."""
+    if len(content) < 0x80:
+        return bytes([tag, len(content)]) + content
+    size = len(content).to_bytes((len(content).bit_length() + 7) // 8, "big")
+    return bytes([tag, 0x80 | len(size)]) + size + content
 
-        with open(tmp_pkcs8_key.name, "r") as f:
-            return f.read()
-    finally:
-        os.unlink(tmp_key.name)
-        os.unlink(tmp_pkcs8_key.name)
+
+def _der_seq(*items: bytes) -> bytes:
+    return _der(0x30, b"".join(items))
+
+
+def _der_set(*items: bytes) -> bytes:
+    # the elements of a DER SET OF are sorted by their encoding
+    return _der(0x31, b"".join(sorted(items)))
+
+
+def _der_int(value: int) -> bytes:
+    return _der(0x02, value.to_bytes(value.bit_length() // 8 + 1, "big"))
+
+
+def _der_oid(oid: str) -> bytes:
+    arcs = [int(arc) for arc in oid.split(".")]
+    content = bytearray()
+    for arc in [40 * arcs[0] + arcs[1]] + arcs[2:]:
+        chunk: List[int] = [arc & 0x7F]
+        while arc := arc >> 7:
+            chunk.insert(0, 0x80 | (arc & 0x7F))
+        content.extend(chunk)
+    return _der(0x06, bytes(content))
+
+
+def _pkcs12_mac_key(password: str, salt: bytes, iterations: int) -> bytes:
+    """Derive the SHA256 MAC key of a PKCS12 store from its password (RFC 7292, Appendix B).
+
+    The key is as long as a SHA256 digest, so a single round of the derivation is needed.
+    """
+    block_size = 64
+
+    def fill(data: bytes) -> bytes:
+        # repeat the data up to the next multiple of the block size
+        size = block_size * -(-len(data) // block_size)
+        return (data * -(-size // len(data)))[:size] if data else b""
+
+    pwd = password.encode("utf-16-be") + b"\x00\x00"
+    # diversifier 3: MAC key
+    digest = bytes([3]) * block_size + fill(salt) + fill(pwd)
+    for _ in range(iterations):
+        digest = hashlib.sha256(digest).digest()
+    return digest
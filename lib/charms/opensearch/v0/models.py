@@ -121,6 +121,7 @@ class Node(Model):
     app: App
     unit_number: int
     temperature: Optional[str] = None
+    zone: Optional[str] = None
 
     @classmethod
     @validator("roles")
@@ -160,6 +161,14 @@ class StartMode(BaseStrEnum):
     WITH_GENERATED_ROLES = "start-with-generated-roles"
 
 
+class PerformanceProfile(BaseStrEnum):
+    """Workload the nodes of the deployment are tuned for."""
+
+    BALANCED = "balanced"
+    INGEST_HEAVY = "ingest-heavy"
+    SEARCH_HEAVY = "search-heavy"
+
+
 class Directive(BaseStrEnum):
     """Directive indicating what the pending actions for the current deployments are."""
 
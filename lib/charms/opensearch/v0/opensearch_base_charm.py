@@ -3,7 +3,9 @@
 
 """Base class for the OpenSearch Operators."""
 import abc
+import json
 import logging
+import os
 import random
 import typing
 from datetime import datetime
@@ -21,11 +23,16 @@ from charms.opensearch.v0.constants_charm import (
     COSPort,
     COSRelationName,
     COSUser,
+    KnnWarmupProgress,
+    KnnWarmupTimeout,
+    MLDedicatedNodeMissing,
     OpenSearchSystemUsers,
     OpenSearchUsers,
     PClusterNoDataNode,
     PeerClusterRelationName,
     PeerRelationName,
+    PerformanceAnalyzerPort,
+    PerformanceProfileInvalid,
     PluginConfigChangeError,
     PluginConfigCheck,
     RequestUnitServiceOps,
@@ -34,6 +41,7 @@ from charms.opensearch.v0.constants_charm import (
     ServiceStartError,
     ServiceStopped,
     TLSCaRotation,
+    TLSMinVersionInvalid,
     TLSNewCertsRequested,
     TLSNotFullyConfigured,
     TLSRelationBrokenError,
@@ -49,7 +57,11 @@ from charms.opensearch.v0.helper_security import (
     generate_hashed_password,
     generate_password,
 )
-from charms.opensearch.v0.models import DeploymentDescription, DeploymentType
+from charms.opensearch.v0.models import (
+    DeploymentDescription,
+    DeploymentType,
+    PerformanceProfile,
+)
 from charms.opensearch.v0.opensearch_backups import backup
 from charms.opensearch.v0.opensearch_config import OpenSearchConfig
 from charms.opensearch.v0.opensearch_distro import OpenSearchDistribution
@@ -231,6 +243,7 @@ class OpenSearchBaseCharm(CharmBase, abc.ABC):
 
         self.framework.observe(self.on.set_password_action, self._on_set_password_action)
         self.framework.observe(self.on.get_password_action, self._on_get_password_action)
+        self.framework.observe(self.on.get_top_queries_action, self._on_get_top_queries_action)
 
         self.cos_integration = COSAgentProvider(
             self,
@@ -546,6 +559,8 @@ class OpenSearchBaseCharm(CharmBase, abc.ABC):
         # Closes canonical/opensearch-operator#378
         if self.app.planned_units() > 1 and not self.node_lock.acquired:
             # Raise uncaught exception to prevent Juju from removing unit
+            # The place of the unit in the lock queue is kept, as its ticket was taken when
+            # departing the lock relation (the changes of this hook are rolled back)
             raise Exception("Unable to acquire lock: Another unit is starting or stopping.")
 
         # if the leader is departing, and this hook fails "leader elected" won"t trigger,
@@ -570,6 +585,14 @@ class OpenSearchBaseCharm(CharmBase, abc.ABC):
                 # if it's a failed attempt we move on
                 pass
         try:
+            if self.app.planned_units() > 0 and self.opensearch.is_node_up():
+                # drain all the departing nodes at once, the relocation of their shards is
+                # then awaited a single time when stopping the first of them
+                try:
+                    self.opensearch_exclusions.add_departing(self._get_nodes(True))
+                except OpenSearchHttpError:
+                    logger.debug("Failed to get online nodes, departing nodes not excluded")
+
             self._stop_opensearch()
             if self.alt_hosts:
                 # There is enough peers available for us to try removing the unit
@@ -627,6 +650,8 @@ class OpenSearchBaseCharm(CharmBase, abc.ABC):
             if health == HealthColors.UNKNOWN:
                 return
 
+            self._check_ml_dedicated_nodes()
+
         for relation in self.model.relations.get(ClientRelationName, []):
             self.opensearch_provider.update_endpoints(relation)
 
@@ -672,6 +697,28 @@ class OpenSearchBaseCharm(CharmBase, abc.ABC):
             # handle cluster change to main-orchestrator (i.e: init_hold: true -> false)
             self._handle_change_to_main_orchestrator_if_needed(event, previous_deployment_desc)
 
+        # resize the JVM heap if the memory available to the unit changed, apply the
+        # performance profile, TLS protocols, compression and ML thread pools: static settings,
+        # applied by restarting the node
+        restart_needed = False
+        if self.opensearch.is_started() and not self.upgrade_in_progress:
+            restart_needed = self.opensearch_config.set_jvm_heap_and_gc(
+                self.opensearch.memory_limit()
+            )
+            if profile := self._performance_profile():
+                restart_needed |= self.opensearch_config.set_performance_profile(profile)
+            if tls_min_version := self._tls_min_version():
+                restart_needed |= self.opensearch_config.set_tls_protocols(tls_min_version)
+            restart_needed |= self.opensearch_config.set_compression(
+                transport=self.config.get("transport_compression", False),
+                http=self.config.get("http_compression", True),
+            )
+            restart_needed |= self._set_performance_analyzer_conf()
+            restart_needed |= self._set_ml_node_conf()
+
+        if restart_needed:
+            self._restart_opensearch_event.emit()
+
         # todo: handle gracefully configuration setting at start of the charm
         if not self.plugin_manager.check_plugin_manager_ready():
             return
@@ -683,7 +730,7 @@ class OpenSearchBaseCharm(CharmBase, abc.ABC):
             if self.unit.is_leader():
                 self.status.set(MaintenanceStatus(PluginConfigCheck), app=True)
 
-            if self.plugin_manager.run():
+            if self.plugin_manager.run() and not restart_needed:
                 if self.upgrade_in_progress:
                     logger.warning(
                         "Changing config during an upgrade is not supported. The charm may be in a broken, "
@@ -708,6 +755,7 @@ class OpenSearchBaseCharm(CharmBase, abc.ABC):
         if self.unit.is_leader():
             self.status.clear(PluginConfigCheck, app=True)
             self.status.clear(PluginConfigChangeError, app=True)
+            self._check_ml_dedicated_nodes()
 
     def _on_set_password_action(self, event: ActionEvent):
         """Set new admin password from user input or generate if not passed."""
@@ -773,6 +821,25 @@ class OpenSearchBaseCharm(CharmBase, abc.ABC):
             }
         )
 
+    def _on_get_top_queries_action(self, event: ActionEvent):
+        """Return the top queries of the current window, ranked by the requested metric."""
+        if not self.config.get("plugin_query_insights", False):
+            event.fail("The query-insights plugin is not enabled.")
+            return
+
+        if not self.opensearch.is_node_up():
+            event.fail("OpenSearch is not running on this unit.")
+            return
+
+        metric = event.params.get("metric")
+        try:
+            response = self.opensearch.request("GET", f"/_insights/top_queries?type={metric}")
+        except OpenSearchHttpError as e:
+            event.fail(f"Failed to fetch the top queries: {e.response_body}")
+            return
+
+        event.set_results({"top-queries": json.dumps(response.get("top_queries", []))})
+
     def on_tls_ca_rotation(self):
         """Called when adding new CA to the trust store."""
         self.status.set(MaintenanceStatus(TLSCaRotation))
@@ -800,6 +867,7 @@ class OpenSearchBaseCharm(CharmBase, abc.ABC):
                 cert_type,
                 truststore_pwd=truststore_pwd,
                 keystore_pwd=keystore_pwd,
+                tls_min_version=self._tls_min_version() or "TLSv1.2",
             )
 
             # write the admin cert conf on all units, in case there is a leader loss + cert renewal
@@ -977,6 +1045,16 @@ class OpenSearchBaseCharm(CharmBase, abc.ABC):
 
             # Set the configuration of the node
             self._set_node_conf(nodes)
+            self.opensearch_config.set_jvm_heap_and_gc(self.opensearch.memory_limit())
+
+            # sysfs settings do not persist across reboots, apply them before every start
+            self.peers_data.put_object(
+                Scope.UNIT,
+                "data_storage_tuning",
+                self.opensearch.tune_data_storage(
+                    tune=self.config.get("tune_data_storage", False)
+                ),
+            )
         except OpenSearchHttpError as e:
             logger.debug(f"error getting the nodes: {e}")
             self.node_lock.release()
@@ -1069,6 +1147,9 @@ class OpenSearchBaseCharm(CharmBase, abc.ABC):
         # Remove the exclusions that could not be removed when no units were online
         self.opensearch_exclusions.delete_current()
 
+        # load the k-NN graphs before other units restart, to not serve cold vector searches
+        self._warmup_knn_indices()
+
         self.node_lock.release()
 
         if event.after_upgrade:
@@ -1476,7 +1557,19 @@ class OpenSearchBaseCharm(CharmBase, abc.ABC):
             cm_ips=list(set(cm_ips)),
             contribute_to_bootstrap=contribute_to_bootstrap,
             node_temperature=deployment_desc.config.data_temperature,
+            zone=self.availability_zone,
+            processors=self.opensearch.cpu_limit(),
         )
+        if profile := self._performance_profile():
+            self.opensearch_config.set_performance_profile(profile)
+        if tls_min_version := self._tls_min_version():
+            self.opensearch_config.set_tls_protocols(tls_min_version)
+        self.opensearch_config.set_compression(
+            transport=self.config.get("transport_compression", False),
+            http=self.config.get("http_compression", True),
+        )
+        self._set_performance_analyzer_conf()
+        self._set_ml_node_conf()
 
     def _cleanup_bootstrap_conf_if_applies(self) -> None:
         """Remove some conf props in the CM nodes that contributed to the cluster bootstrapping."""
@@ -1577,6 +1670,7 @@ class OpenSearchBaseCharm(CharmBase, abc.ABC):
                     app=node.app,
                     unit_number=self.unit_id,
                     temperature=temperature,
+                    zone=node.zone,
                 )
 
             # TODO: remove this when we get rid of roles recomputing logic
@@ -1689,6 +1783,104 @@ class OpenSearchBaseCharm(CharmBase, abc.ABC):
         """Name of the current unit."""
         return format_unit_name(self.unit, app=self.opensearch_peer_cm.deployment_desc().app)
 
+    def _performance_profile(self) -> Optional[PerformanceProfile]:
+        """Performance profile set by the user, None (and blocked status) if invalid."""
+        profile = self.config.get("performance_profile", PerformanceProfile.BALANCED.value)
+        self.status.clear(PerformanceProfileInvalid, pattern=Status.CheckPattern.Interpolated)
+        try:
+            return PerformanceProfile(profile)
+        except ValueError:
+            self.status.set(BlockedStatus(PerformanceProfileInvalid.format(profile)))
+            return None
+
+    def _tls_min_version(self) -> Optional[str]:
+        """Minimum TLS version set by the user, None (and blocked status) if invalid."""
+        tls_min_version = self.config.get("tls_min_version", "TLSv1.2")
+        self.status.clear(TLSMinVersionInvalid, pattern=Status.CheckPattern.Interpolated)
+        if tls_min_version not in OpenSearchConfig.TLS_PROTOCOLS:
+            self.status.set(BlockedStatus(TLSMinVersionInvalid.format(tls_min_version)))
+            return None
+
+        return tls_min_version
+
+    def _set_performance_analyzer_conf(self) -> bool:
+        """Set the metrics port and storage limits of the Performance Analyzer, if enabled.
+
+        Returns:
+            Whether the settings changed, requiring a restart of the node to be applied.
+        """
+        if not self.config.get("plugin_opensearch_performance_analyzer", False):
+            self.unit.close_port("tcp", PerformanceAnalyzerPort)
+            return False
+
+        self.unit.open_port("tcp", PerformanceAnalyzerPort)
+        retention = self.config.get("performance_analyzer_metrics_retention", 7)
+        return self.opensearch_config.set_performance_analyzer(
+            port=PerformanceAnalyzerPort, retention=max(1, min(retention, 60))
+        )
+
+    def _set_ml_node_conf(self) -> bool:
+        """Size the ML Commons thread pools of the node, if dedicated to ML tasks.
+
+        Returns:
+            Whether the settings changed, requiring a restart of the node to be applied.
+        """
+        return self.opensearch_config.set_ml_thread_pools(
+            dedicated=self.config.get("ml_dedicated_nodes", False),
+            processors=self.opensearch.cpu_limit() or len(os.sched_getaffinity(0)),
+        )
+
+    def _check_ml_dedicated_nodes(self) -> None:
+        """Block the app if the ML tasks only run on dedicated ML nodes and there is none."""
+        if not self.config.get("ml_dedicated_nodes", False):
+            self.status.clear(MLDedicatedNodeMissing, app=True)
+            return
+
+        try:
+            if not (nodes := self._get_nodes(True)):
+                return
+        except OpenSearchHttpError:
+            return
+
+        if any("ml" in node.roles and not node.is_data() for node in nodes):
+            self.status.clear(MLDedicatedNodeMissing, app=True)
+        else:
+            self.status.set(BlockedStatus(MLDedicatedNodeMissing), app=True)
+
+    def _warmup_knn_indices(self) -> None:
+        """Load the k-NN graphs of the configured indices in memory, one index at a time.
+
+        A warmup that fails or outlasts the timeout does not block the start of the node:
+        the graphs left are then loaded by the first searches, or by the ongoing warmup.
+        """
+        indices = [
+            index.strip()
+            for index in self.config.get("knn_warmup_indices", "").split(",")
+            if index.strip()
+        ]
+        if not indices or not self.config.get("plugin_opensearch_knn", False):
+            return
+
+        for position, index in enumerate(indices, start=1):
+            self.status.set(
+                MaintenanceStatus(KnnWarmupProgress.format(index, position, len(indices)))
+            )
+            try:
+                response = self.opensearch.request(
+                    "GET", f"/_plugins/_knn/warmup/{index}", timeout=KnnWarmupTimeout
+                )
+                if failed := response.get("_shards", {}).get("failed"):
+                    logger.warning(f"k-NN warmup of {index} failed on {failed} shard(s).")
+            except OpenSearchHttpError as e:
+                logger.warning(f"k-NN warmup of {index} failed: {e}")
+
+        self.status.clear(KnnWarmupProgress, pattern=Status.CheckPattern.Interpolated)
+
+    @property
+    def availability_zone(self) -> Optional[str]:
+        """Availability zone of the current unit, if any."""
+        return os.environ.get("JUJU_AVAILABILITY_ZONE") or None
+
     @property
     def unit_id(self) -> int:
         """ID of the current unit."""
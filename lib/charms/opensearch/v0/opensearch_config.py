@@ -4,11 +4,12 @@
 """Class for Setting configuration in opensearch config files."""
 import logging
 from collections import namedtuple
+from os.path import exists
 from typing import Any, Dict, List, Optional
 
 from charms.opensearch.v0.constants_tls import CertType
 from charms.opensearch.v0.helper_security import normalized_tls_subject
-from charms.opensearch.v0.models import App
+from charms.opensearch.v0.models import App, PerformanceProfile
 from charms.opensearch.v0.opensearch_distro import OpenSearchDistribution
 
 # The unique Charmhub library identifier, never change it
@@ -19,7 +20,7 @@ LIBAPI = 0
 
 # Increment this PATCH version before using `charmcraft publish-lib` or reset
 # to 0 if you are raising the major API version
-LIBPATCH = 1
+LIBPATCH = 8
 
 logger = logging.getLogger(__name__)
 
@@ -30,6 +31,62 @@ class OpenSearchConfig:
     CONFIG_YML = "opensearch.yml"
     SECURITY_CONFIG_YML = "opensearch-security/config.yml"
     JVM_OPTIONS = "jvm.options"
+    PERFORMANCE_ANALYZER_PROPERTIES = (
+        "opensearch-performance-analyzer/performance-analyzer.properties"
+    )
+
+    # above ~32GB the JVM stops using compressed ordinary object pointers
+    JVM_HEAP_MAX_MB = 31 * 1024
+    JVM_HEAP_MIN_MB = 256
+    # below this heap size, G1 uses smaller regions and a lower reserve
+    JVM_SMALL_HEAP_MB = 8 * 1024
+
+    ML_THREAD_POOLS = [
+        "thread_pool.ml_commons.opensearch_ml_predict.size",
+        "thread_pool.ml_commons.opensearch_ml_train.size",
+    ]
+
+    # TLS 1.3 is always enabled, TLS 1.2 only accepted if set as minimum version
+    TLS_PROTOCOLS = {"TLSv1.2": ["TLSv1.3", "TLSv1.2"], "TLSv1.3": ["TLSv1.3"]}
+    # AEAD cipher suites with forward secrecy only
+    TLS_CIPHERS = {
+        "TLSv1.3": [
+            "TLS_AES_256_GCM_SHA384",
+            "TLS_AES_128_GCM_SHA256",
+            "TLS_CHACHA20_POLY1305_SHA256",
+        ],
+        "TLSv1.2": [
+            "TLS_ECDHE_ECDSA_WITH_AES_256_GCM_SHA384",
+            "TLS_ECDHE_RSA_WITH_AES_256_GCM_SHA384",
+            "TLS_ECDHE_ECDSA_WITH_AES_128_GCM_SHA256",
+            "TLS_ECDHE_RSA_WITH_AES_128_GCM_SHA256",
+            "TLS_ECDHE_ECDSA_WITH_CHACHA20_POLY1305_SHA256",
+            "TLS_ECDHE_RSA_WITH_CHACHA20_POLY1305_SHA256",
+        ],
+    }
+
+    # node settings of each performance profile: indexing buffer, thread pool queues,
+    # default refresh interval of the indices, fielddata and request caches
+    PERFORMANCE_PROFILES = {
+        # the defaults of OpenSearch, so that upgraded deployments keep their settings
+        PerformanceProfile.BALANCED: {},
+        PerformanceProfile.INGEST_HEAVY: {
+            "indices.memory.index_buffer_size": "20%",
+            "thread_pool.write.queue_size": 20000,
+            "thread_pool.search.queue_size": 500,
+            "cluster.default.index.refresh_interval": "30s",
+            "indices.fielddata.cache.size": "10%",
+            "indices.requests.cache.size": "1%",
+        },
+        PerformanceProfile.SEARCH_HEAVY: {
+            "indices.memory.index_buffer_size": "10%",
+            "thread_pool.write.queue_size": 10000,
+            "thread_pool.search.queue_size": 2000,
+            "cluster.default.index.refresh_interval": "1s",
+            "indices.fielddata.cache.size": "30%",
+            "indices.requests.cache.size": "2%",
+        },
+    }
 
     def __init__(self, opensearch: OpenSearchDistribution):
         self._opensearch = opensearch
@@ -64,11 +121,6 @@ class OpenSearchConfig:
             True,
         )
 
-        self._opensearch.config.append(
-            self.JVM_OPTIONS,
-            "-Djdk.tls.client.protocols=TLSv1.2",
-        )
-
     def set_admin_tls_conf(self, secrets: Dict[str, any]):
         """Configures the admin certificate."""
         self._opensearch.config.put(
@@ -77,7 +129,13 @@ class OpenSearchConfig:
             f"{normalized_tls_subject(secrets['subject'])}",
         )
 
-    def set_node_tls_conf(self, cert_type: CertType, truststore_pwd: str, keystore_pwd: str):
+    def set_node_tls_conf(
+        self,
+        cert_type: CertType,
+        truststore_pwd: str,
+        keystore_pwd: str,
+        tls_min_version: str = "TLSv1.2",
+    ):
         """Configures TLS for nodes."""
         target_conf_layer = "http" if cert_type == CertType.UNIT_HTTP else "transport"
 
@@ -107,12 +165,216 @@ class OpenSearchConfig:
                 pwd,
             )
 
-        self._opensearch.config.put(
-            self.CONFIG_YML,
-            f"plugins.security.ssl.{target_conf_layer}.enabled_protocols",
-            "TLSv1.2",
+        self.set_tls_protocols(tls_min_version, layers=[target_conf_layer])
+
+    def set_tls_protocols(
+        self, tls_min_version: str = "TLSv1.2", layers: Optional[List[str]] = None
+    ) -> bool:
+        """Set the TLS protocols and cipher suites of the node, TLS 1.3 being always enabled.
+
+        Args:
+            tls_min_version: "TLSv1.2" to accept TLS 1.2 and 1.3, "TLSv1.3" to only accept 1.3
+            layers: the layers to configure, "http" and "transport" by default
+
+        Returns:
+            Whether the settings changed, requiring a restart of the node to be applied.
+        """
+        protocols = self.TLS_PROTOCOLS[tls_min_version]
+        ciphers = self.TLS_CIPHERS["TLSv1.3"] + (
+            self.TLS_CIPHERS["TLSv1.2"] if "TLSv1.2" in protocols else []
         )
 
+        current = self.load_node()
+        changed = False
+        for layer in layers or ["http", "transport"]:
+            for key, val in [("enabled_protocols", protocols), ("enabled_ciphers", ciphers)]:
+                if current.get(f"plugins.security.ssl.{layer}.{key}") != val:
+                    self._opensearch.config.put(
+                        self.CONFIG_YML, f"plugins.security.ssl.{layer}.{key}", val
+                    )
+                    changed = True
+
+        # protocols of the TLS clients of the JVM, i.e: for snapshots repositories
+        self._opensearch.config.replace(
+            self.JVM_OPTIONS,
+            r"^-Djdk\.tls\.client\.protocols=\S*$",
+            f"-Djdk.tls.client.protocols={','.join(protocols)}",
+            regex=True,
+            add_line_if_missing=True,
+        )
+
+        return changed
+
+    @classmethod
+    def jvm_heap_mb(cls, memory: int) -> int:
+        """Size of the JVM heap of a node, in megabytes, given its memory in bytes."""
+        return min(max(memory // 2 // 1024**2, cls.JVM_HEAP_MIN_MB), cls.JVM_HEAP_MAX_MB)
+
+    def set_jvm_heap_and_gc(self, memory: int) -> bool:
+        """Size the JVM heap and tune the G1 garbage collector after the memory of the node.
+
+        The heap gets half of the memory, the other half being left to the filesystem cache,
+        and stays below the compressed oops threshold. Heaps smaller than 8GB use smaller
+        G1 regions and a lower G1 reserve.
+
+        Args:
+            memory: the memory available to the node, in bytes
+
+        Returns:
+            Whether the JVM options changed, requiring a restart of the node to be applied.
+        """
+        heap_mb = self.jvm_heap_mb(memory)
+        small_heap = heap_mb < self.JVM_SMALL_HEAP_MB
+
+        options = {
+            r"^-Xms\S+$": f"-Xms{heap_mb}m",
+            r"^-Xmx\S+$": f"-Xmx{heap_mb}m",
+            r"^(\d+-\d*:)?-XX:G1ReservePercent=\d+$": (
+                f"11-:-XX:G1ReservePercent={15 if small_heap else 25}"
+            ),
+            r"^(\d+-\d*:)?-XX:InitiatingHeapOccupancyPercent=\d+$": (
+                "11-:-XX:InitiatingHeapOccupancyPercent=30"
+            ),
+            r"^(\d+-\d*:)?-XX:G1HeapRegionSize=\S+$": (
+                "11-:-XX:G1HeapRegionSize=4m" if small_heap else None
+            ),
+        }
+
+        jvm_options = f"{self._opensearch.config.base_path}{self.JVM_OPTIONS}"
+        with open(jvm_options) as f:
+            current = f.read()
+
+        for pattern, option in options.items():
+            if option is None:
+                self._opensearch.config.replace(self.JVM_OPTIONS, f"{pattern}\n?", "", regex=True)
+                continue
+
+            self._opensearch.config.replace(
+                self.JVM_OPTIONS, pattern, option, regex=True, add_line_if_missing=True
+            )
+
+        with open(jvm_options) as f:
+            return f.read() != current
+
+    def set_performance_profile(self, profile: PerformanceProfile) -> bool:
+        """Set the node settings matching the workload the node is tuned for.
+
+        The settings of the other profiles that the profile does not set are removed, to fall
+        back on the defaults of OpenSearch.
+
+        Returns:
+            Whether the settings changed, requiring a restart of the node to be applied.
+        """
+        current = self.load_node()
+        settings = self.PERFORMANCE_PROFILES[profile]
+        keys = {
+            key
+            for profile_settings in self.PERFORMANCE_PROFILES.values()
+            for key in profile_settings
+        }
+        changed = False
+        for key in sorted(keys):
+            if current.get(key) == (val := settings.get(key)):
+                continue
+            if val is None:
+                self._opensearch.config.delete(self.CONFIG_YML, key)
+            else:
+                self._opensearch.config.put(self.CONFIG_YML, key, val)
+            changed = True
+
+        return changed
+
+    def set_compression(self, transport: bool, http: bool) -> bool:
+        """Set the compression of the transport and HTTP layers of the node.
+
+        Both are static settings in OpenSearch (node scope), there is no dynamic equivalent.
+
+        Returns:
+            Whether the settings changed, requiring a restart of the node to be applied.
+        """
+        current = self.load_node()
+        changed = False
+        for key, val in [("transport.compress", transport), ("http.compression", http)]:
+            if current.get(key) != val:
+                self._opensearch.config.put(self.CONFIG_YML, key, val)
+                changed = True
+
+        return changed
+
+    def set_ml_thread_pools(self, dedicated: bool, processors: int) -> bool:
+        """Size the ML Commons thread pools of the node, if an ML node dedicated to ML tasks.
+
+        Model inference is CPU bound: the predict pool gets one thread per processor instead
+        of two, and the training pool half of the processors. Other nodes, including the ML
+        nodes also holding data, keep the defaults so as not to starve search and indexing.
+
+        Args:
+            dedicated: whether the ML tasks only run on the ML nodes
+            processors: the processors available to the node
+
+        Returns:
+            Whether the settings changed, requiring a restart of the node to be applied.
+        """
+        current = self.load_node()
+        sizes = {key: None for key in self.ML_THREAD_POOLS}
+        roles = current.get("node.roles", [])
+        if dedicated and "ml" in roles and not any(role.startswith("data") for role in roles):
+            sizes = {
+                "thread_pool.ml_commons.opensearch_ml_predict.size": processors,
+                "thread_pool.ml_commons.opensearch_ml_train.size": max(processors // 2, 1),
+            }
+
+        changed = False
+        for key, val in sizes.items():
+            if current.get(key) == val:
+                continue
+            if val is None:
+                self._opensearch.config.delete(self.CONFIG_YML, key)
+            else:
+                self._opensearch.config.put(self.CONFIG_YML, key, val)
+            changed = True
+
+        return changed
+
+    def set_performance_analyzer(self, port: int, retention: int) -> bool:
+        """Set the metrics port and the storage limits of the Performance Analyzer.
+
+        The metrics written to shared memory are purged every minute. The metrics databases on
+        disk are cleaned up once the batch metrics retention period has elapsed.
+
+        Args:
+            port: the port of the metrics API of the plugin
+            retention: the minutes of metrics databases kept for the batch metrics API
+
+        Returns:
+            Whether the settings changed, requiring a restart of the node to be applied.
+        """
+        path = f"{self._opensearch.config.base_path}{self.PERFORMANCE_ANALYZER_PROPERTIES}"
+        if not exists(path):
+            logger.warning(f"{path} not found, the performance analyzer is not installed.")
+            return False
+
+        with open(path) as f:
+            before = f.read()
+
+        for key, val in [
+            ("webservice-listener-port", port),
+            ("batch-metrics-retention-period-minutes", retention),
+            # purge the expired metrics every minute
+            ("metrics-deletion-interval", 1),
+            ("cleanup-metrics-db-files", "true"),
+        ]:
+            self._opensearch.config.replace(
+                self.PERFORMANCE_ANALYZER_PROPERTIES,
+                rf"^{key}\s*=.*$",
+                f"{key} = {val}",
+                regex=True,
+                add_line_if_missing=True,
+            )
+
+        with open(path) as f:
+            return f.read() != before
+
     def append_transport_node(self, ip_pattern_entries: List[str], append: bool = True):
         """Set the IP address of the new unit in nodes_dn."""
         if not append:
@@ -140,6 +402,8 @@ class OpenSearchConfig:
         cm_ips: List[str],
         contribute_to_bootstrap: bool,
         node_temperature: Optional[str] = None,
+        zone: Optional[str] = None,
+        processors: Optional[int] = None,
     ) -> None:
         """Set base config for each node in the cluster."""
         self._opensearch.config.put(self.CONFIG_YML, "cluster.name", cluster_name)
@@ -160,6 +424,18 @@ class OpenSearchConfig:
         else:
             self._opensearch.config.delete(self.CONFIG_YML, "node.attr.temp")
 
+        # availability zone of the unit, used to restart units of a same zone concurrently
+        if zone:
+            self._opensearch.config.put(self.CONFIG_YML, "node.attr.zone", zone)
+        else:
+            self._opensearch.config.delete(self.CONFIG_YML, "node.attr.zone")
+
+        # size the thread pools after the CPU quota of the unit, rather than the host's CPUs
+        if processors:
+            self._opensearch.config.put(self.CONFIG_YML, "node.processors", processors)
+        else:
+            self._opensearch.config.delete(self.CONFIG_YML, "node.processors")
+
         # Set the current app full id
         self._opensearch.config.put(self.CONFIG_YML, "node.attr.app_id", app.id)
 
@@ -4,6 +4,7 @@
 """Base class for Opensearch distributions."""
 import json
 import logging
+import math
 import os
 import pathlib
 import random
@@ -52,7 +53,7 @@ LIBAPI = 0
 
 # Increment this PATCH version before using `charmcraft publish-lib` or reset
 # to 0 if you are raising the major API version
-LIBPATCH = 2
+LIBPATCH = 9
 
 
 logger = logging.getLogger(__name__)
@@ -84,12 +85,16 @@ class Paths:
         self.certs = f"{conf}/certificates"  # must be under config
         self.certs_relative = "certificates"
         self.seed_hosts = f"{conf}/unicast_hosts.txt"
+        # local cache of plugin archives (<plugin-name>.zip), to install plugins offline
+        self.plugin_artifacts = f"{pathlib.Path(data).parent}/plugin-artifacts"
 
 
 class OpenSearchDistribution(ABC):
     """This class represents an interface for a Distributed Opensearch (snap, tarball, oci img)."""
 
     SERVICE_NAME = "daemon"
+    # systemd unit of the OpenSearch service, if run by systemd
+    SERVICE_UNIT: Optional[str] = None
 
     def __init__(self, charm, peer_relation_name: str):
         self.paths = self._build_paths()
@@ -339,7 +344,7 @@ class OpenSearchDistribution(ABC):
         except Exception as e:
             raise OpenSearchHttpError(response_text=str(e))
 
-    def write_file(self, path: str, data: str, override: bool = True):
+    def write_file(self, path: str, data: Union[str, bytes], override: bool = True):
         """Persists data into file. Useful for files generated on the fly, such as certs etc."""
         if not override and exists(path):
             return
@@ -348,7 +353,7 @@ class OpenSearchDistribution(ABC):
         if parent_dir_path:
             pathlib.Path(parent_dir_path).mkdir(parents=True, exist_ok=True)
 
-        with open(path, mode="w") as f:
+        with open(path, mode="wb" if isinstance(data, bytes) else "w") as f:
             f.write(data)
 
     @staticmethod
@@ -453,6 +458,7 @@ class OpenSearchDistribution(ABC):
                 app=App(id=current_node["attributes"]["app_id"]),
                 unit_number=self._charm.unit_id,
                 temperature=current_node.get("attributes", {}).get("temp"),
+                zone=current_node.get("attributes", {}).get("zone"),
             )
 
         except OpenSearchHttpError:
@@ -506,6 +512,7 @@ class OpenSearchDistribution(ABC):
                 app=app,
                 unit_number=self._charm.unit_id,
                 temperature=temperature,
+                zone=conf.get("node.attr.zone"),
             )
 
     @staticmethod
@@ -518,33 +525,292 @@ class OpenSearchDistribution(ABC):
 
         return exclusions
 
+    @staticmethod
+    def memory_limit() -> int:
+        """Memory available to the node, in bytes.
+
+        This is the cgroup memory limit of the unit if it has one, the memory of the host
+        otherwise. The memory limit of LXD containers is also reported in /proc/meminfo.
+        """
+        memory = 0
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemTotal:"):
+                    memory = int(line.split()[1]) * 1024
+                    break
+
+        # cgroup v2, then v1 - "max" or a very large value when unlimited
+        for limit_file in [
+            "/sys/fs/cgroup/memory.max",
+            "/sys/fs/cgroup/memory/memory.limit_in_bytes",
+        ]:
+            if not exists(limit_file):
+                continue
+
+            with open(limit_file) as f:
+                limit = f.read().strip()
+
+            if limit.isdigit() and int(limit) > 0:
+                memory = min(memory, int(limit)) if memory else int(limit)
+            break
+
+        return memory
+
+    @staticmethod
+    def cpu_limit() -> Optional[int]:
+        """Number of processors available to the node, if restricted by the cgroup CPU quota.
+
+        Returns:
+            The CPU quota, rounded up and within the CPUs the unit can run on, or None if the
+            unit is not restricted by a quota lower than these CPUs.
+        """
+        cpus = len(os.sched_getaffinity(0))
+
+        quota = None
+        if exists(cpu_max := "/sys/fs/cgroup/cpu.max"):
+            # cgroup v2: "<quota> <period>" or "max <period>"
+            with open(cpu_max) as f:
+                values = f.read().split()
+            if values[0] != "max":
+                quota = int(values[0]) / int(values[1])
+        elif exists(cfs_quota := "/sys/fs/cgroup/cpu/cpu.cfs_quota_us"):
+            # cgroup v1: -1 when unlimited
+            with open(cfs_quota) as f:
+                quota_us = int(f.read().strip())
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+                period_us = int(f.read().strip())
+            if quota_us > 0 and period_us > 0:
+                quota = quota_us / period_us
+
+        if quota is None or math.ceil(quota) >= cpus:
+            return None
+
+        return max(math.ceil(quota), 1)
+
     def missing_sys_requirements(self) -> List[str]:
-        """Checks the system requirements."""
+        """Checks the system requirements.
+
+        Kernel parameters are read from (and written to) /proc/sys directly, as this runs on
+        every update-status. The limits of the OpenSearch service are checked when it runs.
+        Transparent huge pages are a host-wide setting: they are reported, never changed.
+        """
+
+        def read(prop: str) -> int:
+            """Read a kernel parameter."""
+            with open(f"/proc/sys/{prop.replace('.', '/')}") as f:
+                return int(f.read().split()[0])
 
         def apply(prop: str, value: int) -> bool:
-            """Apply a sysctl value and check if it was set."""
-            try:
-                self._run_cmd(f"sysctl -w {prop}={value}")
-                return int(self._run_cmd(f"sysctl -n {prop}")) == value
-            except OpenSearchCmdError:
-                return False
+            """Apply a kernel parameter value and check if it was set."""
+            return (
+                self._write_sys_file(f"/proc/sys/{prop.replace('.', '/')}", str(value))
+                and read(prop) == value
+            )
 
         missing_requirements = []
 
         prop, val = "vm.max_map_count", 262144
-        if int(self._run_cmd(f"sysctl -n {prop}")) < val and not apply(prop, val):
+        if read(prop) < val and not apply(prop, val):
             missing_requirements.append(f"{prop} should be at least {val}")
 
         prop, val = "vm.swappiness", 1
-        if int(self._run_cmd(f"sysctl -n {prop}")) > val and not apply(prop, 0):
+        if read(prop) > val and not apply(prop, 0):
             missing_requirements.append(f"{prop} should be at most 1")
 
         prop, val = "net.ipv4.tcp_retries2", 5
-        if int(self._run_cmd(f"sysctl -n {prop}")) > val and not apply(prop, val):
+        if read(prop) > val and not apply(prop, val):
             missing_requirements.append(f"{prop} should be at most {val}")
 
+        prop, val = "fs.file-max", 65535
+        if read(prop) < val and not apply(prop, val):
+            missing_requirements.append(f"{prop} should be at least {val}")
+
+        missing_requirements.extend(self._missing_process_limits())
+
+        if self._transparent_huge_pages_always():
+            missing_requirements.append("transparent huge pages should be madvise or never")
+
         return missing_requirements
 
+    def tune_data_storage(self, tune: bool = False) -> Dict[str, str]:
+        """Report, and tune if requested, the block device and mount behind the data path.
+
+        - I/O scheduler: "none" (or "mq-deadline") on SSDs, "mq-deadline" on spinning disks
+        - readahead: at most 128KB, larger values waste I/O on the random reads of searches
+        - noatime: reads of the data files do not trigger writes of their access time
+
+        Settings that cannot be changed (i.e: in containers) are left as is.
+
+        Args:
+            tune: whether to change the settings, or only to read them
+
+        Returns:
+            The settings in place on the data storage, to be reported.
+        """
+        if not exists(self.paths.data):
+            return {}
+
+        settings = {}
+        for step in [self._tune_data_scheduler, self._tune_data_read_ahead, self._tune_data_mount]:
+            # the tuning is best-effort: it must never prevent OpenSearch from starting
+            try:
+                settings.update(step(tune))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Data storage settings skipped: {e}")
+
+        logger.info(f"Data storage settings ({tune=}): {settings}")
+        return settings
+
+    def _tune_data_scheduler(self, tune: bool) -> Dict[str, str]:
+        """Set the I/O scheduler of the block device holding the data, if tuning."""
+        if not (queue := self._data_block_device_queue()):
+            return {}
+
+        with open(f"{queue}/rotational") as f:
+            rotational = f.read().strip() == "1"
+
+        with open(f"{queue}/scheduler") as f:
+            schedulers = f.read().split()
+        available = [scheduler.strip("[]") for scheduler in schedulers]
+        current = next((sch.strip("[]") for sch in schedulers if sch.startswith("[")), None)
+
+        preferred = ["mq-deadline"] if rotational else ["none", "mq-deadline"]
+        target = next((sch for sch in preferred if sch in available), None)
+        if tune and target and target != current:
+            if self._write_sys_file(f"{queue}/scheduler", target):
+                current = target
+
+        return {"scheduler": current} if current else {}
+
+    def _tune_data_read_ahead(self, tune: bool) -> Dict[str, str]:
+        """Cap the readahead of the block device holding the data, if tuning."""
+        if not (queue := self._data_block_device_queue()):
+            return {}
+
+        with open(f"{queue}/read_ahead_kb") as f:
+            read_ahead_kb = int(f.read().strip())
+        if tune and read_ahead_kb > 128 and self._write_sys_file(f"{queue}/read_ahead_kb", "128"):
+            read_ahead_kb = 128
+
+        return {"read_ahead_kb": str(read_ahead_kb)}
+
+    def _tune_data_mount(self, tune: bool) -> Dict[str, str]:
+        """Remount the filesystem holding the data with noatime, if tuning."""
+        if not (mount := self._data_mount()):
+            return {}
+
+        mount_point, options = mount
+        atime = next(
+            (opt for opt in options if opt in ["noatime", "relatime", "strictatime"]), "relatime"
+        )
+        # the root filesystem is not ours to remount
+        if tune and atime != "noatime" and mount_point != "/":
+            try:
+                self._run_cmd("mount", f"-o remount,noatime {mount_point}")
+                atime = "noatime"
+            except (OpenSearchCmdError, OSError):
+                logger.warning(f"Could not remount {mount_point} with noatime.")
+
+        return {"mount": atime}
+
+    def _data_block_device_queue(self) -> Optional[str]:
+        """Sysfs queue directory of the block device (or its parent disk) holding the data."""
+        dev = os.stat(self.paths.data).st_dev
+        block = f"/sys/dev/block/{os.major(dev)}:{os.minor(dev)}"
+        if not exists(block):
+            # not backed by a block device of this host, i.e: zfs, overlay in containers
+            return None
+
+        block = os.path.realpath(block)
+        if exists(f"{block}/partition"):
+            block = os.path.dirname(block)
+
+        return f"{block}/queue" if exists(f"{block}/queue/scheduler") else None
+
+    def _data_mount(self) -> Optional[Tuple[str, List[str]]]:
+        """Mount point and options of the filesystem holding the data."""
+        data = os.path.realpath(self.paths.data)
+        mount = None
+        with open("/proc/mounts") as f:
+            for line in f:
+                _, mount_point, _, options = line.split()[:4]
+                mount_point = mount_point.replace("\\040", " ")
+                if (data == mount_point or data.startswith(f"{mount_point.rstrip('/')}/")) and (
+                    mount is None or len(mount_point) >= len(mount[0])
+                ):
+                    mount = (mount_point, options.split(","))
+        return mount
+
+    @staticmethod
+    def _write_sys_file(path: str, value: str) -> bool:
+        """Write a value into a sysfs / procfs file, False if not permitted."""
+        try:
+            with open(path, "w") as f:
+                f.write(value)
+            return True
+        except OSError:
+            return False
+
+    def _missing_process_limits(self) -> List[str]:
+        """Resource limits of the running OpenSearch service that are too low."""
+        missing_requirements = []
+        if not (limits := self._process_limits()):
+            return missing_requirements
+
+        if (nofile := limits.get("Max open files")) and nofile < 65535:
+            missing_requirements.append("open files limit should be at least 65535")
+
+        if (
+            self.config.load("opensearch.yml").get("bootstrap.memory_lock")
+            and limits.get("Max locked memory") != -1
+        ):
+            missing_requirements.append("locked memory limit should be unlimited")
+
+        return missing_requirements
+
+    def _process_limits(self) -> Optional[Dict[str, int]]:
+        """Soft resource limits of the running OpenSearch service, -1 meaning unlimited.
+
+        The limits are read from a process of the systemd service, found through its cgroup:
+        they are set by systemd on the service and inherited by the JVM.
+        """
+        if not self.SERVICE_UNIT:
+            return None
+
+        for procs in [
+            f"/sys/fs/cgroup/system.slice/{self.SERVICE_UNIT}/cgroup.procs",
+            f"/sys/fs/cgroup/systemd/system.slice/{self.SERVICE_UNIT}/cgroup.procs",
+        ]:
+            if not exists(procs):
+                continue
+
+            try:
+                with open(procs) as f:
+                    if not (pids := f.read().split()):
+                        return None
+                with open(f"/proc/{pids[0]}/limits") as f:
+                    lines = f.readlines()[1:]
+            except OSError:
+                # the service stopped in the meantime
+                return None
+
+            limits = {}
+            for line in lines:
+                # "Max open files            65536                1048576              files"
+                name, soft = line[:26].strip(), line[26:].split()[0]
+                limits[name] = -1 if soft == "unlimited" else int(soft)
+            return limits
+
+    @staticmethod
+    def _transparent_huge_pages_always() -> bool:
+        """Whether transparent huge pages are always on, causing latency spikes."""
+        thp = "/sys/kernel/mm/transparent_hugepage/enabled"
+        if not exists(thp):
+            return False
+
+        with open(thp) as f:
+            return "[always]" in f.read()
+
     @cached_property
     def version(self) -> str:
         """Returns the version number of this opensearch instance.
@@ -13,7 +13,7 @@ LIBAPI = 0
 
 # Increment this PATCH version before using `charmcraft publish-lib` or reset
 # to 0 if you are raising the major API version
-LIBPATCH = 1
+LIBPATCH = 2
 
 
 class OpenSearchError(Exception):
@@ -97,6 +97,10 @@ class OpenSearchScaleDownError(OpenSearchError):
     """Exception thrown when a scale-down event is not safe."""
 
 
+class OpenSearchLockReleaseError(OpenSearchError):
+    """Exception thrown when the OpenSearch node lock could not be released."""
+
+
 class OpenSearchIndexError(OpenSearchError):
     """Exception thrown when an opensearch index is invalid."""
 
@@ -8,7 +8,7 @@ This module manages OpenSearch keystore access and lifecycle.
 import logging
 import os
 from abc import ABC
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 from charms.opensearch.v0.opensearch_exceptions import (
     OpenSearchCmdError,
@@ -24,7 +24,7 @@ LIBAPI = 0
 
 # Increment this PATCH version before using `charmcraft publish-lib` or reset
 # to 0 if you are raising the major API version
-LIBPATCH = 1
+LIBPATCH = 3
 
 
 logger = logging.getLogger(__name__)
@@ -133,48 +133,102 @@ class OpenSearchKeystore(Keystore):
         """Creates the keystore manager class."""
         super().__init__(charm)
         self._keytool = "opensearch-keystore"
+        self._keystore = f"{charm.opensearch.paths.conf}/opensearch.keystore"
+        # keys of the keystore, cached for the hook as long as the keystore file is unchanged
+        self._keys: Optional[List[str]] = None
+        self._keys_mtime: Optional[int] = None
 
     def add(self, entries: Dict[str, str]) -> None:
-        """Adds a given key to the "opensearch" keystore."""
+        """Adds the given keys to the "opensearch" keystore, in a single keystore run."""
         if not entries:
             return  # no key/value to add, no need to request reload of keystore either
-        for key, value in entries.items():
-            self._add(key, value)
+        cached = self._is_cache_valid()
+        self._add(entries)
+        self._update_cache(cached, added=list(entries))
 
     def delete(self, entries: List[str]) -> None:
-        """Removes a given key from "opensearch" keystore."""
+        """Removes the given keys from the "opensearch" keystore, in a single keystore run."""
         if not entries:
             return  # no key/value to remove, no need to request reload of keystore either
-        for key in entries:
-            self._delete(key)
+        cached = self._is_cache_valid()
+        try:
+            self._delete(list(entries))
+            self._update_cache(cached, removed=list(entries))
+        except OpenSearchKeystoreError as e:
+            if "does not exist in the keystore" not in str(e):
+                raise
+
+            # the whole removal is aborted if any of the keys is missing: retry with the others
+            keys_available = set(self.list())
+            if missing := [key for key in entries if key not in keys_available]:
+                logger.info(
+                    "opensearch_keystore.delete:"
+                    f" Keys {missing} not found in keystore, continuing..."
+                )
+            if keys := [key for key in entries if key in keys_available]:
+                self._delete(keys)
+                self._update_cache(True, removed=keys)
 
     def list(self, alias: str = None) -> List[str]:
         """Lists the keys available in opensearch's keystore."""
+        if self._is_cache_valid():
+            return list(self._keys)
+
+        mtime = self._mtime()
         try:
-            return self._opensearch.run_bin(self._keytool, "list").split("\n")
+            keys = self._opensearch.run_bin(self._keytool, "list").split("\n")
         except OpenSearchCmdError as e:
             raise OpenSearchKeystoreError(str(e))
 
-    def _add(self, key: str, value: str):
-        if not value:
+        self._keys, self._keys_mtime = keys, mtime
+        return list(keys)
+
+    def _mtime(self) -> Optional[int]:
+        """Modification time of the keystore file, None if missing."""
+        try:
+            return os.stat(self._keystore).st_mtime_ns
+        except OSError:
+            return None
+
+    def _is_cache_valid(self) -> bool:
+        """Whether the cached keys still reflect the content of the keystore file."""
+        return (
+            self._keys is not None
+            and self._keys_mtime is not None
+            and (self._keys_mtime == self._mtime())
+        )
+
+    def _update_cache(
+        self, cached: bool, added: Optional[List[str]] = None, removed: Optional[List[str]] = None
+    ) -> None:
+        """Apply the charm's own changes to the cached keys, or drop the cache if outdated."""
+        if not cached:
+            self._keys, self._keys_mtime = None, None
+            return
+
+        keys = [key for key in self._keys if key not in (removed or [])]
+        self._keys = keys + [key for key in added or [] if key not in keys]
+        self._keys_mtime = self._mtime()
+
+    def _add(self, entries: Dict[str, str]) -> None:
+        if not all(entries.values()):
             raise OpenSearchKeystoreError("Missing keystore value")
+
+        # the values are read from the standard input, one line per key and in the same order
+        stdin = "".join(
+            value if value.endswith("\n") else f"{value}\n" for value in entries.values()
+        )
         try:
-            # Add newline to the end of the key, if missing
-            value += "" if value.endswith("\n") else "\n"
-            self._opensearch.run_bin(self._keytool, f"add --force {key}", stdin=value)
+            self._opensearch.run_bin(
+                self._keytool, f"add --force {' '.join(entries)}", stdin=stdin
+            )
         except OpenSearchCmdError as e:
             raise OpenSearchKeystoreError(str(e))
 
-    def _delete(self, key: str) -> None:
+    def _delete(self, keys: List[str]) -> None:
         try:
-            self._opensearch.run_bin(self._keytool, f"remove {key}")
+            self._opensearch.run_bin(self._keytool, f"remove {' '.join(keys)}")
         except OpenSearchCmdError as e:
-            if "does not exist in the keystore" in str(e):
-                logger.info(
-                    "opensearch_keystore._delete:"
-                    f" Key {key} not found in keystore, continuing..."
-                )
-                return
             raise OpenSearchKeystoreError(str(e))
 
     def reload_keystore(self) -> None:
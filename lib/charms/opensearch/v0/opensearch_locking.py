@@ -15,19 +15,43 @@ The workflow logic goes alongside the following:
    b) we check on the existence of the flag to know if the lock is held or not
    c) if not there => we set the lock (flag in the peer rel data)
    d) we release the lock by removing that flag from the rel data
+
+Units requesting the lock are served in FIFO order:
+   a) a unit takes a ticket (timestamp) in its databag the first time it requests the lock
+   b) only the unit with the oldest ticket attempts to acquire the free lock, the others
+      defer without querying further OpenSearch
+   c) the ticket is removed when the lock is released, which triggers a relation changed event
+      on the other units: the next unit in the queue is woken up and retries its deferred event
+   d) the ticket carries a heartbeat, refreshed while the unit keeps requesting the lock: the
+      tickets of units that stopped retrying (e.g. stuck in error) expire and are skipped
+   e) a departing unit takes its ticket when leaving the relation, a hook that commits: the
+      storage detaching hook, which fails for as long as the lock is not acquired, would
+      otherwise roll back the ticket on every attempt
+
+The OpenSearch lock is a counting semaphore within an availability zone: when the
+`max_concurrent_restarts_per_zone` option is greater than 1, units of the zone of the units
+holding the lock can acquire it concurrently, as long as the cluster health, the placement of the
+shard copies and the cluster managers quorum allow it. The lock document is updated with
+optimistic concurrency control (sequence number and primary term).
 """
 
 import json
 import logging
 import os
-from typing import TYPE_CHECKING, List, Optional
+import random
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set
 
 import ops
-from charms.opensearch.v0.constants_charm import NodeLockRelationName
+from charms.opensearch.v0.constants_charm import GeneratedRoles, NodeLockRelationName
 from charms.opensearch.v0.helper_charm import all_units, format_unit_name
 from charms.opensearch.v0.helper_cluster import ClusterState, ClusterTopology
-from charms.opensearch.v0.models import PeerClusterApp
-from charms.opensearch.v0.opensearch_exceptions import OpenSearchHttpError
+from charms.opensearch.v0.models import Node, PeerClusterApp, StartMode
+from charms.opensearch.v0.opensearch_exceptions import (
+    OpenSearchHttpError,
+    OpenSearchLockReleaseError,
+)
+from charms.opensearch.v0.opensearch_health import HealthColors
 from charms.opensearch.v0.opensearch_internal_data import Scope
 
 if TYPE_CHECKING:
@@ -41,7 +65,7 @@ LIBAPI = 0
 
 # Increment this PATCH version before using `charmcraft publish-lib` or reset
 # to 0 if you are raising the major API version
-LIBPATCH = 1
+LIBPATCH = 7
 
 logger = logging.getLogger(__name__)
 
@@ -49,12 +73,22 @@ logger = logging.getLogger(__name__)
 class _PeerRelationLock(ops.Object):
     """Fallback lock when all units of OpenSearch are offline."""
 
+    # seconds between two refreshes of the heartbeat of the ticket of a unit requesting the lock
+    TICKET_HEARTBEAT = 5 * 60
+
+    # seconds without heartbeat after which the ticket of a unit is skipped
+    TICKET_EXPIRY = 3 * TICKET_HEARTBEAT
+
     def __init__(self, charm: "OpenSearchBaseCharm"):
         super().__init__(charm, NodeLockRelationName)
         self._charm = charm
         self.framework.observe(
             self._charm.on[NodeLockRelationName].relation_changed, self._on_peer_relation_changed
         )
+        self.framework.observe(
+            self._charm.on[NodeLockRelationName].relation_departed,
+            self._on_peer_relation_departed,
+        )
 
     @property
     def acquired(self) -> bool:
@@ -121,6 +155,81 @@ class _PeerRelationLock(ops.Object):
             # A separate relation-changed event won't get fired
             self._on_peer_relation_changed()
 
+    @property
+    def held(self) -> bool:
+        """Whether this unit holds the peer databag lock."""
+        return self._unit_with_lock == self._charm.unit_name
+
+    def enqueue(self):
+        """Take a ticket in the lock queue, or refresh the heartbeat of the ticket of this unit.
+
+        The heartbeat is only refreshed every TICKET_HEARTBEAT seconds, as every write to the
+        databag triggers a relation changed event on the other units.
+        """
+        if not self._relation:
+            return
+
+        data = self._relation.data[self._charm.unit]
+        now = time.time()
+        if data.get("lock-ticket"):
+            if now - self._heartbeat(data) >= self.TICKET_HEARTBEAT:
+                data["lock-heartbeat"] = json.dumps(now)
+            return
+
+        data["lock-ticket"] = json.dumps(now)
+        data["lock-heartbeat"] = json.dumps(now)
+        if zone := self._charm.availability_zone:
+            data["lock-zone"] = zone
+        logger.debug("[Node lock] Enqueued for lock")
+
+    def dequeue(self):
+        """Leave the lock queue."""
+        if not self._relation:
+            return
+
+        # Changing the unit databag wakes up the other units through a relation changed event
+        for key in ["lock-ticket", "lock-heartbeat", "lock-zone"]:
+            self._relation.data[self._charm.unit].pop(key, None)
+
+    @property
+    def queue(self) -> List[ops.Unit]:
+        """Units that requested the lock, in the order they requested it."""
+        return self._queue()
+
+    def is_next_in_queue(self, zone: Optional[str] = None) -> bool:
+        """Whether this unit is the first unit waiting for the lock (in a zone, if set)."""
+        if not (queue := self._queue(zone)):
+            return True
+
+        return queue[0] == self._charm.unit
+
+    def _queue(self, zone: Optional[str] = None) -> List[ops.Unit]:
+        """Units that requested the lock (in a zone, if set), in the order they requested it."""
+        if not self._relation:
+            return []
+
+        tickets = []
+        now = time.time()
+        for unit in (self._charm.unit, *self._relation.units):
+            # departing units may be part of the relation while having no entry in the databag
+            data = self._relation.data.get(unit, {})
+            if not (ticket := data.get("lock-ticket")):
+                continue
+            if zone and data.get("lock-zone") != zone:
+                continue
+            if unit != self._charm.unit and now - self._heartbeat(data) > self.TICKET_EXPIRY:
+                # the unit stopped requesting the lock, e.g. it is stuck in error
+                logger.debug(f"[Node lock] Skipping expired ticket of {unit.name}")
+                continue
+            tickets.append((json.loads(ticket), int(unit.name.split("/")[-1]), unit))
+
+        return [unit for _, _, unit in sorted(tickets, key=lambda ticket: ticket[:2])]
+
+    @staticmethod
+    def _heartbeat(data: Dict[str, str]) -> float:
+        """Last time a unit requested the lock, according to its databag."""
+        return json.loads(data.get("lock-heartbeat") or data.get("lock-ticket") or "0")
+
     def _unit_requested_lock(self, unit: ops.Unit):
         """Whether unit requested lock."""
         assert self._relation
@@ -200,11 +309,14 @@ class _PeerRelationLock(ops.Object):
             logger.debug("[Node lock] (leader) lock still in use")
             return
 
-        # TODO: adjust which unit gets priority on lock after leader?
-        # During initial startup, leader unit must start first
-        # Give priority to leader unit
+        # Units are granted the lock in the order they requested it. Units without a ticket
+        # (e.g. running a previous charm revision) are served last.
+        candidates = [*self.queue, self._charm.unit, *self._relation.units]
+        if not self._charm.peers_data.get(Scope.APP, "security_index_initialised", False):
+            # During initial startup, leader unit must start first
+            candidates.insert(0, self._charm.unit)
 
-        for unit in (self._charm.unit, *self._relation.units):
+        for unit in candidates:
             if self._unit_requested_lock(unit):
                 self._unit_with_lock = format_unit_name(unit, app=deployment_desc.app)
                 logger.debug(f"[Node lock] (leader) granted peer lock to {unit.name=}")
@@ -213,6 +325,15 @@ class _PeerRelationLock(ops.Object):
             logger.debug("[Node lock] (leader) cleared peer lock")
             del self._unit_with_lock
 
+    def _on_peer_relation_departed(self, event: ops.RelationDepartedEvent):
+        """Take the ticket of a departing unit in a hook that commits."""
+        if event.departing_unit != self._charm.unit:
+            return
+
+        # the lock is requested in the storage detaching hook, which keeps failing (and rolling
+        # back its changes of the databags) for as long as the lock is not acquired
+        self.enqueue()
+
     @staticmethod
     def _default_unit_name(full_unit_id: str) -> str:
         """Build back the juju formatted unit name."""
@@ -225,10 +346,23 @@ class OpenSearchNodeLock(ops.Object):
     """Ensure that only one node (re)starts, joins the cluster, or leaves the cluster at a time.
 
     Uses OpenSearch document for lock. Falls back to peer databag if no units online
+
+    The lock index holds a quorum-sized number of shard copies, placed on the cluster manager
+    eligible nodes (with the data role) whenever possible, rather than a copy on every node.
+    If a quorum of cluster managers is lost, the cluster is unavailable anyway: writing the
+    lock document on more copies than that does not make it safer, but makes every lock write
+    wait on the slowest node of the cluster.
+    The copies are sized and placed after the configured topology of the cluster, not after the
+    nodes online, which change precisely while the lock is in use. Lock writes only wait for a
+    majority of the copies, so that a copy holder being offline (e.g. the unit restarting) does
+    not block the lock.
     """
 
     OPENSEARCH_INDEX = ".charm_node_lock"
 
+    # attempts of the removal of units from the lock document, updated concurrently by others
+    RELEASE_ATTEMPTS = 10
+
     def __init__(self, charm: "OpenSearchBaseCharm"):
 
         super().__init__(charm, "opensearch-node-lock")
@@ -236,12 +370,12 @@ class OpenSearchNodeLock(ops.Object):
         self._opensearch = charm.opensearch
         self._peer = _PeerRelationLock(self._charm)
 
-    def _unit_with_lock(self, host: str | None) -> str | None:
-        """Unit that has acquired OpenSearch lock."""
+    def _lock_document(self, host: str | None) -> Dict[str, Any] | None:
+        """OpenSearch lock document, along with its sequence number and primary term."""
         try:
-            document_data = self._opensearch.request(
+            return self._opensearch.request(
                 "GET",
-                endpoint=f"/{self.OPENSEARCH_INDEX}/_source/0",
+                endpoint=f"/{self.OPENSEARCH_INDEX}/_doc/0",
                 host=host,
                 alt_hosts=self._charm.alt_hosts,
                 retries=3,
@@ -252,7 +386,22 @@ class OpenSearchNodeLock(ops.Object):
                 # No unit has lock or index not available
                 return
             raise
-        return document_data["unit-name"]
+
+    @staticmethod
+    def _units_with_lock(document: Dict[str, Any] | None) -> List[str]:
+        """Units that have acquired the OpenSearch lock."""
+        if not document or not (source := document.get("_source")):
+            return []
+
+        # documents written by previous revisions of the charm only hold "unit-name"
+        units = source.get("units") or [source.get("unit-name")]
+        return [unit for unit in units if unit]
+
+    @staticmethod
+    def _lock_payload(units: List[str], zone: str | None) -> Dict[str, Any]:
+        """Content of the lock document."""
+        # "unit-name" is kept for the units of previous revisions of the charm
+        return {"unit-name": units[0], "units": units, "zone": zone}
 
     @property
     def acquired(self) -> bool:  # noqa: C901
@@ -261,23 +410,24 @@ class OpenSearchNodeLock(ops.Object):
         Returns:
             Whether lock was acquired
         """
+        self._peer.enqueue()
+
         host = self._charm.unit_ip if self._opensearch.is_node_up() else None
         alt_hosts = self._charm.alt_hosts
         if host or alt_hosts:
             logger.debug("[Node lock] 1+ opensearch nodes online")
             try:
-                online_nodes = len(
-                    ClusterTopology.nodes(
-                        self._opensearch, use_localhost=host is not None, hosts=alt_hosts
-                    )
+                nodes = ClusterTopology.nodes(
+                    self._opensearch, use_localhost=host is not None, hosts=alt_hosts
                 )
+                online_nodes = len(nodes)
             except OpenSearchHttpError:
                 logger.exception("Error getting OpenSearch nodes")
                 return False
             logger.debug(f"[Node lock] Opensearch {online_nodes=}")
             assert online_nodes > 0
             try:
-                unit = self._unit_with_lock(host)
+                document = self._lock_document(host)
             except OpenSearchHttpError:
                 logger.exception("Error checking which unit has OpenSearch lock")
                 # if the node lock cannot be acquired, fall back to peer databag lock
@@ -287,27 +437,56 @@ class OpenSearchNodeLock(ops.Object):
                     return self._peer.acquired
                 else:
                     return False
+            units = self._units_with_lock(document)
+
+            if self._charm.unit_name in units:
+                # Lock acquired
+                # Release peer databag lock, if any
+                logger.debug("[Node lock] Acquired via opensearch")
+                self._peer.release()
+                logger.debug("[Node lock] Released redundant peer lock (if held)")
+                return True
+
+            if units:
+                # Other units have the lock, attempt to restart concurrently in the same zone
+                return self._join(host, nodes, document)
+
             # If online_nodes == 1, we should acquire the lock via the peer databag.
             # If we acquired the lock via OpenSearch and this unit was stopping, we would be unable
             # to release the OpenSearch lock. For example, when scaling to 0.
             # Then, when 1+ OpenSearch nodes are online, a unit that no longer exists could hold
             # the lock.
-            if not unit and online_nodes > 0:
+            if online_nodes > 0:
+                if not self._peer.is_next_in_queue():
+                    # Another unit requested the lock before this one, wait for our turn
+                    logger.debug(
+                        f"[Node lock] Not acquired. Next unit in queue: {self._peer.queue[0].name}"
+                    )
+                    return False
+
                 logger.debug("[Node lock] Attempting to acquire opensearch lock")
                 # Acquire opensearch lock
                 # Create index if it doesn't exist
-                if not self._create_lock_index_if_needed(host, alt_hosts):
+                lock_index_nodes = self._lock_index_nodes(nodes)
+                if not self._create_lock_index_if_needed(host, alt_hosts, lock_index_nodes):
                     return False
 
                 # Attempt to create document id 0
+                # The write must reach a majority of the copies of the (quorum-sized) lock index
+                active_shards = self._lock_write_active_shards(lock_index_nodes)
                 try:
                     response = self._opensearch.request(
                         "PUT",
-                        endpoint=f"/{self.OPENSEARCH_INDEX}/_create/0?refresh=true&wait_for_active_shards=all",
+                        endpoint=(
+                            f"/{self.OPENSEARCH_INDEX}/_create/0?refresh=true"
+                            f"&wait_for_active_shards={active_shards}"
+                        ),
                         host=host,
                         alt_hosts=self._charm.alt_hosts,
                         retries=0,
-                        payload={"unit-name": self._charm.unit_name},
+                        payload=self._lock_payload(
+                            [self._charm.unit_name], self._charm.availability_zone
+                        ),
                     )
                 except OpenSearchHttpError as e:
                     if e.response_code == 409 and "document already exists" in e.response_body.get(
@@ -354,20 +533,10 @@ class OpenSearchNodeLock(ops.Object):
                         return False
 
                     # This unit has OpenSearch lock
-                    unit = self._charm.unit_name
-
-            if unit == self._charm.unit_name:
-                # Lock acquired
-                # Release peer databag lock, if any
-                logger.debug("[Node lock] Acquired via opensearch")
-                self._peer.release()
-                logger.debug("[Node lock] Released redundant peer lock (if held)")
-                return True
-
-            if unit:
-                # Another unit has lock
-                logger.debug(f"[Node lock] Not acquired. Unit with opensearch lock: {unit}")
-                return False
+                    logger.debug("[Node lock] Acquired via opensearch")
+                    self._peer.release()
+                    logger.debug("[Node lock] Released redundant peer lock (if held)")
+                    return True
 
             assert online_nodes == 1
             logger.debug("[Node lock] No unit has opensearch lock")
@@ -378,17 +547,128 @@ class OpenSearchNodeLock(ops.Object):
         # - OR, unit is leader & lock granted in this Juju event
         return self._peer.acquired
 
+    def _join(self, host: str | None, nodes: List[Node], document: Dict[str, Any]) -> bool:
+        """Attempt to acquire the lock alongside the units of the same zone that hold it."""
+        units = self._units_with_lock(document)
+        zone = self._charm.availability_zone
+        if not self._can_join(host, nodes, units, document["_source"].get("zone")):
+            logger.debug(f"[Node lock] Not acquired. Units with opensearch lock: {units}")
+            return False
+
+        if not self._peer.is_next_in_queue(zone=zone):
+            logger.debug(f"[Node lock] Not acquired. Another unit of {zone=} is next in queue")
+            return False
+
+        # optimistic concurrency control: the update fails if another unit changed the lock
+        # document since it was read
+        active_shards = self._lock_write_active_shards(self._lock_index_nodes(nodes))
+        try:
+            response = self._opensearch.request(
+                "PUT",
+                endpoint=(
+                    f"/{self.OPENSEARCH_INDEX}/_doc/0?refresh=true"
+                    f"&wait_for_active_shards={active_shards}"
+                    f"&if_seq_no={document['_seq_no']}&if_primary_term={document['_primary_term']}"
+                ),
+                host=host,
+                alt_hosts=self._charm.alt_hosts,
+                retries=0,
+                payload=self._lock_payload(units + [self._charm.unit_name], zone),
+            )
+        except OpenSearchHttpError as e:
+            if e.response_code != 409:
+                logger.exception("Error updating OpenSearch lock document")
+            else:
+                logger.debug("[Node lock] OpenSearch lock updated by another unit meanwhile")
+            return False
+
+        if response["_shards"]["failed"] > 0:
+            logger.error("Failed to write OpenSearch lock document to all nodes.")
+            try:
+                self._release_opensearch_lock(host)
+            except OpenSearchLockReleaseError as e:
+                # removed from the lock the next time the unit releases it
+                logger.error(f"[Node lock] {e}")
+            return False
+
+        logger.debug(f"[Node lock] Acquired via opensearch, concurrently with {units}")
+        self._peer.release()
+        return True
+
+    def _can_join(  # noqa: C901
+        self, host: str | None, nodes: List[Node], units: List[str], lock_zone: str | None
+    ) -> bool:
+        """Whether this unit can restart concurrently with the units holding the lock.
+
+        Concurrent restarts are only allowed within a single availability zone, up to the
+        configured limit, out of upgrades (the upgraded units toggle the cluster-wide shard
+        allocation) and as long as:
+            - the cluster is not red and no shard is initializing or relocating
+            - every shard has a started copy on a node of another zone
+            - a quorum of the cluster manager eligible nodes remains online
+        """
+        limit = self._charm.config.get("max_concurrent_restarts_per_zone", 1)
+        zone = self._charm.availability_zone
+        if limit <= 1 or not zone or zone != lock_zone or len(units) >= limit:
+            return False
+
+        if self._charm.upgrade_in_progress:
+            return False
+
+        zones = {node.name: node.zone for node in nodes}
+        if any(zones.get(unit, zone) != zone for unit in units):
+            return False
+
+        # units with the lock that are offline are considered as cluster managers
+        stopping = set(units) | {self._charm.unit_name}
+        cms = set(ClusterTopology.get_cluster_managers_names(nodes)) | set(units)
+        if len(cms - stopping) < len(cms) // 2 + 1:
+            logger.debug("[Node lock] Concurrent restart would break the cluster managers quorum")
+            return False
+
+        try:
+            health = self._charm.health.get(use_localhost=host is not None, local_app_only=False)
+            if health not in [HealthColors.GREEN, HealthColors.YELLOW]:
+                logger.debug(f"[Node lock] Concurrent restart not allowed with {health=}")
+                return False
+
+            shards = ClusterState.shards(self._opensearch, host, self._charm.alt_hosts)
+        except OpenSearchHttpError:
+            return False
+
+        copies_outside_zone = {}
+        for shard in shards:
+            if shard["state"] in ["INITIALIZING", "RELOCATING"]:
+                logger.debug(f"[Node lock] Concurrent restart not allowed with moving {shard=}")
+                return False
+
+            key = (shard["index"], shard["shard"])
+            copies_outside_zone.setdefault(key, False)
+            if shard["state"] == "STARTED" and zones.get(shard["node"]) not in [None, zone]:
+                copies_outside_zone[key] = True
+
+        if not all(copies_outside_zone.values()):
+            logger.debug(f"[Node lock] Some shards have no started copy outside of {zone=}")
+            return False
+
+        return True
+
     def release(self):
         """Release lock.
 
         Limitation: if lock acquired via OpenSearch document and all units offline, OpenSearch
         document lock will not be released
+
+        The unit only leaves the lock queue if it held the lock. If it cannot be removed from the
+        OpenSearch lock, the failure is logged and the unit keeps its ticket: release is called
+        on error paths that go on to defer the event, which must not be interrupted.
         """
         logger.debug("[Node lock] Releasing lock")
 
         # fetch current app description
         current_app = self._charm.opensearch_peer_cm.deployment_desc().app
 
+        held = self._peer.held
         host = self._charm.unit_ip if self._opensearch.is_node_up() else None
         alt_hosts = self._charm.alt_hosts
         if host or alt_hosts:
@@ -397,7 +677,6 @@ class OpenSearchNodeLock(ops.Object):
             # or if there is a stale lock from a unit no longer existing
             # for large deployments the MAIN/FAILOVER orchestrators should broadcast info
             # over non-online units in the relation. This info should be considered here as well.
-            unit_with_lock = self._unit_with_lock(host)
             current_app_units = [
                 format_unit_name(unit, app=current_app) for unit in all_units(self._charm)
             ]
@@ -416,59 +695,270 @@ class OpenSearchNodeLock(ops.Object):
                     ]
                     other_apps_units.extend(units)
 
-            if unit_with_lock and (
-                unit_with_lock == self._charm.unit_name
-                or unit_with_lock not in current_app_units + other_apps_units
-            ):
-                logger.debug("[Node lock] Releasing opensearch lock")
-                # Delete document id 0
-                try:
-                    self._opensearch.request(
-                        "DELETE",
-                        endpoint=f"/{self.OPENSEARCH_INDEX}/_doc/0?refresh=true",
-                        host=host,
-                        alt_hosts=alt_hosts,
-                        retries=3,
-                        ignore_retry_on=[404],
-                    )
-                except OpenSearchHttpError as e:
-                    if e.response_code != 404:
-                        raise
-                logger.debug("[Node lock] Released opensearch lock")
+            existing_units = set(current_app_units + other_apps_units)
+            try:
+                held |= self._release_opensearch_lock(host, existing_units)
+            except OpenSearchLockReleaseError as e:
+                logger.error(f"[Node lock] {e} Keeping the place of the unit in the lock queue.")
+                self._peer.release()
+                return
         self._peer.release()
         logger.debug("[Node lock] Released peer lock (if held)")
+        if held:
+            self._peer.dequeue()
         logger.debug("[Node lock] Released lock")
 
-    def _create_lock_index_if_needed(self, host: str, alt_hosts: Optional[List[str]]) -> bool:
-        """Attempts the creation of the lock index if it doesn't exist."""
+    def _release_opensearch_lock(
+        self, host: str | None, existing_units: Optional[Set[str]] = None
+    ) -> bool:
+        """Remove this unit, and the units that no longer exist, from the OpenSearch lock.
+
+        The removal is retried for as long as other units concurrently update the lock document.
+
+        Returns:
+            Whether this unit held the OpenSearch lock.
+
+        Raises:
+            OpenSearchLockReleaseError if this unit is still holding the lock after all attempts:
+                the unit must not leave the lock queue, or its slot in the lock would be lost.
+        """
+        held = False
+        for _ in range(self.RELEASE_ATTEMPTS):
+            units = self._units_with_lock(self._lock_document(host))
+            held |= self._charm.unit_name in units
+            to_release = {
+                unit
+                for unit in units
+                if unit == self._charm.unit_name
+                or (existing_units is not None and unit not in existing_units)
+            }
+            if not to_release:
+                return held
+
+            logger.debug(f"[Node lock] Releasing opensearch lock of {to_release}")
+            if self._remove_units_with_lock(host, to_release):
+                logger.debug("[Node lock] Released opensearch lock")
+                return held
+
+            # the lock document was updated by another unit meanwhile
+            time.sleep(random.uniform(0.1, 1))
+
+        raise OpenSearchLockReleaseError(
+            f"{self._charm.unit_name} could not be removed from the OpenSearch lock."
+        )
+
+    def _remove_units_with_lock(self, host: str | None, units: Set[str]) -> bool:
+        """Remove units from the holders of the OpenSearch lock.
+
+        Returns:
+            Whether the lock document was updated, False if it was concurrently updated.
+        """
+        if not (document := self._lock_document(host)):
+            return True
+
+        remaining = [unit for unit in self._units_with_lock(document) if unit not in units]
+        concurrency = (
+            f"if_seq_no={document['_seq_no']}&if_primary_term={document['_primary_term']}"
+        )
+        try:
+            if not remaining:
+                # Delete document id 0
+                self._opensearch.request(
+                    "DELETE",
+                    endpoint=f"/{self.OPENSEARCH_INDEX}/_doc/0?refresh=true&{concurrency}",
+                    host=host,
+                    alt_hosts=self._charm.alt_hosts,
+                    retries=3,
+                    ignore_retry_on=[404, 409],
+                )
+            else:
+                self._opensearch.request(
+                    "PUT",
+                    endpoint=f"/{self.OPENSEARCH_INDEX}/_doc/0?refresh=true&{concurrency}",
+                    host=host,
+                    alt_hosts=self._charm.alt_hosts,
+                    retries=3,
+                    ignore_retry_on=[409],
+                    payload=self._lock_payload(remaining, document["_source"].get("zone")),
+                )
+        except OpenSearchHttpError as e:
+            if e.response_code == 409:
+                # the document was updated meanwhile
+                return False
+            if e.response_code != 404:
+                raise
+        return True
+
+    def _lock_index_nodes(self, online_nodes: List[Node]) -> List[Node]:
+        """Nodes of the configured topology of the cluster, online or not.
+
+        The nodes are built from the units and roles of the deployment descriptions of the
+        applications of the cluster. The online nodes are only used if the configured topology
+        holds no data node, i.e. when the lock index lives on nodes of unknown applications.
+        """
+        deployment_desc = self._charm.opensearch_peer_cm.deployment_desc()
+        if not deployment_desc:
+            return online_nodes
+
+        apps = {}
+        for app in (
+            self._charm.peers_data.get_object(Scope.APP, "cluster_fleet_apps") or {}
+        ).values():
+            p_cluster_app = PeerClusterApp.from_dict(app)
+            apps[p_cluster_app.app.id] = (
+                p_cluster_app.app,
+                p_cluster_app.units,
+                p_cluster_app.roles or GeneratedRoles,
+            )
+
+        # the units and roles of the current app are known first hand
+        roles = GeneratedRoles
+        if deployment_desc.start == StartMode.WITH_PROVIDED_ROLES:
+            roles = deployment_desc.config.roles
+        apps[deployment_desc.app.id] = (
+            deployment_desc.app,
+            [format_unit_name(unit, app=deployment_desc.app) for unit in all_units(self._charm)],
+            roles,
+        )
+
+        nodes = [
+            Node(
+                name=unit,
+                roles=roles,
+                ip="",
+                app=app,
+                unit_number=int(unit.split(".")[0].rsplit("-", 1)[-1]),
+            )
+            for app, units, roles in apps.values()
+            for unit in units
+        ]
+        if not any(node.is_data() for node in nodes):
+            return online_nodes
+
+        return nodes
+
+    @staticmethod
+    def _lock_index_allocation_nodes(nodes: List[Node]) -> List[str]:
+        """Names of the nodes that should hold the copies of the lock index.
+
+        Cluster manager eligible nodes are preferred, however only nodes with a data role can
+        hold shards: we fall back to all data nodes if no cluster manager holds the data role.
+        """
+        cm_data_nodes = sorted(
+            node.name for node in nodes if node.is_cm_eligible() and node.is_data()
+        )
+        if cm_data_nodes:
+            return cm_data_nodes
+
+        return sorted(node.name for node in nodes if node.is_data())
+
+    @staticmethod
+    def _lock_index_shard_copies(nodes: List[Node]) -> int:
+        """Number of copies (primary + replicas) of the lock index: a quorum of the CMs."""
+        cm_count = len(ClusterTopology.get_cluster_managers_names(nodes)) or len(nodes)
+        quorum = cm_count // 2 + 1
+
+        allocation_nodes = OpenSearchNodeLock._lock_index_allocation_nodes(nodes)
+        return max(1, min(quorum, len(allocation_nodes)))
+
+    @staticmethod
+    def _lock_write_active_shards(nodes: List[Node]) -> int:
+        """Number of active copies of the lock index that lock writes wait for.
+
+        A majority of the copies, without requiring all of them as long as there are 2+ copies:
+        a single copy holder being offline, e.g. the unit restarting, does not block the lock.
+        """
+        copies = OpenSearchNodeLock._lock_index_shard_copies(nodes)
+        return min(copies // 2 + 1, max(copies - 1, 1))
+
+    @staticmethod
+    def _lock_index_settings(nodes: List[Node]) -> Dict[str, Any]:
+        """Compute the (flat) index settings of the lock index for the current topology."""
+        allocation_nodes = OpenSearchNodeLock._lock_index_allocation_nodes(nodes)
+        all_data_nodes = [node.name for node in nodes if node.is_data()]
+        return {
+            "index.number_of_replicas": str(
+                OpenSearchNodeLock._lock_index_shard_copies(nodes) - 1
+            ),
+            "index.auto_expand_replicas": "false",
+            # only restrict the allocation if the target is a subset of the data nodes
+            "index.routing.allocation.include._name": (
+                ",".join(allocation_nodes) if len(allocation_nodes) < len(all_data_nodes) else None
+            ),
+        }
+
+    def _create_lock_index_if_needed(
+        self, host: str, alt_hosts: Optional[List[str]], nodes: List[Node]
+    ) -> bool:
+        """Attempts the creation of the lock index if it doesn't exist.
+
+        If the index exists, its replicas count and allocation are updated if the configured
+        topology of the cluster changed since its creation.
+        """
+        settings = self._lock_index_settings(nodes)
+
         # we do this, to circumvent opensearch raising a 429 error,
         # complaining about spamming the index creation endpoint
         try:
-            indices = ClusterState.indices(self._opensearch, host, alt_hosts)
-            if self.OPENSEARCH_INDEX in indices:
-                logger.debug(
-                    f"{self.OPENSEARCH_INDEX} already created. Skipping creation attempt. List:{indices}"
+            response = self._opensearch.request(
+                "GET",
+                endpoint=f"/{self.OPENSEARCH_INDEX}/_settings?flat_settings=true",
+                host=host,
+                alt_hosts=alt_hosts,
+                retries=3,
+                ignore_retry_on=[404],
+            )
+            current = response[self.OPENSEARCH_INDEX]["settings"]
+            logger.debug(f"{self.OPENSEARCH_INDEX} already created. Skipping creation attempt.")
+
+            if any(current.get(key) != val for key, val in settings.items()):
+                logger.debug(f"[Node lock] Updating {self.OPENSEARCH_INDEX} settings: {settings}")
+                self._opensearch.request(
+                    "PUT",
+                    endpoint=f"/{self.OPENSEARCH_INDEX}/_settings",
+                    host=host,
+                    alt_hosts=alt_hosts,
+                    retries=3,
+                    payload={"index": self._unflatten_index_settings(settings)},
                 )
-                if self._charm.app.planned_units() > 1:
-                    self._opensearch.request(
-                        "GET",
-                        endpoint=f"/_cluster/health/{self.OPENSEARCH_INDEX}?wait_for_status=green",
-                        resp_status_code=True,
-                    )
-                return True
-        except OpenSearchHttpError:
+
+            if self._charm.app.planned_units() > 1:
+                self._opensearch.request(
+                    "GET",
+                    endpoint=(
+                        f"/_cluster/health/{self.OPENSEARCH_INDEX}"
+                        f"?wait_for_active_shards={self._lock_write_active_shards(nodes)}"
+                    ),
+                    resp_status_code=True,
+                )
+            return True
+        except (OpenSearchHttpError, KeyError):
             pass
 
         # Create index if it doesn't exist
         try:
             self._opensearch.request(
                 "PUT",
-                endpoint=f"/{self.OPENSEARCH_INDEX}?wait_for_active_shards=all",
+                endpoint=(
+                    f"/{self.OPENSEARCH_INDEX}"
+                    f"?wait_for_active_shards={self._lock_write_active_shards(nodes)}"
+                ),
                 host=host,
                 alt_hosts=alt_hosts,
                 retries=3,
                 ignore_retry_on=[400],
-                payload={"settings": {"index": {"auto_expand_replicas": "0-all"}}},
+                payload={
+                    "settings": {
+                        "index": {
+                            "number_of_shards": 1,
+                            **{
+                                key: val
+                                for key, val in self._unflatten_index_settings(settings).items()
+                                if val is not None
+                            },
+                        }
+                    }
+                },
             )
             return True
         except OpenSearchHttpError as e:
@@ -482,3 +972,8 @@ class OpenSearchNodeLock(ops.Object):
             else:
                 logger.exception("Error creating OpenSearch lock index")
                 return False
+
+    @staticmethod
+    def _unflatten_index_settings(settings: Dict[str, Any]) -> Dict[str, Any]:
+        """Strip the "index." prefix of flat settings to use them in an "index" payload."""
+        return {key.removeprefix("index."): val for key, val in settings.items()}
@@ -6,7 +6,7 @@ import logging
 from functools import cached_property
 from typing import List, Optional, Set
 
-from charms.opensearch.v0.helper_charm import all_units, format_unit_name
+from charms.opensearch.v0.helper_charm import all_units, dying_units, format_unit_name
 from charms.opensearch.v0.models import Node, PeerClusterApp
 from charms.opensearch.v0.opensearch_exceptions import (
     OpenSearchError,
@@ -22,7 +22,7 @@ LIBAPI = 0
 
 # Increment this PATCH version before using `charmcraft publish-lib` or reset
 # to 0 if you are raising the major API version
-LIBPATCH = 1
+LIBPATCH = 3
 
 
 logger = logging.getLogger(__name__)
@@ -105,7 +105,10 @@ class OpenSearchExclusions:
                     raise OpenSearchExclusionsException("Failed to delete allocation exclusion.")
 
     def cleanup(self) -> None:
-        """Delete all exclusions that failed to be deleted."""
+        """Delete all exclusions that failed to be deleted.
+
+        Runs on every update-status: no request is sent to OpenSearch if nothing is pending.
+        """
         self._delete_voting(
             self._units_to_cleanup(
                 list(
@@ -117,11 +120,60 @@ class OpenSearchExclusions:
             )
         )
 
-        allocations_to_cleanup = list(
+        allocations_to_cleanup = set(
             filter(None, self._charm.peers_data.get(self._scope, ALLOCS_TO_DELETE, "").split(","))
         )
-        if allocations_to_cleanup and self._delete_allocations(allocations_to_cleanup):
-            self._charm.peers_data.delete(self._scope, ALLOCS_TO_DELETE)
+        if not allocations_to_cleanup:
+            return
+
+        # the departing nodes still being drained must remain excluded until they are gone
+        draining = allocations_to_cleanup & self._departing_nodes()
+        if not (to_delete := allocations_to_cleanup - draining):
+            return
+
+        if self._delete_allocations(list(to_delete)):
+            if draining:
+                self._charm.peers_data.put(self._scope, ALLOCS_TO_DELETE, ",".join(draining))
+            else:
+                self._charm.peers_data.delete(self._scope, ALLOCS_TO_DELETE)
+
+    def add_departing(self, nodes: List[Node]) -> bool:
+        """Exclude from the shards allocation all the data nodes of the units being removed.
+
+        On scale-down, draining the departing nodes one after the other moves shards several
+        times, as the nodes removed later receive data from the ones removed earlier. All the
+        departing data nodes are instead excluded in a single update of the allocation
+        exclusions, so that their shards relocate once, to the remaining nodes.
+
+        Args:
+            nodes: the current nodes of the cluster
+
+        Returns:
+            Whether the departing nodes are excluded, False if nothing was excluded
+        """
+        departing = self._departing_nodes() | {self._node.name}
+        to_exclude = {node.name for node in nodes if node.is_data() and node.name in departing}
+        if not any(node.is_data() and node.name not in departing for node in nodes):
+            # no data node would be left to receive the shards
+            logger.debug("No data node remains after the removal, nothing to exclude.")
+            return False
+
+        if len(to_exclude) <= 1:
+            # a single node departing, it gets excluded when stopping
+            return False
+
+        logger.info(f"Excluding all departing nodes from the shards allocation: {to_exclude}")
+        if not self._add_allocations(to_exclude):
+            logger.error(f"Failed to add shard allocation exclusions: {to_exclude}.")
+            return False
+        return True
+
+    def _departing_nodes(self) -> Set[str]:
+        """Names of the nodes of this app whose units are being removed."""
+        if not (deployment_desc := self._charm.opensearch_peer_cm.deployment_desc()):
+            return set()
+
+        return {format_unit_name(unit, deployment_desc.app) for unit in dying_units(self._charm)}
 
     def _units_to_cleanup(self, removable: List[str]) -> Optional[Set[str]]:
         """Deletes all units that have left the cluster via Juju.
@@ -166,147 +218,164 @@ class OpenSearchExclusions:
 
     def _add_voting(self, exclusions: Optional[Set[str]] = None) -> bool:
         """Include the current node in the CMs voting exclusions list of nodes."""
-        try:
-            to_add = exclusions or {self._node.name}
-            response = self._opensearch.request(
-                "POST",
-                f"/_cluster/voting_config_exclusions?node_names={','.join(to_add)}&timeout=1m",
-                alt_hosts=self._charm.alt_hosts,
-                resp_status_code=True,
-                retries=3,
-            )
-            logger.debug("Added voting, response: %s", response)
+        to_add = exclusions or {self._node.name}
+        result = self._reconcile_voting(to_add=to_add)
 
-            self._charm.peers_data.put(
-                self._scope,
-                VOTING_TO_DELETE,
-                ",".join(to_add.union(self._get_voting_to_delete())),
-            )
-            # The voting excl. API returns a status only
-            return response < 400
-        except OpenSearchHttpError:
-            return False
+        self._charm.peers_data.put(
+            self._scope,
+            VOTING_TO_DELETE,
+            ",".join(to_add.union(self._get_voting_to_delete())),
+        )
+        return result
 
     def _delete_voting(self, exclusions: Set[str]) -> bool:
-        """Remove all voting exclusions and then re-adds the subset that should stay.
+        """Remove a subset of the voting exclusions."""
+        if not exclusions:
+            return True
+
+        if not self._reconcile_voting(to_remove=exclusions):
+            return False
 
-        The API does not allow to remove a subset of the voting exclusions, at once.
+        # Finally, we clean up the VOTING_TO_DELETE
+        self._charm.peers_data.put(
+            self._scope,
+            VOTING_TO_DELETE,
+            ",".join(self._get_voting_to_delete() - exclusions),
+        )
+        return True
+
+    def _reconcile_voting(
+        self, to_add: Optional[Set[str]] = None, to_remove: Optional[Set[str]] = None
+    ) -> bool:
+        """Converge the registered voting exclusions with the minimal set of API calls.
+
+        The current exclusions are fetched once and no call is sent if they already match.
+        Every change triggers the publication of a new cluster state. The API does not allow
+        to remove a subset of the voting exclusions at once: when removing, all voting
+        exclusions are removed and then the subset that should stay is re-added.
         """
-        current_excl = self._fetch_voting()
+        if (current_excl := self._fetch_voting()) is None:
+            return False
+
         logger.debug("Current voting exclusions: %s", current_excl)
-        if not current_excl:
-            to_stay = None
-        else:
-            to_stay = current_excl - exclusions
-        if current_excl == to_stay:
+        target = (current_excl - (to_remove or set())) | (to_add or set())
+        if target == current_excl:
             # Nothing to do
-            logger.debug("No voting exclusions to delete, current set is %s", to_stay)
+            logger.debug("Voting exclusions already up to date: %s", current_excl)
             return True
 
-        # "wait_for_removal" is VERY important, it removes all voting configs immediately
-        # and allows any node to return to the voting config in the future
         try:
-            response = self._opensearch.request(
-                "DELETE",
-                "/_cluster/voting_config_exclusions?wait_for_removal=false",
-                alt_hosts=self._charm.alt_hosts,
-                resp_status_code=True,
-            )
-            if response >= 400:
-                logger.debug("Failed to remove voting exclusions, response %s", response)
-                return False
-
-            logger.debug("Removed voting for:  %s", exclusions)
-            if to_stay:
-                # Now, we register the units that should stay
+            to_register = target - current_excl
+            if current_excl - target:
+                # "wait_for_removal" is VERY important, it removes all voting configs immediately
+                # and allows any node to return to the voting config in the future
                 response = self._opensearch.request(
-                    "POST",
-                    f"/_cluster/voting_config_exclusions?node_names={','.join(sorted(to_stay))}&timeout=1m",
+                    "DELETE",
+                    "/_cluster/voting_config_exclusions?wait_for_removal=false",
                     alt_hosts=self._charm.alt_hosts,
                     resp_status_code=True,
-                    retries=3,
                 )
                 if response >= 400:
                     logger.debug("Failed to remove voting exclusions, response %s", response)
                     return False
 
-            # Finally, we clean up the VOTING_TO_DELETE
-            self._charm.peers_data.put(
-                self._scope,
-                VOTING_TO_DELETE,
-                ",".join(self._get_voting_to_delete() - exclusions),
+                logger.debug("Removed voting for: %s", current_excl - target)
+                # Now, we register the units that should stay
+                to_register = target
+
+            if not to_register:
+                return True
+
+            response = self._opensearch.request(
+                "POST",
+                f"/_cluster/voting_config_exclusions?node_names={','.join(sorted(to_register))}&timeout=1m",
+                alt_hosts=self._charm.alt_hosts,
+                resp_status_code=True,
+                retries=3,
             )
+            logger.debug("Added voting, response: %s", response)
+
+            # The voting excl. API returns a status only
             return response < 400
         except OpenSearchHttpError:
             return False
 
-    def _fetch_voting(self) -> Set[str]:
-        """Fetch the registered voting exclusions."""
+    def _fetch_voting(self) -> Optional[Set[str]]:
+        """Fetch the registered voting exclusions, None if they could not be fetched."""
         try:
             resp = self._opensearch.request(
                 "GET",
                 "/_cluster/state/metadata/voting_config_exclusions",
                 alt_hosts=self._charm.alt_hosts,
             )
-            return set(
-                sorted(
-                    [
-                        node["node_name"]
-                        for node in resp["metadata"]["cluster_coordination"][
-                            "voting_config_exclusions"
-                        ]
-                    ]
-                )
-            )
-        except (OpenSearchHttpError, KeyError) as e:
+        except OpenSearchHttpError as e:
             logger.warning(f"Failed to fetch voting exclusions: {e}")
+            return None
+
+        try:
+            return {
+                node["node_name"]
+                for node in resp["metadata"]["cluster_coordination"]["voting_config_exclusions"]
+            }
+        except KeyError:
             # no voting exclusion set
-            return {}
+            return set()
 
-    def _add_allocations(
-        self, allocations: Optional[Set[str]] = None, override: bool = False
-    ) -> bool:
+    def _add_allocations(self, allocations: Optional[Set[str]] = None) -> bool:
         """Register new allocation exclusions."""
+        return self._reconcile_allocations(
+            to_add=allocations if allocations is not None else {self._node.name}
+        )
+
+    def _delete_allocations(self, allocs: Optional[List[str]] = None) -> bool:
+        """This removes the allocation exclusions if needed."""
+        return self._reconcile_allocations(
+            to_remove=set(allocs if allocs is not None else [self._node.name])
+        )
+
+    def _reconcile_allocations(
+        self, to_add: Optional[Set[str]] = None, to_remove: Optional[Set[str]] = None
+    ) -> bool:
+        """Converge the allocation exclusions, only updating the setting if it must change."""
         try:
-            existing = set() if override else self._fetch_allocations()
-            all_allocs = existing.union(
-                allocations if allocations is not None else {self._node.name}
-            )
+            existing = self._fetch_allocations()
+            target = (existing - (to_remove or set())) | (to_add or set())
+            if target == existing:
+                logger.debug("Allocation exclusions already up to date: %s", existing)
+                return True
+
             response = self._opensearch.request(
                 "PUT",
                 "/_cluster/settings",
-                {"persistent": {"cluster.routing.allocation.exclude._name": ",".join(all_allocs)}},
+                {
+                    "persistent": {
+                        "cluster.routing.allocation.exclude._name": ",".join(sorted(target))
+                    }
+                },
                 alt_hosts=self._charm.alt_hosts,
             )
             return "acknowledged" in response
         except OpenSearchHttpError:
             return False
 
-    def _delete_allocations(self, allocs: Optional[List[str]] = None) -> bool:
-        """This removes the allocation exclusions if needed."""
-        try:
-            existing = self._fetch_allocations()
-            to_remove = set(allocs if allocs is not None else [self._node.name])
-            res = self._add_allocations(existing - to_remove, override=True)
-            return res
-        except OpenSearchHttpError:
-            return False
-
     def _fetch_allocations(self) -> Set[str]:
-        """Fetch the registered allocation exclusions."""
-        allocation_exclusions = set()
+        """Fetch the registered allocation exclusions.
+
+        Raises:
+            OpenSearchHttpError if the cluster settings could not be fetched
+        """
+        resp = self._opensearch.request(
+            "GET",
+            "/_cluster/settings?filter_path=persistent.cluster.routing.allocation.exclude",
+            alt_hosts=self._charm.alt_hosts,
+        )
         try:
-            resp = self._opensearch.request(
-                "GET", "/_cluster/settings", alt_hosts=self._charm.alt_hosts
-            )
             exclusions = resp["persistent"]["cluster"]["routing"]["allocation"]["exclude"]["_name"]
-            if exclusions:
-                allocation_exclusions = set(exclusions.split(","))
         except KeyError:
             # no allocation exclusion set
-            pass
-        finally:
-            return allocation_exclusions
+            return set()
+
+        return set(filter(None, exclusions.split(",")))
 
     @cached_property
     def _node(self) -> Node:
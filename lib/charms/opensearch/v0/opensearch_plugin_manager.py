@@ -11,18 +11,26 @@ config-changed, upgrade, s3-credentials-changed, etc.
 """
 
 import copy
-import functools
 import logging
+import os
+import shutil
+import tarfile
+import tempfile
 from typing import Any, Dict, List, Optional, Tuple, Type
 
 from charms.opensearch.v0.helper_cluster import ClusterTopology
-from charms.opensearch.v0.opensearch_exceptions import OpenSearchCmdError
+from charms.opensearch.v0.opensearch_exceptions import (
+    OpenSearchCmdError,
+    OpenSearchHttpError,
+)
 from charms.opensearch.v0.opensearch_health import HealthColors
 from charms.opensearch.v0.opensearch_internal_data import Scope
 from charms.opensearch.v0.opensearch_keystore import OpenSearchKeystore
 from charms.opensearch.v0.opensearch_plugins import (
     OpenSearchBackupPlugin,
     OpenSearchKnn,
+    OpenSearchMLCommons,
+    OpenSearchPerformanceAnalyzer,
     OpenSearchPlugin,
     OpenSearchPluginConfig,
     OpenSearchPluginError,
@@ -31,8 +39,11 @@ from charms.opensearch.v0.opensearch_plugins import (
     OpenSearchPluginMissingConfigError,
     OpenSearchPluginMissingDepsError,
     OpenSearchPluginRemoveError,
+    OpenSearchPluginSettingsError,
+    OpenSearchQueryInsights,
     PluginState,
 )
+from ops.model import ModelError
 
 # The unique Charmhub library identifier, never change it
 LIBID = "da838485175f47dbbbb83d76c07cab4c"
@@ -42,7 +53,7 @@ LIBAPI = 0
 
 # Increment this PATCH version before using `charmcraft publish-lib` or reset
 # to 0 if you are raising the major API version
-LIBPATCH = 1
+LIBPATCH = 14
 
 
 logger = logging.getLogger(__name__)
@@ -54,6 +65,21 @@ ConfigExposedPlugins = {
         "config": "plugin_opensearch_knn",
         "relation": None,
     },
+    "opensearch-ml": {
+        "class": OpenSearchMLCommons,
+        "config": "ml_dedicated_nodes",
+        "relation": None,
+    },
+    "opensearch-performance-analyzer": {
+        "class": OpenSearchPerformanceAnalyzer,
+        "config": "plugin_opensearch_performance_analyzer",
+        "relation": None,
+    },
+    "query-insights": {
+        "class": OpenSearchQueryInsights,
+        "config": "plugin_query_insights",
+        "relation": None,
+    },
     "repository-s3": {
         "class": OpenSearchBackupPlugin,
         "config": None,
@@ -76,13 +102,35 @@ class OpenSearchPluginManager:
         self._opensearch_config = charm.opensearch_config
         self._charm_config = self._charm.model.config
         self._plugins_path = self._opensearch.paths.plugins
+        self._artifacts_path = self._opensearch.paths.plugin_artifacts
         self._keystore = OpenSearchKeystore(self._charm)
         self._event_scope = OpenSearchPluginEventScope.DEFAULT
+        # installed plugins, listed at most once per run() and kept up to date with the changes
+        # applied during the run. The keystore keys are cached by OpenSearchKeystore itself.
+        self._snapshot: Optional[Dict[str, List[str]]] = None
+        # cluster settings fetched during the hook, None if unset
+        self._cluster_settings: Dict[str, Any] = {}
+        # memory, JVM heap and processors of the smallest data node, read once per hook
+        self._node_capacity: Optional[Dict[str, int]] = None
+
+    def cluster_config(self, keys: List[str]) -> Dict[str, Any]:
+        """Returns the current value of the given cluster settings, unset ones excluded.
+
+        Only the requested keys are fetched, each of them once per hook. The defaults are
+        included, as the settings of the plugins written to opensearch.yml are reported there.
+        """
+        if missing := [key for key in keys if key not in self._cluster_settings]:
+            settings = ClusterTopology.get_cluster_settings(
+                self._charm.opensearch, include_defaults=True, keys=missing
+            )
+            for key in missing:
+                self._cluster_settings[key] = settings.get(key)
 
-    @functools.cached_property
-    def cluster_config(self):
-        """Returns the cluster configuration."""
-        return ClusterTopology.get_cluster_settings(self._charm.opensearch, include_defaults=True)
+        return {
+            key: self._cluster_settings[key]
+            for key in keys
+            if self._cluster_settings[key] is not None
+        }
 
     def set_event_scope(self, event_scope: OpenSearchPluginEventScope) -> None:
         """Sets the event scope of the plugin manager.
@@ -132,9 +180,62 @@ class OpenSearchPluginManager:
             return {
                 **relation.data[relation.app],
                 **self._charm_config,
+                **self._capacity(),
                 "opensearch-version": self._opensearch.version,
             }
-        return {**self._charm_config, "opensearch-version": self._opensearch.version}
+        return {
+            **self._charm_config,
+            **self._capacity(),
+            "opensearch-version": self._opensearch.version,
+        }
+
+    def _capacity(self) -> Dict[str, int]:
+        """Returns the native memory (out of the JVM heap, in bytes) and processors of a data node.
+
+        The settings sized after them are cluster-wide: the smallest data node of the cluster is
+        used, so that every unit computes the same values. The capacity of the current node is
+        used if the capacity of the data nodes cannot be fetched.
+        """
+        if self._node_capacity is None:
+            self._node_capacity = self._data_nodes_capacity()
+        if self._node_capacity is None:
+            memory = self._opensearch.memory_limit()
+            heap = self._opensearch_config.jvm_heap_mb(memory) * 1024**2
+            self._node_capacity = {
+                "node-native-memory": max(memory - heap, 0),
+                "node-processors": self._opensearch.cpu_limit() or len(os.sched_getaffinity(0)),
+            }
+        return self._node_capacity
+
+    def _data_nodes_capacity(self) -> Optional[Dict[str, int]]:
+        """Returns the smallest native memory and processors of the data nodes, if any.
+
+        The native memory is computed per node before taking the smallest: the node with the
+        least memory is not necessarily the one with the smallest heap.
+        """
+        try:
+            stats = self._opensearch.request(
+                "GET",
+                "/_nodes/data:true/stats/os,jvm?filter_path="
+                "nodes.*.os.mem.total_in_bytes,nodes.*.jvm.mem.heap_max_in_bytes",
+            )
+            info = self._opensearch.request(
+                "GET", "/_nodes/data:true/os?filter_path=nodes.*.os.allocated_processors"
+            )
+            nodes = [
+                (
+                    node["os"]["mem"]["total_in_bytes"] - node["jvm"]["mem"]["heap_max_in_bytes"],
+                    info["nodes"][node_id]["os"]["allocated_processors"],
+                )
+                for node_id, node in stats["nodes"].items()
+            ]
+            return {
+                "node-native-memory": max(min(memory for memory, _ in nodes), 0),
+                "node-processors": min(processors for _, processors in nodes),
+            }
+        except (OpenSearchHttpError, KeyError, TypeError, ValueError) as e:
+            logger.debug(f"Capacity of the data nodes not available: {e}")
+            return None
 
     def check_plugin_manager_ready(self) -> bool:
         """Checks if the plugin manager is ready to run."""
@@ -161,6 +262,16 @@ class OpenSearchPluginManager:
 
         This method should be called at config-changed event. Returns if needed restart.
         """
+        self._snapshot = {}
+        try:
+            self._preload_plugin_artifacts()
+            installed = self._install_missing_plugins()
+            return self._run() or installed
+        finally:
+            self._snapshot = None
+
+    def _run(self) -> bool:
+        """Runs the install, configure, disable and remove steps of each plugin."""
         err_msgs = []
         restart_needed = False
         for plugin in self.plugins:
@@ -186,6 +297,7 @@ class OpenSearchPluginManager:
                 OpenSearchPluginMissingConfigError,
                 OpenSearchPluginInstallError,
                 OpenSearchPluginRemoveError,
+                OpenSearchPluginSettingsError,
             ) as e:
                 # This is a more serious issue, as we are missing some input from
                 # the user. The charm should block.
@@ -202,7 +314,7 @@ class OpenSearchPluginManager:
 
         Returns True if the plugin was installed.
         """
-        installed_plugins = self._installed_plugins()
+        installed_plugins = self._current_installed_plugins()
         if plugin.dependencies:
             missing_deps = [dep for dep in plugin.dependencies if dep not in installed_plugins]
             if missing_deps:
@@ -221,7 +333,10 @@ class OpenSearchPluginManager:
             if missing_deps:
                 raise OpenSearchPluginMissingDepsError(plugin.name, missing_deps)
 
-            self._opensearch.run_bin("opensearch-plugin", f"install --batch {plugin.name}")
+            self._opensearch.run_bin(
+                "opensearch-plugin", f"install --batch {self._plugin_source(plugin.name)}"
+            )
+            self._update_snapshot("installed_plugins", added=[plugin.name])
         except KeyError as e:
             raise OpenSearchPluginMissingConfigError(e)
         except OpenSearchCmdError as e:
@@ -233,6 +348,96 @@ class OpenSearchPluginManager:
         # Install successful
         return True
 
+    def _install_missing_plugins(self) -> bool:
+        """Install in a single opensearch-plugin run all the requested plugins missing.
+
+        Plugins with missing dependencies and failed installs are left to the per-plugin
+        install, which reports the error of each plugin.
+
+        Returns True if the plugins were installed.
+        """
+        try:
+            installed_plugins = self._current_installed_plugins()
+            plugins = [
+                plugin
+                for plugin in self.plugins
+                if plugin.name not in installed_plugins
+                and self._user_requested_to_enable(plugin)
+                and all(dep in installed_plugins for dep in plugin.dependencies)
+            ]
+        except (KeyError, OpenSearchPluginError) as e:
+            logger.warning(f"_install_missing_plugins: error with {e}")
+            return False
+
+        if len(plugins) < 2:
+            # nothing to batch, any single plugin is installed by the per-plugin install
+            return False
+
+        sources = " ".join(self._plugin_source(plugin.name) for plugin in plugins)
+        try:
+            self._opensearch.run_bin("opensearch-plugin", f"install --batch {sources}")
+        except OpenSearchCmdError as e:
+            logger.warning(f"Failed to install the plugins at once, installing one by one: {e}")
+            return False
+
+        self._update_snapshot("installed_plugins", added=[plugin.name for plugin in plugins])
+        return True
+
+    def _plugin_source(self, plugin_name: str) -> str:
+        """Returns the archive of the plugin in the local cache if any, the plugin name if not."""
+        artifact = f"{self._artifacts_path}/{plugin_name}.zip"
+        if os.path.exists(artifact):
+            return f"file://{artifact}"
+        return plugin_name
+
+    def _preload_plugin_artifacts(self) -> None:
+        """Extract the plugin archives of the plugin-artifacts resource into the local cache.
+
+        The resource is only extracted when it changed since it was last extracted. It is
+        extracted in a temporary directory first, then moved into place: a corrupt archive
+        leaves the previous cache untouched.
+        """
+        try:
+            resource = str(self._charm.model.resources.fetch("plugin-artifacts"))
+        except (ModelError, NameError):
+            logger.debug("plugin-artifacts resource not attached, plugins fetched remotely.")
+            return
+
+        stat = os.stat(resource)
+        if not stat.st_size:
+            logger.debug("plugin-artifacts resource empty, plugins fetched remotely.")
+            return
+
+        marker = f"{self._artifacts_path}/.resource"
+        resource_id = f"{stat.st_size}-{stat.st_mtime_ns}"
+        if os.path.exists(marker):
+            with open(marker) as f:
+                if f.read() == resource_id:
+                    return
+
+        parent = os.path.dirname(self._artifacts_path.rstrip("/"))
+        os.makedirs(parent, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=".plugin-artifacts-", dir=parent)
+        try:
+            with tarfile.open(resource) as tar:
+                for member in tar.getmembers():
+                    # only keep the plugin archives, never extract outside of the cache
+                    if not member.isfile() or not member.name.endswith(".zip"):
+                        continue
+                    artifact = f"{staging}/{os.path.basename(member.name)}"
+                    with tar.extractfile(member) as src, open(artifact, "wb") as dst:
+                        dst.write(src.read())
+
+            with open(f"{staging}/.resource", "w") as f:
+                f.write(resource_id)
+
+            shutil.rmtree(self._artifacts_path, ignore_errors=True)
+            os.rename(staging, self._artifacts_path)
+        except (tarfile.TarError, OSError) as e:
+            logger.error(f"Failed to extract the plugin-artifacts resource: {e}")
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
     def _install_if_needed(self, plugin: OpenSearchPlugin) -> bool:
         """Installs all the plugins enabled via the config/relation.
 
@@ -277,7 +482,9 @@ class OpenSearchPluginManager:
         self, config: OpenSearchPluginConfig
     ) -> Tuple[Dict[str, str], Dict[str, str]]:
         """Returns the current and the new configuration."""
-        current_settings = self.cluster_config
+        current_settings = self.cluster_config(
+            list(config.config_entries_to_add) + config.config_entries_to_del
+        )
         # We use current_settings and new_conf and check for any differences
         # therefore, we need to make a deepcopy here before editing new_conf
         new_conf = copy.deepcopy(current_settings)
@@ -313,7 +520,10 @@ class OpenSearchPluginManager:
         1) Remove the entries to be deleted
         2) Add entries, if available
 
-        Returns True if a configuration change was performed.
+        The dynamic config entries are applied live through the cluster settings, the static
+        ones are written to opensearch.yml and only applied once the node restarts.
+
+        Returns True if a static configuration change was performed, requiring a restart.
         """
         self._keystore.delete(config.secret_entries_to_del)
         self._keystore.add(config.secret_entries_to_add)
@@ -326,13 +536,51 @@ class OpenSearchPluginManager:
             logger.info("apply_config: nothing to do, return")
             return False
 
+        def changed(key: str) -> bool:
+            return current_settings.get(key) != new_conf.get(key)
+
+        entries = {key: None for key in config.config_entries_to_del}
+        entries |= config.config_entries_to_add
+        dynamic_settings = {
+            key: val for key, val in entries.items() if key in config.dynamic_config_entries
+        }
+        if any(changed(key) for key in dynamic_settings):
+            self._apply_dynamic_settings(dynamic_settings)
+
+        static_to_del = [
+            key for key in config.config_entries_to_del if key not in dynamic_settings
+        ]
+        static_to_add = {
+            key: val
+            for key, val in config.config_entries_to_add.items()
+            if key not in dynamic_settings
+        }
+        if not any(changed(key) for key in static_to_del + list(static_to_add)):
+            return False
+
         # Update the configuration
-        if config.config_entries_to_del:
-            self._opensearch_config.delete_plugin(config.config_entries_to_del)
-        if config.config_entries_to_add:
-            self._opensearch_config.add_plugin(config.config_entries_to_add)
+        if static_to_del:
+            self._opensearch_config.delete_plugin(static_to_del)
+        if static_to_add:
+            self._opensearch_config.add_plugin(static_to_add)
         return True
 
+    def _apply_dynamic_settings(self, settings: Dict[str, Optional[str]]) -> None:
+        """Set (or reset if None) the given dynamic settings of the cluster, without restart."""
+        try:
+            self._opensearch.request("PUT", "/_cluster/settings", {"persistent": settings})
+        except OpenSearchHttpError as e:
+            raise OpenSearchPluginSettingsError(
+                f"Failed to apply the dynamic settings {settings}: {e}"
+            )
+
+        # the defaults or opensearch.yml values apply to the settings reset
+        for key, val in settings.items():
+            if val is None:
+                self._cluster_settings.pop(key, None)
+            else:
+                self._cluster_settings[key] = val
+
     def status(self, plugin: OpenSearchPlugin) -> PluginState:
         """Returns the status for a given plugin."""
         if not self._is_installed(plugin):
@@ -353,7 +601,7 @@ class OpenSearchPluginManager:
 
     def _is_installed(self, plugin: OpenSearchPlugin) -> bool:
         """Returns true if plugin is installed."""
-        return plugin.name in self._installed_plugins()
+        return plugin.name in self._current_installed_plugins()
 
     def _user_requested_to_enable(self, plugin: OpenSearchPlugin) -> bool:
         """Returns True if user requested plugin to be enabled."""
@@ -424,8 +672,26 @@ class OpenSearchPluginManager:
                 logger.info(f"Plugin {plugin.name} to be deleted, not found. Continuing...")
                 return False
             raise OpenSearchPluginRemoveError(plugin.name)
+        self._update_snapshot("installed_plugins", removed=[plugin.name])
         return True
 
+    def _current_installed_plugins(self) -> List[str]:
+        """List plugins, from the snapshot of the current run if any."""
+        if self._snapshot is None:
+            return self._installed_plugins()
+        if "installed_plugins" not in self._snapshot:
+            self._snapshot["installed_plugins"] = self._installed_plugins()
+        return self._snapshot["installed_plugins"]
+
+    def _update_snapshot(
+        self, key: str, added: Optional[List[str]] = None, removed: Optional[List[str]] = None
+    ) -> None:
+        """Apply a change made during the current run to its snapshot."""
+        if not self._snapshot or key not in self._snapshot:
+            return
+        current = [item for item in self._snapshot[key] if item not in (removed or [])]
+        self._snapshot[key] = current + [item for item in added or [] if item not in current]
+
     def _installed_plugins(self) -> List[str]:
         """List plugins."""
         try:
@@ -134,6 +134,9 @@ class MyPluginConfig(OpenSearchPluginConfig):
     secret_entries_to_del: List[str] = {
         ... key to remove from keystore as plugin gets disabled ...
     }
+    dynamic_config_entries: List[str] = {
+        ... config keys that are dynamic cluster settings, applied without restart ...
+    }
 
 -------------------
 
@@ -287,7 +290,7 @@ LIBAPI = 0
 
 # Increment this PATCH version before using `charmcraft publish-lib` or reset
 # to 0 if you are raising the major API version
-LIBPATCH = 1
+LIBPATCH = 11
 
 logger = logging.getLogger(__name__)
 
@@ -308,6 +311,10 @@ class OpenSearchPluginRemoveError(OpenSearchPluginError):
     """Exception thrown when opensearch plugin removal fails."""
 
 
+class OpenSearchPluginSettingsError(OpenSearchPluginError):
+    """Exception thrown when the cluster rejects the dynamic settings of an opensearch plugin."""
+
+
 class OpenSearchPluginMissingConfigError(OpenSearchPluginError):
     """Exception thrown when config() or disable() fails to find a config key.
 
@@ -337,12 +344,18 @@ class OpenSearchPluginConfig(BaseModel):
 
     The config may receive any type of data, but will convert everything to strings and
     pay attention to special types, such as booleans, which need to be "true" or "false".
+
+    The config entries are static settings by default, written to opensearch.yml and applied
+    by restarting the node. The ones listed in dynamic_config_entries are set live through
+    the cluster settings API instead.
     """
 
     config_entries_to_add: Optional[Dict[str, str]] = {}
     config_entries_to_del: Optional[List[str]] = []
     secret_entries_to_add: Optional[Dict[str, str]] = {}
     secret_entries_to_del: Optional[List[str]] = []
+    # config entries that are dynamic cluster settings, applied without restart
+    dynamic_config_entries: Optional[List[str]] = []
 
     @validator("config_entries_to_add", "secret_entries_to_add", allow_reuse=True, pre=True)
     def convert_values_to_add(cls, conf) -> Dict[str, str]:  # noqa N805
@@ -432,18 +445,73 @@ class OpenSearchPlugin:
 
 
 class OpenSearchKnn(OpenSearchPlugin):
-    """Implements the opensearch-knn plugin."""
+    """Implements the opensearch-knn plugin.
+
+    The native memory of the k-NN graphs, the threads building them and the expiry of the
+    graph cache are sized after the capacity of the smallest data node, unless set in the charm
+    config. They are cluster settings, the same for all the nodes.
+    """
+
+    # memory left out of the JVM heap kept for the OS and the filesystem cache, at least
+    NATIVE_MEMORY_RESERVE = 1024**3
+    CIRCUIT_BREAKER_MIN_PERCENT = 10
+    CIRCUIT_BREAKER_MAX_PERCENT = 50
+    # upper bound of knn.algo_param.index_thread_qty
+    INDEX_THREADS_MAX = 32
+    # below this native memory, graphs not searched for a while are evicted from the cache
+    CACHE_EXPIRY_MAX_NATIVE_MEMORY = 4 * 1024**3
+    CACHE_EXPIRY = "90m"
 
     def config(self) -> OpenSearchPluginConfig:
         """Returns a plugin config object to be applied for enabling the current plugin."""
+        settings = {"knn.plugin.enabled": True, **self._tuning()}
         return OpenSearchPluginConfig(
-            config_entries_to_add={"knn.plugin.enabled": True},
+            config_entries_to_add=settings,
+            dynamic_config_entries=list(settings),
         )
 
+    def _tuning(self) -> Dict[str, Any]:
+        """Returns the resource settings of the plugin, computed or set by the user.
+
+        The graphs live out of the JVM heap: the circuit breaker limit is a percentage of the
+        memory left out of the heap, so that it fits nodes of different sizes. Half of this
+        memory goes to the graphs, less on small nodes to keep room for the OS. The graphs are
+        built with half of the processors of the node.
+        """
+        native_memory = self._extra_config["node-native-memory"]
+
+        if not (limit := self._extra_config.get("knn_memory_circuit_breaker_limit")):
+            reserve = max(self.NATIVE_MEMORY_RESERVE, native_memory // 2)
+            percent = (native_memory - reserve) * 100 // native_memory if native_memory else 0
+            percent = min(
+                max(percent, self.CIRCUIT_BREAKER_MIN_PERCENT), self.CIRCUIT_BREAKER_MAX_PERCENT
+            )
+            limit = f"{percent}%"
+
+        if not (threads := self._extra_config.get("knn_index_thread_qty")):
+            threads = min(
+                max(self._extra_config["node-processors"] // 2, 1), self.INDEX_THREADS_MAX
+            )
+
+        if not (expiry := self._extra_config.get("knn_cache_expiry")):
+            expiry = (
+                self.CACHE_EXPIRY if native_memory < self.CACHE_EXPIRY_MAX_NATIVE_MEMORY else "off"
+            )
+
+        settings = {
+            "knn.memory.circuit_breaker.limit": limit,
+            "knn.algo_param.index_thread_qty": threads,
+            "knn.cache.item.expiry.enabled": expiry != "off",
+        }
+        if expiry != "off":
+            settings["knn.cache.item.expiry.minutes"] = expiry
+        return settings
+
     def disable(self) -> OpenSearchPluginConfig:
         """Returns a plugin config object to be applied for disabling the current plugin."""
         return OpenSearchPluginConfig(
             config_entries_to_add={"knn.plugin.enabled": False},
+            dynamic_config_entries=["knn.plugin.enabled"],
         )
 
     @property
@@ -452,6 +520,134 @@ class OpenSearchKnn(OpenSearchPlugin):
         return "opensearch-knn"
 
 
+class OpenSearchMLCommons(OpenSearchPlugin):
+    """Implements the opensearch-ml plugin settings isolating the ML tasks on the ML nodes."""
+
+    SETTINGS = [
+        "plugins.ml_commons.only_run_on_ml_node",
+        "plugins.ml_commons.native_memory_threshold",
+        "plugins.ml_commons.max_ml_task_per_node",
+    ]
+
+    def config(self) -> OpenSearchPluginConfig:
+        """Returns a plugin config object to be applied for enabling the current plugin."""
+        return OpenSearchPluginConfig(
+            config_entries_to_add={
+                "plugins.ml_commons.only_run_on_ml_node": True,
+                "plugins.ml_commons.native_memory_threshold": self._extra_config[
+                    "ml_native_memory_threshold"
+                ],
+                "plugins.ml_commons.max_ml_task_per_node": self._extra_config[
+                    "ml_max_tasks_per_node"
+                ],
+            },
+            dynamic_config_entries=self.SETTINGS,
+        )
+
+    def disable(self) -> OpenSearchPluginConfig:
+        """Returns a plugin config object to be applied for disabling the current plugin.
+
+        The settings are reset to the defaults of ML Commons, the plugin itself being part of
+        the OpenSearch distribution.
+        """
+        return OpenSearchPluginConfig(
+            config_entries_to_del=self.SETTINGS,
+            dynamic_config_entries=self.SETTINGS,
+        )
+
+    @property
+    def name(self) -> str:
+        """Returns the name of the plugin."""
+        return "opensearch-ml"
+
+
+class OpenSearchQueryInsights(OpenSearchPlugin):
+    """Implements the query-insights plugin, ranking the top queries of the cluster."""
+
+    METRICS = ["latency", "cpu", "memory"]
+    TOP_N_SIZE_MAX = 100
+    WINDOW_SIZES = ["1m", "5m", "10m", "30m"] + [f"{hours}h" for hours in range(1, 25)]
+
+    def config(self) -> OpenSearchPluginConfig:
+        """Returns a plugin config object to be applied for enabling the current plugin."""
+        metrics = [
+            metric.strip() for metric in self._extra_config["query_insights_metrics"].split(",")
+        ]
+        invalid = self._invalid_options(metrics)
+        if invalid:
+            raise OpenSearchPluginMissingConfigError(f"Plugin {self.name} invalid: {invalid}")
+
+        settings = {}
+        for metric in self.METRICS:
+            prefix = f"search.insights.top_queries.{metric}"
+            settings[f"{prefix}.enabled"] = metric in metrics
+            if metric in metrics:
+                settings[f"{prefix}.top_n_size"] = self._extra_config["query_insights_top_n_size"]
+                settings[f"{prefix}.window_size"] = self._extra_config[
+                    "query_insights_window_size"
+                ]
+        return OpenSearchPluginConfig(
+            config_entries_to_add=settings,
+            dynamic_config_entries=list(settings),
+        )
+
+    def _invalid_options(self, metrics: List[str]) -> List[str]:
+        """Returns the options set to values the plugin rejects."""
+        invalid = []
+        if not metrics or any(metric not in self.METRICS for metric in metrics):
+            invalid.append("query_insights_metrics")
+        if not 1 <= int(self._extra_config["query_insights_top_n_size"]) <= self.TOP_N_SIZE_MAX:
+            invalid.append("query_insights_top_n_size")
+        if self._extra_config["query_insights_window_size"] not in self.WINDOW_SIZES:
+            invalid.append("query_insights_window_size")
+        return invalid
+
+    def disable(self) -> OpenSearchPluginConfig:
+        """Returns a plugin config object to be applied for disabling the current plugin."""
+        settings = {
+            f"search.insights.top_queries.{metric}.enabled": False for metric in self.METRICS
+        }
+        return OpenSearchPluginConfig(
+            config_entries_to_add=settings,
+            dynamic_config_entries=list(settings),
+        )
+
+    @property
+    def name(self) -> str:
+        """Returns the name of the plugin."""
+        return "query-insights"
+
+
+class OpenSearchPerformanceAnalyzer(OpenSearchPlugin):
+    """Implements the opensearch-performance-analyzer plugin and its Root Cause Analysis."""
+
+    # composite state of the plugin, as set by its cluster config APIs: bit 0 enables the
+    # Performance Analyzer, bit 1 its Root Cause Analysis engine, bit 2 its logging and bit 3
+    # its batch metrics API, whose retention is set in performance-analyzer.properties
+    STATE_SETTING = "cluster.metadata.perf_analyzer.state"
+    STATE_ENABLED = 0b1011
+    STATE_DISABLED = 0
+
+    def config(self) -> OpenSearchPluginConfig:
+        """Returns a plugin config object to be applied for enabling the current plugin."""
+        return OpenSearchPluginConfig(
+            config_entries_to_add={self.STATE_SETTING: self.STATE_ENABLED},
+            dynamic_config_entries=[self.STATE_SETTING],
+        )
+
+    def disable(self) -> OpenSearchPluginConfig:
+        """Returns a plugin config object to be applied for disabling the current plugin."""
+        return OpenSearchPluginConfig(
+            config_entries_to_add={self.STATE_SETTING: self.STATE_DISABLED},
+            dynamic_config_entries=[self.STATE_SETTING],
+        )
+
+    @property
+    def name(self) -> str:
+        """Returns the name of the plugin."""
+        return "opensearch-performance-analyzer"
+
+
 class OpenSearchBackupPlugin(OpenSearchPlugin):
     """Manage backup configurations.
 
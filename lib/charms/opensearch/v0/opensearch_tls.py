@@ -29,12 +29,17 @@ from charms.opensearch.v0.constants_charm import (
     PeerRelationName,
 )
 from charms.opensearch.v0.constants_tls import TLS_RELATION, CertType
-from charms.opensearch.v0.helper_charm import all_units, run_cmd
+from charms.opensearch.v0.helper_charm import all_units
 from charms.opensearch.v0.helper_networking import get_host_public_ip
-from charms.opensearch.v0.helper_security import generate_password
+from charms.opensearch.v0.helper_security import (
+    cert_issuer,
+    generate_password,
+    pkcs12_certificates,
+    pkcs12_keystore,
+    pkcs12_truststore,
+)
 from charms.opensearch.v0.models import DeploymentType
 from charms.opensearch.v0.opensearch_exceptions import (
-    OpenSearchCmdError,
     OpenSearchError,
     OpenSearchHttpError,
 )
@@ -48,7 +53,7 @@ from charms.tls_certificates_interface.v3.tls_certificates import (
     generate_private_key,
 )
 from ops.charm import ActionEvent, RelationBrokenEvent, RelationCreatedEvent
-from ops.framework import Object
+from ops.framework import Object, StoredState
 
 if typing.TYPE_CHECKING:
     from charms.opensearch.v0.opensearch_base_charm import OpenSearchBaseCharm
@@ -61,7 +66,7 @@ LIBAPI = 0
 
 # Increment this PATCH version before using `charmcraft publish-lib` or reset
 # to 0 if you are raising the major API version
-LIBPATCH = 1
+LIBPATCH = 3
 
 logger = logging.getLogger(__name__)
 
@@ -69,6 +74,8 @@ logger = logging.getLogger(__name__)
 class OpenSearchTLS(Object):
     """Class that Manages OpenSearch relation with TLS Certificates Operator."""
 
+    _stored = StoredState()
+
     def __init__(
         self, charm: "OpenSearchBaseCharm", peer_relation: str, jdk_path: str, certs_path: str
     ):
@@ -78,9 +85,11 @@ class OpenSearchTLS(Object):
         self.peer_relation = peer_relation
         self.jdk_path = jdk_path
         self.certs_path = certs_path
-        self.keytool = self.jdk_path + "/bin/keytool"
         self.certs = TLSCertificatesRequiresV3(charm, TLS_RELATION, expiry_notification_time=23)
 
+        # verified state of the stores on disk, keyed on their fingerprint
+        self._stored.set_default(tls_checks={})
+
         self.framework.observe(
             self.charm.on.set_tls_private_key_action, self._on_set_tls_private_key
         )
@@ -496,10 +505,8 @@ class OpenSearchTLS(Object):
                 merge=True,
             )
 
-    def store_new_ca(self, secrets: Dict[str, Any]) -> bool:  # noqa: C901
+    def store_new_ca(self, secrets: Dict[str, Any]) -> bool:
         """Add new CA cert to trust store."""
-        keytool = f"sudo {self.jdk_path}/bin/keytool"
-
         if not (deployment_desc := self.charm.opensearch_peer_cm.deployment_desc()):
             return False
 
@@ -514,47 +521,27 @@ class OpenSearchTLS(Object):
 
         alias = "ca"
         store_path = f"{self.certs_path}/{alias}.p12"
+        store_pwd = admin_secrets.get("truststore-password")
 
         try:
-            run_cmd(
-                f"""{keytool} -changealias \
-                -alias {alias} \
-                -destalias old-{alias} \
-                -keystore {store_path} \
-                -storetype PKCS12
-            """,
-                f"-storepass {admin_secrets.get('truststore-password')}",
-            )
-            logger.info(f"Current CA {alias} was renamed to old-{alias}.")
-        except OpenSearchCmdError as e:
-            # This message means there was no "ca" alias or store before, if it happens ignore
-            if not (
-                f"Alias <{alias}> does not exist" in e.out
-                or "Keystore file does not exist" in e.out
-            ):
-                raise
-
-        with tempfile.NamedTemporaryFile(mode="w+t") as ca_tmp_file:
-            ca_tmp_file.write(secrets.get("ca-cert"))
-            ca_tmp_file.flush()
-
             try:
-                run_cmd(
-                    f"""{keytool} -importcert \
-                    -trustcacerts \
-                    -noprompt \
-                    -alias {alias} \
-                    -keystore {store_path} \
-                    -file {ca_tmp_file.name} \
-                    -storetype PKCS12
-                """,
-                    f"-storepass {admin_secrets.get('truststore-password')}",
-                )
-                run_cmd(f"sudo chmod +r {store_path}")
-                logger.info("New CA was added to truststore.")
-            except OpenSearchCmdError as e:
-                logging.error(f"Error storing the ca-cert: {e}")
-                return False
+                certificates = self._read_store(store_path, store_pwd)
+            except FileNotFoundError:
+                certificates = {}
+
+            if alias in certificates:
+                certificates[f"old-{alias}"] = certificates.pop(alias)
+                logger.info(f"Current CA {alias} was renamed to old-{alias}.")
+
+            certificates[alias] = secrets.get("ca-cert")
+            self._invalidate_tls_checks()
+            self.charm.opensearch.write_file(
+                store_path, pkcs12_truststore(certificates, store_pwd)
+            )
+            logger.info("New CA was added to truststore.")
+        except ValueError as e:
+            logging.error(f"Error storing the ca-cert: {e}")
+            return False
 
         return True
 
@@ -567,57 +554,39 @@ class OpenSearchTLS(Object):
             return None
 
         try:
-            stored_certs = run_cmd(
-                f"openssl pkcs12 -in {ca_trust_store}",
-                f"-passin pass:{secrets.get('truststore-password')}",
-            ).out
-        except OpenSearchCmdError as e:
+            return self._read_store(ca_trust_store, secrets.get("truststore-password")).get(alias)
+        except ValueError as e:
             logging.error(f"Error reading the current truststore: {e}")
-            return
-
-        # parse output to retrieve the current CA (in case there are many)
-        start_cert_marker = "-----BEGIN CERTIFICATE-----"
-        end_cert_marker = "-----END CERTIFICATE-----"
-        certificates = stored_certs.split(end_cert_marker)
-        for cert in certificates:
-            if f"friendlyName: {alias}" in cert:
-                return f"{start_cert_marker}{cert.split(start_cert_marker)[1]}{end_cert_marker}"
-
-        return None
+            return None
 
     def remove_old_ca(self) -> None:
         """Remove old CA cert from trust store."""
-        keytool = f"sudo {self.jdk_path}/bin/keytool"
         ca_trust_store = f"{self.certs_path}/ca.p12"
         old_alias = "old-ca"
 
         secrets = self.charm.secrets.get_object(Scope.APP, CertType.APP_ADMIN.val)
         store_pwd = secrets.get("truststore-password")
 
-        try:
-            run_cmd(
-                f"""{keytool} \
-                -list \
-                -keystore {ca_trust_store} \
-                -storepass {store_pwd} \
-                -alias {old_alias} \
-                -storetype PKCS12"""
-            )
-        except OpenSearchCmdError as e:
-            # This message means there was no "ca" alias or store before, if it happens ignore
-            if f"Alias <{old_alias}> does not exist" in e.out:
-                return
+        certificates = self._read_store(ca_trust_store, store_pwd)
+        if certificates.pop(old_alias, None) is None:
+            return
 
-        run_cmd(
-            f"""{keytool} \
-            -delete \
-            -keystore {ca_trust_store} \
-            -storepass {store_pwd} \
-            -alias {old_alias} \
-            -storetype PKCS12"""
+        self._invalidate_tls_checks()
+        self.charm.opensearch.write_file(
+            ca_trust_store, pkcs12_truststore(certificates, store_pwd)
         )
         logger.info(f"Removed {old_alias} from truststore.")
 
+    @staticmethod
+    def _read_store(path: str, password: str) -> Dict[str, str]:
+        """Returns the PEM certificates of a PKCS12 keystore or truststore, by alias.
+
+        Raises:
+            ValueError if the store cannot be read with the password.
+        """
+        with open(path, "rb") as f:
+            return pkcs12_certificates(f.read(), password or "")
+
     def update_request_ca_bundle(self) -> None:
         """Create a new chain.pem file for requests module"""
         admin_secret = self.charm.secrets.get_object(Scope.APP, CertType.APP_ADMIN.val)
@@ -637,102 +606,105 @@ class OpenSearchTLS(Object):
         store_path = f"{self.certs_path}/{cert_type}.p12"
 
         # if the TLS certificate is available before the keystore-password, create it anyway
-        if cert_type == CertType.APP_ADMIN:
-            self._create_keystore_pwd_if_not_exists(Scope.APP, cert_type, cert_type.val)
-        else:
-            self._create_keystore_pwd_if_not_exists(Scope.UNIT, cert_type, cert_type.val)
+        scope = Scope.APP if cert_type == CertType.APP_ADMIN else Scope.UNIT
+        self._create_keystore_pwd_if_not_exists(scope, cert_type, cert_type.val)
 
         if not secrets.get("key"):
             logging.error("TLS key not found, quitting.")
             return
 
+        store_pwd = secrets.get("keystore-password") or (
+            self.charm.secrets.get_object(scope, cert_type.val) or {}
+        ).get("keystore-password")
         try:
-            os.remove(store_path)
-        except OSError:
-            pass
-
-        tmp_key = tempfile.NamedTemporaryFile(mode="w+t", suffix=".pem")
-        tmp_key.write(secrets.get("key"))
-        tmp_key.flush()
-        tmp_key.seek(0)
+            keystore = pkcs12_keystore(
+                alias=cert_name,
+                key=secrets.get("key"),
+                cert=secrets.get("cert"),
+                password=store_pwd,
+                key_password=secrets.get("key-password"),
+            )
+        except (ValueError, TypeError, AttributeError) as e:
+            logging.error(f"Error storing the TLS certificates for {cert_name}: {e}")
+            return
 
-        tmp_cert = tempfile.NamedTemporaryFile(mode="w+t", suffix=".cert")
-        tmp_cert.write(secrets.get("cert"))
-        tmp_cert.flush()
-        tmp_cert.seek(0)
+        self._invalidate_tls_checks()
+        self.charm.opensearch.write_file(store_path, keystore)
+        logger.info(f"TLS certificate for {cert_name} stored.")
 
-        try:
-            cmd = f"""openssl pkcs12 -export \
-                -in {tmp_cert.name} \
-                -inkey {tmp_key.name} \
-                -out {store_path} \
-                -name {cert_name}
-            """
-            args = f"-passout pass:{secrets.get('keystore-password')}"
-            if secrets.get("key-password"):
-                args = f"{args} -passin pass:{secrets.get('key-password')}"
-
-            run_cmd(cmd, args)
-            run_cmd(f"sudo chmod +r {store_path}")
-        except OpenSearchCmdError as e:
-            logging.error(f"Error storing the TLS certificates for {cert_name}: {e}")
-        finally:
-            tmp_key.close()
-            tmp_cert.close()
-            logger.info(f"TLS certificate for {cert_name} stored.")
+    def all_tls_resources_stored(self, only_unit_resources: bool = False) -> bool:
+        """Check if all TLS resources are stored on disk.
 
-    def all_tls_resources_stored(self, only_unit_resources: bool = False) -> bool:  # noqa: C901
-        """Check if all TLS resources are stored on disk."""
+        A positive result is cached until one of the stores changes on disk, so that the
+        keystores are only decrypted and parsed again after they were rewritten.
+        """
         cert_types = [CertType.UNIT_TRANSPORT, CertType.UNIT_HTTP]
         if not only_unit_resources:
             cert_types.append(CertType.APP_ADMIN)
 
+        check = "unit" if only_unit_resources else "all"
+        fingerprint = self._stores_fingerprint(cert_types)
+        if self._stored.tls_checks.get(check) == fingerprint:
+            return True
+
+        if not self._tls_resources_stored(cert_types):
+            return False
+
+        self._stored.tls_checks[check] = fingerprint
+        return True
+
+    def _tls_resources_stored(self, cert_types: List[CertType]) -> bool:  # noqa: C901
+        """Check if the stores of the CA and the certificates are on disk and up-to-date."""
         # compare issuer of the cert with the issuer of the CA
         # if they don't match, certs are not up-to-date and need to be renewed after CA rotation
         if not (current_ca := self._read_stored_ca()):
             return False
 
-        # to make sure the content is processed correctly by openssl, temporary store it in a file
-        tmp_ca_file = tempfile.NamedTemporaryFile(mode="w+t")
-        tmp_ca_file.write(current_ca)
-        tmp_ca_file.flush()
-        tmp_ca_file.seek(0)
-
         try:
-            ca_issuer = run_cmd(f"openssl x509 -in {tmp_ca_file.name} -noout -issuer").out
-        except OpenSearchCmdError as e:
+            ca_issuer = cert_issuer(current_ca)
+        except ValueError as e:
             logger.error(f"Error reading the current truststore: {e}")
             return False
-        finally:
-            tmp_ca_file.close()
 
         for cert_type in cert_types:
-            if not exists(f"{self.certs_path}/{cert_type}.p12"):
+            store_path = f"{self.certs_path}/{cert_type}.p12"
+            if not exists(store_path):
                 return False
 
             scope = Scope.APP if cert_type == CertType.APP_ADMIN else Scope.UNIT
             secret = self.charm.secrets.get_object(scope, cert_type.val)
 
             try:
-                cert_issuer = run_cmd(
-                    f"openssl pkcs12 -in {self.certs_path}/{cert_type}.p12",
-                    f"""-nodes \
-                    -passin pass:{secret.get('keystore-password')} \
-                    | openssl x509 -noout -issuer
-                    """,
-                ).out
-            except OpenSearchCmdError as e:
+                cert = self._read_store(store_path, secret.get("keystore-password")).get(
+                    cert_type.val
+                )
+                if not cert or cert_issuer(cert) != ca_issuer:
+                    return False
+            except ValueError as e:
                 logger.error(f"Error reading the current certificate: {e}")
                 return False
             except AttributeError as e:
                 logger.error(f"Error reading secret: {e}")
                 return False
 
-            if cert_issuer != ca_issuer:
-                return False
-
         return True
 
+    def _stores_fingerprint(self, cert_types: List[CertType]) -> str:
+        """Returns a fingerprint of the stores on disk, which changes when any is rewritten."""
+        stats = []
+        for name in ["ca"] + [cert_type.val for cert_type in cert_types]:
+            try:
+                stat = os.stat(f"{self.certs_path}/{name}.p12")
+                stats.append(f"{name}:{stat.st_mtime_ns}:{stat.st_size}")
+            except FileNotFoundError:
+                stats.append(f"{name}:-")
+
+        return ",".join(stats)
+
+    def _invalidate_tls_checks(self) -> None:
+        """Drop the cached verifications of the stores, before the charm rewrites one of them."""
+        self._stored.tls_checks = {}
+
     def all_certificates_available(self) -> bool:
         """Method that checks if all certs available and issued from same CA."""
         secrets = self.charm.secrets
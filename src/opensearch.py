@@ -14,7 +14,7 @@ import subprocess
 import time
 from datetime import datetime
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Union
 
 import requests
 from charms.opensearch.v0.constants_charm import OPENSEARCH_SNAP_REVISION
@@ -41,6 +41,8 @@ logger = logging.getLogger(__name__)
 class OpenSearchSnap(OpenSearchDistribution):
     """Snap distribution of opensearch, only overrides properties and logic proper to the snap."""
 
+    SERVICE_UNIT = "snap.opensearch.daemon.service"
+
     _BASE_SNAP_DIR = "/var/snap/opensearch"
     _SNAP_DATA = f"{_BASE_SNAP_DIR}/current"
     _SNAP_COMMON = f"{_BASE_SNAP_DIR}/common"
@@ -197,7 +199,7 @@ class OpenSearchSnap(OpenSearchDistribution):
             bin=f"{self._SNAP}/usr/share/opensearch/bin",
         )
 
-    def write_file(self, path: str, data: str, override: bool = True):
+    def write_file(self, path: str, data: Union[str, bytes], override: bool = True):
         """Snap implementation of the write_file."""
         super().write_file(path, data, override=override)
 
@@ -209,6 +211,8 @@ class OpenSearchSnap(OpenSearchDistribution):
 class OpenSearchTarball(OpenSearchDistribution):
     """Tarball distro of opensearch, only overrides properties and logic proper to the tar."""
 
+    SERVICE_UNIT = "opensearch.service"
+
     def __init__(self, charm, peer_relation: str):
         super().__init__(charm, peer_relation)
         self._create_directories()
@@ -173,11 +173,18 @@ def mock_response_mynode(
 
 
 def mock_response_lock_not_requested(host):
-    expected_response = {"unit-name": ""}
+    expected_response = {
+        "_index": ".charm_node_lock",
+        "_id": "0",
+        "_seq_no": 0,
+        "_primary_term": 1,
+        "found": True,
+        "_source": {"unit-name": ""},
+    }
 
     responses.add(
         method="GET",
-        url=f"https://{host}:9200/.charm_node_lock/_source/0",
+        url=f"https://{host}:9200/.charm_node_lock/_doc/0",
         json=expected_response,
         status=200,
     )
@@ -5,7 +5,11 @@
 
 import unittest
 
-from charms.opensearch.v0.constants_charm import PeerRelationName
+from charms.opensearch.v0.constants_charm import (
+    PeerRelationName,
+    PerformanceProfileInvalid,
+    WaitingForSpecificBusyShards,
+)
 from charms.opensearch.v0.helper_charm import Status, mask_sensitive_information
 from ops.model import BlockedStatus, MaintenanceStatus, WaitingStatus
 from ops.testing import Harness
@@ -46,6 +50,27 @@ class TestHelperDatabag(unittest.TestCase):
         self.status.clear(message_template, pattern=Status.CheckPattern.Interpolated)
         self.assertEqual(self.charm.unit.status.name, "active")
 
+    def test_clear_status_interpolated(self):
+        """Only statuses built from the message template are cleared."""
+        message_template = "Message {} filled by {}."
+
+        self.charm.unit.status = BlockedStatus("Another status.")
+        self.status.clear(message_template, pattern=Status.CheckPattern.Interpolated)
+        self.assertEqual(self.charm.unit.status, BlockedStatus("Another status."))
+
+        # the template is matched literally, apart from its placeholders
+        self.charm.unit.status = BlockedStatus("Message 5 filled by unit tests!")
+        self.status.clear(message_template, pattern=Status.CheckPattern.Interpolated)
+        self.assertEqual(self.charm.unit.status.name, "blocked")
+
+        self.charm.unit.status = WaitingStatus(
+            WaitingForSpecificBusyShards.format("index/0 - index/1")
+        )
+        self.status.clear(PerformanceProfileInvalid, pattern=Status.CheckPattern.Interpolated)
+        self.assertEqual(self.charm.unit.status.name, "waiting")
+        self.status.clear(WaitingForSpecificBusyShards, pattern=Status.CheckPattern.Interpolated)
+        self.assertEqual(self.charm.unit.status.name, "active")
+
     def test_mask_sensitive_information(self):
         """Verify the pattern to remove sensitive information from the logs."""
         command_to_test = """-tspass mypasswd \
@@ -314,3 +314,28 @@ class TestHelperCluster(unittest.TestCase):
             host=None,
             alt_hosts=None,
         )
+
+    @patch("charms.opensearch.v0.opensearch_distro.OpenSearchDistribution.request")
+    def test_get_cluster_settings_filtered(self, request_mock):
+        """Test fetching only some of the cluster settings."""
+        request_mock.return_value = {
+            "defaults": {"knn": {"plugin": {"enabled": "false"}}},
+            "persistent": {"knn": {"plugin": {"enabled": "true"}, "algo_param": {"ef": "512"}}},
+        }
+
+        settings = ClusterTopology.get_cluster_settings(
+            self.opensearch,
+            include_defaults=True,
+            keys=["knn.plugin.enabled", "plugins.query.enabled"],
+        )
+
+        self.assertEqual(settings, {"knn.plugin.enabled": "true"})
+        request_mock.assert_called_once_with(
+            "GET",
+            "/_cluster/settings?include_defaults=true&filter_path="
+            "defaults.knn.plugin.enabled,defaults.plugins.query.enabled,"
+            "persistent.knn.plugin.enabled,persistent.plugins.query.enabled,"
+            "transient.knn.plugin.enabled,transient.plugins.query.enabled",
+            host=None,
+            alt_hosts=None,
+        )
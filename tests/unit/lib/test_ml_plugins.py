@@ -8,7 +8,11 @@ from unittest.mock import MagicMock, PropertyMock, patch
 import charms
 from charms.opensearch.v0.models import App, Node
 from charms.opensearch.v0.opensearch_health import HealthColors
-from charms.opensearch.v0.opensearch_plugins import OpenSearchKnn, PluginState
+from charms.opensearch.v0.opensearch_plugins import (
+    OpenSearchKnn,
+    OpenSearchMLCommons,
+    PluginState,
+)
 from ops.testing import Harness
 
 from charm import OpenSearchOperatorCharm
@@ -53,8 +57,14 @@ class TestOpenSearchKNN(unittest.TestCase):
             }
         }
         self.charm.opensearch.is_started = MagicMock(return_value=True)
+        self.charm.opensearch_config.set_jvm_heap_and_gc = MagicMock(return_value=False)
+        self.charm.opensearch_config.set_performance_profile = MagicMock(return_value=False)
+        self.charm.opensearch_config.set_tls_protocols = MagicMock(return_value=False)
+        self.charm.opensearch_config.set_compression = MagicMock(return_value=False)
+        self.charm.opensearch_config.set_ml_thread_pools = MagicMock(return_value=False)
         self.charm.health.apply = MagicMock(return_value=HealthColors.GREEN)
         self.plugin_manager._is_cluster_ready = MagicMock(return_value=True)
+        self.plugin_manager._data_nodes_capacity = MagicMock(return_value=None)
         charms.opensearch.v0.helper_cluster.ClusterTopology.get_cluster_settings = MagicMock(
             return_value={}
         )
@@ -117,10 +127,92 @@ class TestOpenSearchKNN(unittest.TestCase):
         self.charm.planned_units = MagicMock(return_value=1)
         self.charm.plugin_manager.check_plugin_manager_ready = MagicMock()
         self.charm._restart_opensearch_event = MagicMock()
+        self.charm.opensearch.request = MagicMock(return_value={"acknowledged": True})
 
         self.harness.update_config({"plugin_opensearch_knn": False})
         self.charm.plugin_manager.check_plugin_manager_ready.assert_called()
-        self.charm._restart_opensearch_event.emit.assert_called_once()
-        self.plugin_manager._opensearch_config.add_plugin.assert_called_once_with(
-            {"knn.plugin.enabled": "false"}
+        # knn.plugin.enabled is a dynamic setting: applied live, without restart
+        self.charm._restart_opensearch_event.emit.assert_not_called()
+        self.plugin_manager._opensearch_config.add_plugin.assert_not_called()
+        self.charm.opensearch.request.assert_called_once_with(
+            "PUT", "/_cluster/settings", {"persistent": {"knn.plugin.enabled": "false"}}
         )
+
+    def test_config_tuned_after_node_capacity(self) -> None:
+        """The k-NN resources are sized after the capacity of the node, unless configured."""
+        gb = 1024**3
+        plugin = OpenSearchKnn(
+            "tests/unit/resources",
+            extra_config={"node-native-memory": 16 * gb, "node-processors": 8},
+        )
+        self.assertEqual(
+            plugin.config().config_entries_to_add,
+            {
+                "knn.plugin.enabled": "true",
+                "knn.memory.circuit_breaker.limit": "50%",
+                "knn.algo_param.index_thread_qty": "4",
+                "knn.cache.item.expiry.enabled": "false",
+            },
+        )
+
+        # small node: less memory to the graphs, evicted when unused
+        plugin = OpenSearchKnn(
+            "tests/unit/resources",
+            extra_config={"node-native-memory": int(1.5 * gb), "node-processors": 1},
+        )
+        config = plugin.config()
+        self.assertEqual(
+            config.config_entries_to_add,
+            {
+                "knn.plugin.enabled": "true",
+                "knn.memory.circuit_breaker.limit": "33%",
+                "knn.algo_param.index_thread_qty": "1",
+                "knn.cache.item.expiry.enabled": "true",
+                "knn.cache.item.expiry.minutes": "90m",
+            },
+        )
+        self.assertEqual(config.dynamic_config_entries, list(config.config_entries_to_add))
+
+        plugin = OpenSearchKnn(
+            "tests/unit/resources",
+            extra_config={
+                "node-native-memory": int(1.5 * gb),
+                "node-processors": 1,
+                "knn_memory_circuit_breaker_limit": "1gb",
+                "knn_index_thread_qty": 2,
+                "knn_cache_expiry": "off",
+            },
+        )
+        self.assertEqual(
+            plugin.config().config_entries_to_add,
+            {
+                "knn.plugin.enabled": "true",
+                "knn.memory.circuit_breaker.limit": "1gb",
+                "knn.algo_param.index_thread_qty": "2",
+                "knn.cache.item.expiry.enabled": "false",
+            },
+        )
+
+
+class TestOpenSearchMLCommons(unittest.TestCase):
+    def test_config(self) -> None:
+        """The ML isolation settings are dynamic and reset to the defaults when disabled."""
+        plugin = OpenSearchMLCommons(
+            "tests/unit/resources",
+            extra_config={"ml_native_memory_threshold": 80, "ml_max_tasks_per_node": 4},
+        )
+        config = plugin.config()
+        self.assertEqual(
+            config.config_entries_to_add,
+            {
+                "plugins.ml_commons.only_run_on_ml_node": "true",
+                "plugins.ml_commons.native_memory_threshold": "80",
+                "plugins.ml_commons.max_ml_task_per_node": "4",
+            },
+        )
+        self.assertEqual(config.dynamic_config_entries, list(config.config_entries_to_add))
+
+        config = plugin.disable()
+        self.assertEqual(config.config_entries_to_add, {})
+        self.assertEqual(config.config_entries_to_del, OpenSearchMLCommons.SETTINGS)
+        self.assertEqual(config.dynamic_config_entries, OpenSearchMLCommons.SETTINGS)
@@ -7,7 +7,10 @@ import unittest
 from datetime import datetime, timedelta
 from unittest.mock import MagicMock, call, patch
 
-from charms.opensearch.v0.constants_charm import NodeLockRelationName
+from charms.opensearch.v0.constants_charm import (
+    MLDedicatedNodeMissing,
+    NodeLockRelationName,
+)
 from charms.opensearch.v0.constants_tls import CertType
 from charms.opensearch.v0.models import (
     App,
@@ -17,6 +20,7 @@ from charms.opensearch.v0.models import (
     Directive,
     Node,
     PeerClusterConfig,
+    PerformanceProfile,
     StartMode,
     State,
 )
@@ -26,7 +30,7 @@ from charms.opensearch.v0.opensearch_exceptions import (
     OpenSearchInstallError,
 )
 from charms.opensearch.v0.opensearch_internal_data import Scope
-from ops.model import ActiveStatus, BlockedStatus
+from ops.model import ActiveStatus, BlockedStatus, MaintenanceStatus
 from ops.testing import Harness
 
 from charm import OpenSearchOperatorCharm
@@ -414,3 +418,97 @@ class TestOpenSearchBaseCharm(unittest.TestCase):
     def test_unit_id(self):
         """Test retrieving the integer id pf a unit."""
         self.assertEqual(self.charm.unit_id, 0)
+
+    @patch(f"{PEER_CLUSTERS_MANAGER}.deployment_desc")
+    def test_set_node_conf_static_settings(self, deployment_desc):
+        """The static settings set by the user are written before (re)starting the node."""
+        deployment_desc.return_value = self.deployment_descriptions["ok"]
+        self.charm.opensearch_config = MagicMock()
+        self.charm._set_performance_analyzer_conf = MagicMock()
+        self.charm._set_ml_node_conf = MagicMock()
+        with self.harness.hooks_disabled():
+            self.harness.update_config(
+                {"tls_min_version": "TLSv1.3", "performance_profile": "search-heavy"}
+            )
+
+        self.charm._set_node_conf([])
+
+        self.charm.opensearch_config.set_tls_protocols.assert_called_once_with("TLSv1.3")
+        self.charm.opensearch_config.set_performance_profile.assert_called_once_with(
+            PerformanceProfile.SEARCH_HEAVY
+        )
+        self.charm.opensearch_config.set_compression.assert_called_once()
+
+    def test_check_ml_dedicated_nodes(self):
+        """The app is blocked while the ML tasks have no dedicated ML node to run on."""
+        self.harness.set_leader(True)
+        nodes = [
+            Node(
+                name=f"node{i}",
+                roles=roles,
+                ip=f"1.1.1.{i}",
+                app=self.deployment_descriptions["ok"].app,
+                unit_number=i,
+            )
+            for i, roles in enumerate([["cluster_manager", "data"], ["data", "ml"]])
+        ]
+        self.charm._get_nodes = MagicMock(return_value=nodes)
+        with self.harness.hooks_disabled():
+            self.harness.update_config({"ml_dedicated_nodes": True})
+
+        self.charm._check_ml_dedicated_nodes()
+        self.assertEqual(self.harness.model.app.status, BlockedStatus(MLDedicatedNodeMissing))
+
+        nodes.append(
+            Node(
+                name="node2",
+                roles=["ml"],
+                ip="1.1.1.2",
+                app=self.deployment_descriptions["ok"].app,
+                unit_number=2,
+            )
+        )
+        self.charm._check_ml_dedicated_nodes()
+        self.assertEqual(self.harness.model.app.status, ActiveStatus(""))
+
+        # cleared when the option is disabled
+        nodes.pop()
+        self.charm._check_ml_dedicated_nodes()
+        self.assertEqual(self.harness.model.app.status, BlockedStatus(MLDedicatedNodeMissing))
+        with self.harness.hooks_disabled():
+            self.harness.update_config({"ml_dedicated_nodes": False})
+        self.charm._check_ml_dedicated_nodes()
+        self.assertEqual(self.harness.model.app.status, ActiveStatus(""))
+
+    def test_warmup_knn_indices(self):
+        """Test the k-NN graphs of the configured indices are loaded, with progress reported."""
+        self.opensearch.request = MagicMock(
+            side_effect=[
+                {"_shards": {"total": 2, "successful": 2, "failed": 0}},
+                OpenSearchHttpError(response_code=504),
+            ]
+        )
+        self.charm._warmup_knn_indices()
+        self.opensearch.request.assert_not_called()
+
+        with self.harness.hooks_disabled():
+            self.harness.update_config({"knn_warmup_indices": "vectors-a, vectors-b"})
+
+        with patch.object(self.charm.status, "set", wraps=self.charm.status.set) as status_set:
+            self.charm._warmup_knn_indices()
+
+        self.opensearch.request.assert_has_calls(
+            [
+                call("GET", "/_plugins/_knn/warmup/vectors-a", timeout=300),
+                call("GET", "/_plugins/_knn/warmup/vectors-b", timeout=300),
+            ]
+        )
+        self.assertEqual(
+            [args[0].message for args, _ in status_set.call_args_list],
+            [
+                "Warming up the k-NN graphs of vectors-a (1/2)...",
+                "Warming up the k-NN graphs of vectors-b (2/2)...",
+            ],
+        )
+        # the failed warmup does not block the unit
+        self.assertNotIsInstance(self.charm.unit.status, MaintenanceStatus)
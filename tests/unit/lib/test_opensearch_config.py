@@ -19,6 +19,7 @@ from lib.charms.opensearch.v0.models import (
     DeploymentState,
     DeploymentType,
     PeerClusterConfig,
+    PerformanceProfile,
     StartMode,
     State,
 )
@@ -159,6 +160,49 @@ class TestOpenSearchConfig(unittest.TestCase):
                 "123",
             )
 
+    def test_set_tls_protocols(self):
+        """Test setting the TLS protocols and ciphers of the node."""
+        self.assertTrue(self.opensearch_config.set_tls_protocols())
+
+        opensearch_conf = self.yaml_conf_setter.load(self.opensearch_yml)
+        for layer in ["http", "transport"]:
+            self.assertEqual(
+                opensearch_conf[f"plugins.security.ssl.{layer}.enabled_protocols"],
+                ["TLSv1.3", "TLSv1.2"],
+            )
+            self.assertIn(
+                "TLS_AES_256_GCM_SHA384",
+                opensearch_conf[f"plugins.security.ssl.{layer}.enabled_ciphers"],
+            )
+            self.assertIn(
+                "TLS_ECDHE_RSA_WITH_AES_256_GCM_SHA384",
+                opensearch_conf[f"plugins.security.ssl.{layer}.enabled_ciphers"],
+            )
+        self.assertFalse(self.opensearch_config.set_tls_protocols())
+
+        # TLS 1.3 only
+        self.assertTrue(self.opensearch_config.set_tls_protocols("TLSv1.3"))
+        self.assertFalse(self.opensearch_config.set_tls_protocols("TLSv1.3", layers=["http"]))
+        opensearch_conf = self.yaml_conf_setter.load(self.opensearch_yml)
+        for layer in ["http", "transport"]:
+            self.assertEqual(
+                opensearch_conf[f"plugins.security.ssl.{layer}.enabled_protocols"], ["TLSv1.3"]
+            )
+            self.assertFalse(
+                [
+                    cipher
+                    for cipher in opensearch_conf[f"plugins.security.ssl.{layer}.enabled_ciphers"]
+                    if cipher.startswith("TLS_ECDHE")
+                ]
+            )
+
+        with open(self.jvm_options) as f:
+            jvm_options = f.read().splitlines()
+        self.assertIn("-Djdk.tls.client.protocols=TLSv1.3", jvm_options)
+        self.assertEqual(
+            len([option for option in jvm_options if "jdk.tls.client.protocols" in option]), 1
+        )
+
     def test_append_transport_node(self):
         """Test setting the transport config of node."""
         opensearch_conf = self.yaml_conf_setter.load(self.opensearch_yml)
@@ -194,8 +238,10 @@ class TestOpenSearchConfig(unittest.TestCase):
             cm_ips=["20.20.20.20"],
             contribute_to_bootstrap=True,
             node_temperature="hot",
+            processors=2,
         )
         opensearch_conf = self.yaml_conf_setter.load(self.opensearch_yml)
+        self.assertEqual(opensearch_conf["node.processors"], 2)
         self.assertEqual(opensearch_conf["cluster.name"], "opensearch-dev")
         self.assertEqual(opensearch_conf["node.name"], self.charm.unit_name)
         self.assertEqual(opensearch_conf["node.attr.temp"], "hot")
@@ -224,5 +270,129 @@ class TestOpenSearchConfig(unittest.TestCase):
             expected = {"20.20.20.20"}
             self.assertEqual(stored, expected)
 
+    def test_set_jvm_heap_and_gc(self):
+        """Test the sizing of the JVM heap and the tuning of G1 after the memory."""
+
+        def jvm_options():
+            with open(self.jvm_options) as f:
+                return f.read().splitlines()
+
+        gib = 1024**3
+
+        # small heap: half of the memory, smaller G1 regions and reserve
+        self.assertTrue(self.opensearch_config.set_jvm_heap_and_gc(6 * gib))
+        options = jvm_options()
+        self.assertIn("-Xms3072m", options)
+        self.assertIn("-Xmx3072m", options)
+        self.assertNotIn("-Xmx1g", options)
+        self.assertIn("11-:-XX:G1ReservePercent=15", options)
+        self.assertIn("11-:-XX:G1HeapRegionSize=4m", options)
+        self.assertIn("11-:-XX:InitiatingHeapOccupancyPercent=30", options)
+        self.assertIn("11-:-XX:+UseG1GC", options)
+
+        # nothing changes with the same memory
+        self.assertFalse(self.opensearch_config.set_jvm_heap_and_gc(6 * gib))
+        self.assertEqual(options, jvm_options())
+
+        # large heap: capped below the compressed oops threshold, default G1 settings
+        self.assertTrue(self.opensearch_config.set_jvm_heap_and_gc(128 * gib))
+        options = jvm_options()
+        self.assertIn("-Xms31744m", options)
+        self.assertIn("-Xmx31744m", options)
+        self.assertIn("11-:-XX:G1ReservePercent=25", options)
+        self.assertFalse([option for option in options if "G1HeapRegionSize" in option])
+        self.assertEqual(len([option for option in options if option.startswith("-Xms")]), 1)
+
+    def test_set_performance_profile(self):
+        """Test the node settings of the performance profiles."""
+        # the default profile keeps the defaults of OpenSearch: no restart on upgrade
+        self.assertFalse(
+            self.opensearch_config.set_performance_profile(PerformanceProfile.BALANCED)
+        )
+
+        self.assertTrue(
+            self.opensearch_config.set_performance_profile(PerformanceProfile.INGEST_HEAVY)
+        )
+        opensearch_conf = self.yaml_conf_setter.load(self.opensearch_yml)
+        self.assertEqual(opensearch_conf["indices.memory.index_buffer_size"], "20%")
+        self.assertEqual(opensearch_conf["thread_pool.write.queue_size"], 20000)
+        self.assertEqual(opensearch_conf["cluster.default.index.refresh_interval"], "30s")
+
+        # nothing changes with the same profile
+        self.assertFalse(
+            self.opensearch_config.set_performance_profile(PerformanceProfile.INGEST_HEAVY)
+        )
+
+        self.assertTrue(
+            self.opensearch_config.set_performance_profile(PerformanceProfile.SEARCH_HEAVY)
+        )
+        opensearch_conf = self.yaml_conf_setter.load(self.opensearch_yml)
+        self.assertEqual(opensearch_conf["indices.memory.index_buffer_size"], "10%")
+        self.assertEqual(opensearch_conf["thread_pool.search.queue_size"], 2000)
+        self.assertEqual(opensearch_conf["indices.fielddata.cache.size"], "30%")
+        self.assertEqual(opensearch_conf["indices.requests.cache.size"], "2%")
+
+        # back to the defaults of OpenSearch
+        self.assertTrue(
+            self.opensearch_config.set_performance_profile(PerformanceProfile.BALANCED)
+        )
+        opensearch_conf = self.yaml_conf_setter.load(self.opensearch_yml)
+        self.assertFalse(
+            [key for key in opensearch_conf if key.startswith(("indices.", "thread_pool."))]
+        )
+        self.assertNotIn("cluster.default.index.refresh_interval", opensearch_conf)
+
+    def test_set_performance_analyzer(self):
+        """Test setting the port and storage limits of the performance analyzer."""
+        properties = copy_file_content_to_tmp(
+            self.config_path, self.opensearch_config.PERFORMANCE_ANALYZER_PROPERTIES
+        )
+
+        # defaults of the plugin
+        self.assertFalse(self.opensearch_config.set_performance_analyzer(port=9600, retention=7))
+
+        self.assertTrue(self.opensearch_config.set_performance_analyzer(port=9600, retention=3))
+        with open(properties) as f:
+            lines = f.read().splitlines()
+        self.assertIn("batch-metrics-retention-period-minutes = 3", lines)
+        self.assertIn("webservice-listener-port = 9600", lines)
+        self.assertIn("cleanup-metrics-db-files = true", lines)
+        self.assertEqual(
+            len([line for line in lines if line.startswith("batch-metrics-retention")]), 1
+        )
+
+    def test_set_ml_thread_pools(self):
+        """Test the ML thread pools are only sized on the ML nodes dedicated to ML tasks."""
+        self.yaml_conf_setter.put(self.opensearch_yml, "node.roles", ["data"])
+        self.assertFalse(self.opensearch_config.set_ml_thread_pools(dedicated=True, processors=8))
+        self.yaml_conf_setter.put(self.opensearch_yml, "node.roles", ["data", "ml"])
+        self.assertFalse(self.opensearch_config.set_ml_thread_pools(dedicated=True, processors=8))
+
+        self.yaml_conf_setter.put(self.opensearch_yml, "node.roles", ["ml"])
+        self.assertFalse(self.opensearch_config.set_ml_thread_pools(dedicated=False, processors=8))
+        self.assertTrue(self.opensearch_config.set_ml_thread_pools(dedicated=True, processors=8))
+        opensearch_conf = self.yaml_conf_setter.load(self.opensearch_yml)
+        self.assertEqual(opensearch_conf["thread_pool.ml_commons.opensearch_ml_predict.size"], 8)
+        self.assertEqual(opensearch_conf["thread_pool.ml_commons.opensearch_ml_train.size"], 4)
+        self.assertFalse(self.opensearch_config.set_ml_thread_pools(dedicated=True, processors=8))
+
+        self.assertTrue(self.opensearch_config.set_ml_thread_pools(dedicated=False, processors=8))
+        opensearch_conf = self.yaml_conf_setter.load(self.opensearch_yml)
+        self.assertNotIn("thread_pool.ml_commons.opensearch_ml_predict.size", opensearch_conf)
+        self.assertNotIn("thread_pool.ml_commons.opensearch_ml_train.size", opensearch_conf)
+
+    def test_set_compression(self):
+        """Test setting the compression of the transport and HTTP layers."""
+        self.assertTrue(self.opensearch_config.set_compression(transport=True, http=True))
+        opensearch_conf = self.yaml_conf_setter.load(self.opensearch_yml)
+        self.assertTrue(opensearch_conf["transport.compress"])
+        self.assertTrue(opensearch_conf["http.compression"])
+
+        self.assertFalse(self.opensearch_config.set_compression(transport=True, http=True))
+
+        self.assertTrue(self.opensearch_config.set_compression(transport=False, http=True))
+        opensearch_conf = self.yaml_conf_setter.load(self.opensearch_yml)
+        self.assertFalse(opensearch_conf["transport.compress"])
+
     def tearDown(self) -> None:
         shutil.rmtree(f"{self.config_path}/tmp")
@@ -2,8 +2,10 @@
 # See LICENSE file for licensing details.
 
 import json
+import os
+import tempfile
 import unittest
-from unittest.mock import patch
+from unittest.mock import mock_open, patch
 
 import pytest
 import responses
@@ -141,3 +143,132 @@ class TestOpenSearchConfig(unittest.TestCase):
             self.charm.opensearch.current()
 
         assert str(err.value) == "Can not determine roles."
+
+    @patch("os.sched_getaffinity", return_value=set(range(16)))
+    @patch("charms.opensearch.v0.opensearch_distro.exists")
+    def test_distro_cpu_limit(self, mock_exists, _):
+        """Processors available to the node from the cgroup v2 CPU quota."""
+        mock_exists.side_effect = lambda path: path == "/sys/fs/cgroup/cpu.max"
+
+        with patch("builtins.open", mock_open(read_data="250000 100000\n")):
+            assert self.charm.opensearch.cpu_limit() == 3
+
+        # no quota
+        with patch("builtins.open", mock_open(read_data="max 100000\n")):
+            assert self.charm.opensearch.cpu_limit() is None
+
+        # quota above the CPUs the unit runs on
+        with patch("builtins.open", mock_open(read_data="3200000 100000\n")):
+            assert self.charm.opensearch.cpu_limit() is None
+
+    @patch("charms.opensearch.v0.opensearch_distro.exists", return_value=True)
+    @patch(
+        "charms.opensearch.v0.helper_conf_setter.YamlConfigSetter.load",
+        return_value={"bootstrap.memory_lock": True},
+    )
+    def test_distro_missing_sys_requirements(self, *_):
+        """System requirements read from /proc and /sys without spawning processes."""
+        files = {
+            "/proc/sys/vm/max_map_count": "65530\n",
+            "/proc/sys/vm/swappiness": "0\n",
+            "/proc/sys/net/ipv4/tcp_retries2": "15\n",
+            "/proc/sys/fs/file-max": "9223372036854775807\n",
+            "/sys/fs/cgroup/system.slice/snap.opensearch.daemon.service/cgroup.procs": "1\n",
+            "/proc/1/limits": (
+                "Limit                     Soft Limit           Hard Limit           Units\n"
+                "Max open files            4096                 1048576              files\n"
+                "Max locked memory         8388608              8388608              bytes\n"
+            ),
+            "/sys/kernel/mm/transparent_hugepage/enabled": "[always] madvise never\n",
+        }
+        written = {}
+
+        def _open(path, mode="r", *args, **kwargs):
+            if "w" in mode:
+                written[path] = True
+                if path == "/proc/sys/vm/max_map_count":
+                    return mock_open()(path, mode)
+                raise PermissionError(path)
+
+            content = files[path]
+            if path == "/proc/sys/vm/max_map_count" and path in written:
+                content = "262144\n"
+            return mock_open(read_data=content.encode() if "b" in mode else content)(path, mode)
+
+        with patch("builtins.open", _open), patch("subprocess.run") as run:
+            missing = self.charm.opensearch.missing_sys_requirements()
+            run.assert_not_called()
+
+        assert missing == [
+            "net.ipv4.tcp_retries2 should be at most 5",
+            "open files limit should be at least 65535",
+            "locked memory limit should be unlimited",
+            "transparent huge pages should be madvise or never",
+        ]
+        # the host-wide transparent huge pages setting is left as is
+        assert "/sys/kernel/mm/transparent_hugepage/enabled" not in written
+
+    @patch("charms.opensearch.v0.opensearch_distro.OpenSearchDistribution._run_cmd")
+    @patch("charms.opensearch.v0.opensearch_distro.OpenSearchDistribution._data_mount")
+    @patch(
+        "charms.opensearch.v0.opensearch_distro.OpenSearchDistribution._data_block_device_queue"
+    )
+    def test_distro_tune_data_storage(self, mock_queue, mock_mount, mock_run_cmd):
+        """Tuning of the block device and mount of the data storage."""
+        with tempfile.TemporaryDirectory() as queue:
+            for name, content in [
+                ("rotational", "0\n"),
+                ("scheduler", "[mq-deadline] none\n"),
+                ("read_ahead_kb", "4096\n"),
+            ]:
+                with open(f"{queue}/{name}", "w") as f:
+                    f.write(content)
+
+            mock_queue.return_value = queue
+            mock_mount.return_value = ("/var/snap/opensearch/common", ["rw", "relatime"])
+            self.charm.opensearch.paths.data = queue
+
+            # disabled by default: the current settings are only reported
+            assert self.charm.opensearch.tune_data_storage() == {
+                "scheduler": "mq-deadline",
+                "read_ahead_kb": "4096",
+                "mount": "relatime",
+            }
+            mock_run_cmd.assert_not_called()
+            with open(f"{queue}/scheduler") as f:
+                assert f.read() == "[mq-deadline] none\n"
+            with open(f"{queue}/read_ahead_kb") as f:
+                assert f.read() == "4096\n"
+
+            assert self.charm.opensearch.tune_data_storage(tune=True) == {
+                "scheduler": "none",
+                "read_ahead_kb": "128",
+                "mount": "noatime",
+            }
+            mock_run_cmd.assert_called_once_with(
+                "mount", "-o remount,noatime /var/snap/opensearch/common"
+            )
+            with open(f"{queue}/scheduler") as f:
+                assert f.read() == "none"
+            with open(f"{queue}/read_ahead_kb") as f:
+                assert f.read() == "128"
+
+            # the root filesystem is never remounted
+            mock_run_cmd.reset_mock()
+            mock_mount.return_value = ("/", ["rw", "relatime"])
+            assert self.charm.opensearch.tune_data_storage(tune=True)["mount"] == "relatime"
+            mock_run_cmd.assert_not_called()
+
+            # the tuning is best-effort: errors are logged, never raised
+            mock_mount.return_value = ("/var/snap/opensearch/common", ["rw", "relatime"])
+            mock_run_cmd.side_effect = PermissionError("mount")
+            mock_queue.side_effect = PermissionError("sysfs")
+            assert self.charm.opensearch.tune_data_storage(tune=True) == {"mount": "relatime"}
+
+            mock_run_cmd.side_effect = None
+            os.remove(f"{queue}/read_ahead_kb")
+            mock_queue.side_effect = None
+            assert self.charm.opensearch.tune_data_storage(tune=True) == {
+                "scheduler": "none",
+                "mount": "noatime",
+            }
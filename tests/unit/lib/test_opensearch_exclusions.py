@@ -4,13 +4,22 @@
 import json
 import os
 import unittest
-from unittest.mock import PropertyMock, patch
+from unittest.mock import MagicMock, PropertyMock, patch
 
 from charms.opensearch.v0.constants_charm import PeerRelationName
 from charms.opensearch.v0.helper_conf_setter import YamlConfigSetter
-from charms.opensearch.v0.models import DeploymentState, DeploymentType, State
+from charms.opensearch.v0.models import (
+    App,
+    DeploymentState,
+    DeploymentType,
+    Node,
+    State,
+)
 from charms.opensearch.v0.opensearch_internal_data import Scope
-from charms.opensearch.v0.opensearch_nodes_exclusions import VOTING_TO_DELETE
+from charms.opensearch.v0.opensearch_nodes_exclusions import (
+    ALLOCS_TO_DELETE,
+    VOTING_TO_DELETE,
+)
 from ops.testing import Harness
 
 from charm import OpenSearchOperatorCharm
@@ -105,6 +114,7 @@ class TestOpenSearchExclusions(unittest.TestCase):
             self.charm.opensearch_exclusions.add_to_cleanup_list("unit2")
             self.charm.opensearch_exclusions.add_to_cleanup_list("unit3")
             # Simulating the unit stop
+            mock_fetch.return_value = set()
             self.charm.opensearch_exclusions.add_current(voting=True, allocation=False)
             mock_request.assert_called_with(
                 "POST",
@@ -182,6 +192,7 @@ class TestOpenSearchExclusions(unittest.TestCase):
             self.charm.opensearch_exclusions._scope = Scope.UNIT
 
             # Simulating the unit stop
+            mock_fetch.return_value = set()
             self.charm.opensearch_exclusions.add_current(voting=True, allocation=False)
             mock_request.assert_called_with(
                 "POST",
@@ -217,3 +228,182 @@ class TestOpenSearchExclusions(unittest.TestCase):
                 resp_status_code=True,
                 retries=3,
             )
+
+    @patch(
+        "charms.opensearch.v0.opensearch_nodes_exclusions.OpenSearchExclusions._node",
+        new_callable=PropertyMock,
+    )
+    @patch("charms.opensearch.v0.opensearch_distro.OpenSearchDistribution.request")
+    @patch(
+        "charms.opensearch.v0.opensearch_nodes_exclusions.dying_units", MagicMock(return_value=[])
+    )
+    def test_reconcile_minimal_changes(self, mock_request, mock_node_method):
+        """Test that only the required exclusions API calls are sent."""
+
+        class _node:  # noqa: N801
+            def is_cm_eligible(self):
+                return True
+
+            def is_data(self):
+                return True
+
+            @property
+            def name(self):
+                return "testing_unit"
+
+        mock_node_method.return_value = _node()
+        exclusions = self.charm.opensearch_exclusions
+
+        def _registered(voting, allocations):
+            def _request(method, endpoint, *args, **kwargs):
+                if endpoint.startswith("/_cluster/state/metadata/voting_config_exclusions"):
+                    return {
+                        "metadata": {
+                            "cluster_coordination": {
+                                "voting_config_exclusions": [
+                                    {"node_id": node, "node_name": node} for node in voting
+                                ]
+                            }
+                        }
+                    }
+                if method == "GET" and endpoint.startswith("/_cluster/settings"):
+                    if not allocations:
+                        return {}
+                    return {
+                        "persistent": {
+                            "cluster": {
+                                "routing": {
+                                    "allocation": {"exclude": {"_name": ",".join(allocations)}}
+                                }
+                            }
+                        }
+                    }
+                return {"acknowledged": True} if method == "PUT" else 200
+
+            return _request
+
+        with self.harness.hooks_disabled():
+            exclusions._scope = Scope.APP
+
+            # steady state: nothing pending, no call at all
+            mock_request.side_effect = _registered([], [])
+            exclusions.cleanup()
+            mock_request.assert_not_called()
+
+            # pending allocation exclusion already gone: only read once, then cleared
+            exclusions.add_to_cleanup_list(self.charm.unit_name)
+            exclusions.cleanup()
+            assert [c.args[0] for c in mock_request.call_args_list] == ["GET"]
+
+            # pending voting exclusion of a unit still part of the deployment: no call
+            mock_request.reset_mock()
+            exclusions.cleanup()
+            mock_request.assert_not_called()
+
+            # exclusions already registered: only read
+            mock_request.side_effect = _registered(["testing_unit"], ["testing_unit"])
+            exclusions.add_current()
+            assert [c.args[0] for c in mock_request.call_args_list] == ["GET", "GET"]
+
+            # only the missing voting exclusion is registered
+            mock_request.reset_mock()
+            mock_request.side_effect = _registered(["unit1"], ["unit1", "testing_unit"])
+            exclusions.add_current()
+            mock_request.assert_any_call(
+                "POST",
+                "/_cluster/voting_config_exclusions?node_names=testing_unit&timeout=1m",
+                alt_hosts=[],
+                resp_status_code=True,
+                retries=3,
+            )
+            assert "PUT" not in [c.args[0] for c in mock_request.call_args_list]
+            assert "DELETE" not in [c.args[0] for c in mock_request.call_args_list]
+
+            # exclusions not registered anymore: nothing to delete
+            mock_request.reset_mock()
+            mock_request.side_effect = _registered(["unit1"], ["unit1"])
+            exclusions.delete_current()
+            assert [c.args[0] for c in mock_request.call_args_list] == ["GET", "GET"]
+            assert "testing_unit" not in exclusions._get_voting_to_delete()
+
+            # only the allocation exclusion of this node is removed
+            mock_request.reset_mock()
+            mock_request.side_effect = _registered([], ["unit1", "testing_unit"])
+            exclusions.delete_current()
+            mock_request.assert_called_with(
+                "PUT",
+                "/_cluster/settings",
+                {"persistent": {"cluster.routing.allocation.exclude._name": "unit1"}},
+                alt_hosts=[],
+            )
+
+    @patch(
+        "charms.opensearch.v0.opensearch_nodes_exclusions.OpenSearchExclusions._node",
+        new_callable=PropertyMock,
+    )
+    @patch("charms.opensearch.v0.opensearch_nodes_exclusions.dying_units")
+    @patch(
+        "charms.opensearch.v0.opensearch_nodes_exclusions.OpenSearchExclusions._fetch_allocations"
+    )
+    @patch("charms.opensearch.v0.opensearch_distro.OpenSearchDistribution.request")
+    def test_add_departing(self, mock_request, mock_fetch, mock_dying, mock_node_method):
+        """Test that all departing nodes are excluded at once and kept excluded while draining."""
+        app = self.charm.opensearch_peer_cm.deployment_desc().app
+        nodes = [
+            Node(
+                name=f"opensearch-{i}.{app.short_id}",
+                roles=["cluster_manager", "data"] if i < 3 else ["data"],
+                ip=f"10.0.0.{i}",
+                app=App(model_uuid=app.model_uuid, name=app.name),
+                unit_number=i,
+            )
+            for i in range(6)
+        ]
+        mock_node_method.return_value = nodes[5]
+        mock_dying.return_value = ["opensearch/3", "opensearch/4", "opensearch/5"]
+        mock_fetch.return_value = set()
+        mock_request.return_value = {"acknowledged": True}
+        exclusions = self.charm.opensearch_exclusions
+
+        assert exclusions.add_departing(nodes)
+        mock_request.assert_called_once_with(
+            "PUT",
+            "/_cluster/settings",
+            {
+                "persistent": {
+                    "cluster.routing.allocation.exclude._name": ",".join(
+                        node.name for node in nodes[3:]
+                    )
+                }
+            },
+            alt_hosts=[],
+        )
+
+        # single departing node: excluded when it stops
+        mock_request.reset_mock()
+        mock_dying.return_value = ["opensearch/5"]
+        assert not exclusions.add_departing(nodes)
+        mock_request.assert_not_called()
+
+        # no data node left to receive the shards
+        mock_dying.return_value = [f"opensearch/{i}" for i in range(6)]
+        assert not exclusions.add_departing(nodes)
+        mock_request.assert_not_called()
+
+        # the exclusions of the departing nodes still draining are kept by the clean-up
+        mock_dying.return_value = ["opensearch/4"]
+        mock_fetch.return_value = {node.name for node in nodes[3:]}
+        with self.harness.hooks_disabled():
+            exclusions._scope = Scope.APP
+            self.charm.peers_data.put(
+                Scope.APP, ALLOCS_TO_DELETE, ",".join(node.name for node in nodes[3:])
+            )
+            exclusions.cleanup()
+
+        mock_request.assert_called_once_with(
+            "PUT",
+            "/_cluster/settings",
+            {"persistent": {"cluster.routing.allocation.exclude._name": nodes[4].name}},
+            alt_hosts=[],
+        )
+        assert self.charm.peers_data.get(Scope.APP, ALLOCS_TO_DELETE) == nodes[4].name
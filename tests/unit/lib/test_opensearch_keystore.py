@@ -2,6 +2,8 @@
 # See LICENSE file for licensing details.
 
 """Unit test for the opensearch_plugins library."""
+import os
+import tempfile
 import unittest
 from unittest.mock import MagicMock, call
 
@@ -65,3 +67,57 @@ class TestOpenSearchKeystore(unittest.TestCase):
         self.charm.opensearch.run_bin.assert_has_calls(
             [call("opensearch-keystore", "remove key1")]
         )
+
+    def test_keystore_add_many_keypairs(self) -> None:
+        """Add several keys to the keystore in a single run."""
+        self.charm.opensearch.run_bin = MagicMock(return_value="")
+        self.keystore.add({"key1": "secret1", "key2": "secret2\n"})
+        self.charm.opensearch.run_bin.assert_called_once_with(
+            "opensearch-keystore", "add --force key1 key2", stdin="secret1\nsecret2\n"
+        )
+
+        with self.assertRaises(OpenSearchKeystoreError):
+            self.keystore.add({"key1": "secret1", "key2": ""})
+
+    def test_keystore_delete_missing_keys(self) -> None:
+        """Delete several keys, some of them not being in the keystore."""
+        self.charm.opensearch.run_bin = MagicMock(
+            side_effect=[
+                OpenSearchCmdError("ERROR: Setting [key3] does not exist in the keystore."),
+                RETURN_LIST_KEYSTORE,
+                "",
+            ]
+        )
+        self.keystore.delete(["key1", "key2", "key3"])
+        self.charm.opensearch.run_bin.assert_has_calls(
+            [
+                call("opensearch-keystore", "remove key1 key2 key3"),
+                call("opensearch-keystore", "list"),
+                call("opensearch-keystore", "remove key1 key2"),
+            ]
+        )
+
+    def test_keystore_list_cached(self) -> None:
+        """The keys are listed once, as long as the keystore file is unchanged."""
+        self.charm.opensearch.run_bin = MagicMock(return_value=RETURN_LIST_KEYSTORE)
+        with tempfile.NamedTemporaryFile() as keystore_file:
+            self.keystore._keystore = keystore_file.name
+
+            self.assertEqual(self.keystore.list(), ["key1", "key2", "keystore.seed"])
+            self.assertEqual(self.keystore.list(), ["key1", "key2", "keystore.seed"])
+            self.charm.opensearch.run_bin.assert_called_once_with("opensearch-keystore", "list")
+
+            # the charm's own writes update the cache in place
+            self.charm.opensearch.run_bin.reset_mock()
+            self.keystore.add({"key3": "secret3"})
+            self.keystore.delete(["key1"])
+            self.assertEqual(self.keystore.list(), ["key2", "keystore.seed", "key3"])
+            self.assertNotIn(
+                call("opensearch-keystore", "list"), self.charm.opensearch.run_bin.mock_calls
+            )
+
+            # changes made outside of the charm invalidate the cache
+            stat = os.stat(keystore_file.name)
+            os.utime(keystore_file.name, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+            self.assertEqual(self.keystore.list(), ["key1", "key2", "keystore.seed"])
+            self.charm.opensearch.run_bin.assert_called_with("opensearch-keystore", "list")
@@ -3,13 +3,22 @@
 
 import json
 import os
+import time
 import unittest
-from unittest.mock import patch
+from unittest.mock import MagicMock, PropertyMock, patch
 
 import responses
 from charms.opensearch.v0.constants_charm import NodeLockRelationName, PeerRelationName
 from charms.opensearch.v0.helper_conf_setter import YamlConfigSetter
-from charms.opensearch.v0.models import DeploymentState, DeploymentType, State
+from charms.opensearch.v0.models import (
+    App,
+    DeploymentState,
+    DeploymentType,
+    Node,
+    State,
+)
+from charms.opensearch.v0.opensearch_exceptions import OpenSearchHttpError
+from charms.opensearch.v0.opensearch_locking import OpenSearchNodeLock
 from ops.testing import Harness
 
 from charm import OpenSearchOperatorCharm
@@ -196,3 +205,409 @@ class TestOpenSearchLock(unittest.TestCase):
         # The property function executes healthy
         # instead of breaking over the unit missing from the databag
         assert not self.harness.charm.node_lock.acquired
+
+    def test_lock_index_settings_quorum_sized(self):
+        """The lock index is replicated on a quorum of the CM nodes, not on all nodes."""
+        app = App(model_uuid=self.charm.model.uuid, name="opensearch")
+        nodes = [
+            Node(
+                name=f"opensearch-{i}.{app.short_id}",
+                roles=["cluster_manager", "data"] if i < 5 else ["data"],
+                ip=f"10.0.0.{i}",
+                app=app,
+                unit_number=i,
+            )
+            for i in range(60)
+        ]
+
+        assert OpenSearchNodeLock._lock_index_shard_copies(nodes) == 3
+
+        settings = OpenSearchNodeLock._lock_index_settings(nodes)
+        assert settings["index.number_of_replicas"] == "2"
+        assert settings["index.auto_expand_replicas"] == "false"
+        assert settings["index.routing.allocation.include._name"] == ",".join(
+            sorted(f"opensearch-{i}.{app.short_id}" for i in range(5))
+        )
+
+        # dedicated cluster managers cannot hold shards: fall back to the data nodes
+        for node in nodes[:3]:
+            node.roles = ["cluster_manager"]
+        for node in nodes[3:5]:
+            node.roles = ["data"]
+
+        assert OpenSearchNodeLock._lock_index_shard_copies(nodes) == 2
+        settings = OpenSearchNodeLock._lock_index_settings(nodes)
+        assert settings["index.number_of_replicas"] == "1"
+        assert settings["index.routing.allocation.include._name"] is None
+
+        # single node cluster
+        assert OpenSearchNodeLock._lock_index_shard_copies(nodes[5:6]) == 1
+
+    def test_lock_index_sized_after_configured_topology(self):
+        """The lock index settings do not change while nodes of the cluster are offline."""
+        for unit_id in range(1, 5):
+            self.harness.add_relation_unit(self.peer_rel_id, f"{self.charm.app.name}/{unit_id}")
+
+        app = self.charm.opensearch_peer_cm.deployment_desc().app
+        online_nodes = [
+            Node(
+                name=f"opensearch-{i}.{app.short_id}",
+                roles=["cluster_manager", "data"],
+                ip=f"10.0.0.{i}",
+                app=app,
+                unit_number=i,
+            )
+            for i in [0, 2, 4]
+        ]
+
+        nodes = self.charm.node_lock._lock_index_nodes(online_nodes)
+        assert sorted(node.name for node in nodes) == [
+            f"opensearch-{i}.{app.short_id}" for i in range(5)
+        ]
+        assert OpenSearchNodeLock._lock_index_settings(nodes)["index.number_of_replicas"] == "2"
+        # one offline copy holder does not block lock writes
+        assert OpenSearchNodeLock._lock_write_active_shards(nodes) == 2
+        assert OpenSearchNodeLock._lock_write_active_shards(nodes[:3]) == 1
+        assert OpenSearchNodeLock._lock_write_active_shards(nodes[:1]) == 1
+
+    @patch("charms.opensearch.v0.opensearch_locking.ClusterTopology.nodes")
+    def test_node_lock_acquired_with_offline_copy_holder(self, nodes):
+        """The lock is acquired while the node holding a copy of the lock index is offline."""
+        for unit_id in range(1, 3):
+            self.harness.add_relation_unit(self.peer_rel_id, f"{self.charm.app.name}/{unit_id}")
+
+        app = self.charm.opensearch_peer_cm.deployment_desc().app
+        # opensearch/1, holding a copy of the lock index, is offline
+        nodes.return_value = [
+            Node(
+                name=f"opensearch-{i}.{app.short_id}",
+                roles=["cluster_manager", "data"],
+                ip=f"10.0.0.{i}",
+                app=app,
+                unit_number=i,
+            )
+            for i in [0, 2]
+        ]
+
+        def _request(method, endpoint, **_):
+            if endpoint == "/.charm_node_lock/_doc/0":
+                raise OpenSearchHttpError(response_code=404)
+            if endpoint.startswith("/.charm_node_lock/_settings"):
+                return {
+                    ".charm_node_lock": {
+                        "settings": {
+                            "index.number_of_replicas": "1",
+                            "index.auto_expand_replicas": "false",
+                        }
+                    }
+                }
+            if endpoint.startswith("/_cluster/health"):
+                return 200
+            return {"_shards": {"total": 2, "successful": 1, "failed": 0}}
+
+        self.charm.opensearch.is_node_up = MagicMock(return_value=True)
+        self.charm.opensearch.request = MagicMock(side_effect=_request)
+
+        assert self.charm.node_lock.acquired
+
+        calls = [
+            (call.args[0], call.kwargs["endpoint"])
+            for call in self.charm.opensearch.request.call_args_list
+        ]
+        # the lock index settings are not updated after the nodes online
+        assert ("PUT", "/.charm_node_lock/_settings") not in calls
+        assert (
+            "GET",
+            "/_cluster/health/.charm_node_lock?wait_for_active_shards=1",
+        ) in calls
+        assert (
+            "PUT",
+            "/.charm_node_lock/_create/0?refresh=true&wait_for_active_shards=1",
+        ) in calls
+
+    def test_node_lock_queue_fifo(self):
+        """Units are queued for the lock in the order they requested it."""
+        self.harness.set_leader(is_leader=True)
+        self.harness.update_relation_data(
+            self.lock_rel_id,
+            f"{self.charm.app.name}/1",
+            {"lock-ticket": "1000.0", "lock-heartbeat": json.dumps(time.time())},
+        )
+
+        # this unit enqueues after unit 1
+        self.harness.charm.node_lock._peer.enqueue()
+        ticket = self.harness.get_relation_data(self.lock_rel_id, self.charm.unit.name)[
+            "lock-ticket"
+        ]
+        assert float(ticket) > 1000.0
+        assert [unit.name for unit in self.harness.charm.node_lock._peer.queue] == [
+            f"{self.charm.app.name}/1",
+            self.charm.unit.name,
+        ]
+        assert not self.harness.charm.node_lock._peer.is_next_in_queue()
+
+        # the ticket is only taken once
+        self.harness.charm.node_lock._peer.enqueue()
+        assert (
+            self.harness.get_relation_data(self.lock_rel_id, self.charm.unit.name)["lock-ticket"]
+            == ticket
+        )
+
+        # unit 1 releases the lock: this unit is next
+        self.harness.update_relation_data(
+            self.lock_rel_id, f"{self.charm.app.name}/1", {"lock-ticket": ""}
+        )
+        assert self.harness.charm.node_lock._peer.is_next_in_queue()
+
+        self.harness.charm.node_lock._peer.dequeue()
+        assert "lock-ticket" not in self.harness.get_relation_data(
+            self.lock_rel_id, self.charm.unit.name
+        )
+
+    def test_node_lock_queue_skips_expired_tickets(self):
+        """Units that stopped requesting the lock do not block the queue."""
+        peer = self.harness.charm.node_lock._peer
+        now = time.time()
+        self.harness.update_relation_data(
+            self.lock_rel_id,
+            f"{self.charm.app.name}/1",
+            {"lock-ticket": json.dumps(now - 3600), "lock-heartbeat": json.dumps(now - 60)},
+        )
+        peer.enqueue()
+        assert not peer.is_next_in_queue()
+
+        # unit 1 is stuck in error: its ticket expires
+        self.harness.update_relation_data(
+            self.lock_rel_id,
+            f"{self.charm.app.name}/1",
+            {"lock-heartbeat": json.dumps(now - peer.TICKET_EXPIRY - 1)},
+        )
+        assert peer.is_next_in_queue()
+        assert [unit.name for unit in peer.queue] == [self.charm.unit.name]
+
+        # the heartbeat of a waiting unit is refreshed, but not on every request
+        data = self.harness.get_relation_data(self.lock_rel_id, self.charm.unit.name)
+        ticket, heartbeat = data["lock-ticket"], data["lock-heartbeat"]
+        peer.enqueue()
+        assert data["lock-heartbeat"] == heartbeat
+        with patch("time.time", return_value=now + peer.TICKET_HEARTBEAT + 1):
+            peer.enqueue()
+        data = self.harness.get_relation_data(self.lock_rel_id, self.charm.unit.name)
+        assert data["lock-ticket"] == ticket
+        assert json.loads(data["lock-heartbeat"]) == now + peer.TICKET_HEARTBEAT + 1
+
+    def test_node_lock_ticket_taken_when_departing(self):
+        """A departing unit takes its ticket when leaving the lock relation."""
+        relation = self.charm.model.get_relation(NodeLockRelationName)
+        self.harness.update_relation_data(
+            self.lock_rel_id,
+            f"{self.charm.app.name}/1",
+            {"lock-ticket": json.dumps(time.time())},
+        )
+
+        # another unit departs
+        self.charm.on[NodeLockRelationName].relation_departed.emit(
+            relation, self.charm.app, relation.units.copy().pop(), f"{self.charm.app.name}/1"
+        )
+        assert "lock-ticket" not in self.harness.get_relation_data(
+            self.lock_rel_id, self.charm.unit.name
+        )
+
+        # this unit departs
+        self.charm.on[NodeLockRelationName].relation_departed.emit(
+            relation, self.charm.app, self.charm.unit, self.charm.unit.name
+        )
+        ticket = self.harness.get_relation_data(self.lock_rel_id, self.charm.unit.name)[
+            "lock-ticket"
+        ]
+
+        # the failing storage detaching hooks keep the place of the unit in the queue
+        self.harness.charm.node_lock._peer.enqueue()
+        assert (
+            self.harness.get_relation_data(self.lock_rel_id, self.charm.unit.name)["lock-ticket"]
+            == ticket
+        )
+
+    @patch("charms.opensearch.v0.opensearch_locking.ClusterState.shards")
+    @patch("charms.opensearch.v0.opensearch_health.OpenSearchHealth.get")
+    @patch.dict(os.environ, {"JUJU_AVAILABILITY_ZONE": "az1"})
+    def test_node_lock_concurrent_restart_same_zone(self, health, shards):
+        """Units of the zone holding the lock can join it if the shards allow it."""
+        self.harness.update_config({"max_concurrent_restarts_per_zone": 2})
+        health.return_value = "green"
+
+        app = App(model_uuid=self.charm.model.uuid, name="opensearch")
+        nodes = [
+            Node(
+                name=f"opensearch-{i}.{app.short_id}",
+                roles=["cluster_manager", "data"],
+                ip=f"10.0.0.{i}",
+                app=app,
+                unit_number=i,
+                zone=f"az{i % 3}",
+            )
+            for i in range(6)
+        ]
+        holder = nodes[4].name  # az1, as this unit
+        shards.return_value = [
+            {"index": "idx", "shard": "0", "state": "STARTED", "node": nodes[1].name},
+            {"index": "idx", "shard": "0", "state": "STARTED", "node": nodes[2].name},
+        ]
+
+        can_join = self.charm.node_lock._can_join
+        assert can_join(None, nodes, [holder], "az1")
+
+        # units of other zones hold the lock
+        assert not can_join(None, nodes, [nodes[0].name], "az0")
+
+        # limit reached
+        assert not can_join(None, nodes, [holder, nodes[1].name], "az1")
+
+        # a shard only has copies in the zone of the unit
+        shards.return_value[1]["node"] = nodes[4].name
+        assert not can_join(None, nodes, [holder], "az1")
+
+        # a shard copy is initializing
+        shards.return_value[1]["node"] = nodes[2].name
+        shards.return_value.append(
+            {"index": "idx", "shard": "0", "state": "INITIALIZING", "node": nodes[0].name}
+        )
+        assert not can_join(None, nodes, [holder], "az1")
+
+        # the cluster is not healthy
+        shards.return_value.pop()
+        health.return_value = "yellow-temp"
+        assert not can_join(None, nodes, [holder], "az1")
+
+        # the units being upgraded toggle the shard allocation of the cluster
+        health.return_value = "green"
+        with patch(
+            "charm.OpenSearchOperatorCharm.upgrade_in_progress", new_callable=PropertyMock
+        ) as upgrade_in_progress:
+            upgrade_in_progress.return_value = True
+            assert not can_join(None, nodes, [holder], "az1")
+        assert can_join(None, nodes, [holder], "az1")
+
+        # default: one unit at a time
+        self.harness.update_config({"max_concurrent_restarts_per_zone": 1})
+        assert not can_join(None, nodes, [holder], "az1")
+
+    @patch.dict(os.environ, {"JUJU_AVAILABILITY_ZONE": "az1"})
+    def test_node_lock_join(self):
+        """A unit joins the units of its zone holding the lock, if the document is unchanged."""
+        holder = f"opensearch-4.{self.charm.opensearch_peer_cm.deployment_desc().app.short_id}"
+        document = {
+            "_seq_no": 5,
+            "_primary_term": 1,
+            "_source": {"unit-name": holder, "units": [holder], "zone": "az1"},
+        }
+        self.charm.node_lock._can_join = MagicMock(return_value=True)
+        self.charm.opensearch.request = MagicMock(return_value={"_shards": {"failed": 0}})
+
+        assert self.charm.node_lock._join(None, [], document)
+        _, kwargs = self.charm.opensearch.request.call_args
+        assert "if_seq_no=5&if_primary_term=1" in kwargs["endpoint"]
+        assert kwargs["payload"]["units"] == [holder, self.charm.unit_name]
+
+        # another unit updated the lock document meanwhile
+        self.charm.opensearch.request.side_effect = OpenSearchHttpError(response_code=409)
+        assert not self.charm.node_lock._join(None, [], document)
+
+        # another unit of the zone is first in the queue
+        self.harness.update_relation_data(
+            self.lock_rel_id,
+            f"{self.charm.app.name}/1",
+            {
+                "lock-ticket": "1000.0",
+                "lock-heartbeat": json.dumps(time.time()),
+                "lock-zone": "az1",
+            },
+        )
+        self.charm.opensearch.request.reset_mock(side_effect=True)
+        assert not self.charm.node_lock._join(None, [], document)
+        self.charm.opensearch.request.assert_not_called()
+
+    def test_remove_units_with_lock(self):
+        """Units are removed from the lock document, which is deleted once empty."""
+        units = ["opensearch-0.5a5", "opensearch-1.5a5", "opensearch-2.5a5"]
+        document = {
+            "_seq_no": 5,
+            "_primary_term": 1,
+            "_source": {"unit-name": units[0], "units": units, "zone": "az1"},
+        }
+        self.charm.node_lock._lock_document = MagicMock(return_value=document)
+        self.charm.opensearch.request = MagicMock()
+
+        assert self.charm.node_lock._remove_units_with_lock(None, {units[0]})
+        args, kwargs = self.charm.opensearch.request.call_args
+        assert args[0] == "PUT"
+        assert kwargs["endpoint"].endswith("if_seq_no=5&if_primary_term=1")
+        assert kwargs["payload"] == {
+            "unit-name": units[1],
+            "units": units[1:],
+            "zone": "az1",
+        }
+
+        assert self.charm.node_lock._remove_units_with_lock(None, set(units))
+        args, kwargs = self.charm.opensearch.request.call_args
+        assert args[0] == "DELETE"
+        assert kwargs["endpoint"].endswith("if_seq_no=5&if_primary_term=1")
+
+        # the lock document was updated meanwhile
+        self.charm.opensearch.request.side_effect = OpenSearchHttpError(response_code=409)
+        assert not self.charm.node_lock._remove_units_with_lock(None, {units[0]})
+
+        # no unit holds the lock
+        self.charm.node_lock._lock_document.return_value = None
+        assert self.charm.node_lock._remove_units_with_lock(None, {units[0]})
+
+    @patch("time.sleep")
+    def test_node_lock_release_several_holders(self, _):
+        """The unit is removed from the lock held by several units, despite concurrent updates."""
+        self.harness.add_relation_unit(self.peer_rel_id, f"{self.charm.app.name}/1")
+        short_id = self.charm.opensearch_peer_cm.deployment_desc().app.short_id
+        other, departed = f"opensearch-1.{short_id}", f"opensearch-7.{short_id}"
+        lock = {"units": [other, self.charm.unit_name, departed], "seq_no": 1, "conflicts": 2}
+
+        def _request(method, endpoint, **kwargs):
+            if method == "GET":
+                return {
+                    "_seq_no": lock["seq_no"],
+                    "_primary_term": 1,
+                    "_source": {"units": lock["units"], "zone": "az1"},
+                }
+            if lock["conflicts"]:
+                # another unit updates the lock document meanwhile
+                lock["conflicts"] -= 1
+                lock["seq_no"] += 1
+                raise OpenSearchHttpError(response_code=409)
+            assert f"if_seq_no={lock['seq_no']}" in endpoint
+            lock["units"] = kwargs["payload"]["units"]
+            return {}
+
+        self.charm.opensearch.is_node_up = MagicMock(return_value=True)
+        self.charm.opensearch.request = MagicMock(side_effect=_request)
+        self.harness.charm.node_lock._peer.enqueue()
+
+        self.charm.node_lock.release()
+        # the unit of the departed node is released alongside this unit
+        assert lock["units"] == [other]
+        assert "lock-ticket" not in self.harness.get_relation_data(
+            self.lock_rel_id, self.charm.unit.name
+        )
+
+        # a unit not holding the lock keeps its place in the queue
+        self.harness.charm.node_lock._peer.enqueue()
+        self.charm.node_lock.release()
+        assert "lock-ticket" in self.harness.get_relation_data(
+            self.lock_rel_id, self.charm.unit.name
+        )
+
+        # the lock document keeps being updated by other units: the failure does not interrupt
+        # the hook, and the unit stays in the queue
+        lock.update({"units": [other, self.charm.unit_name], "conflicts": 100})
+        self.charm.node_lock.release()
+        assert lock["units"] == [other, self.charm.unit_name]
+        assert "lock-ticket" in self.harness.get_relation_data(
+            self.lock_rel_id, self.charm.unit.name
+        )
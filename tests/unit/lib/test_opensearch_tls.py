@@ -3,8 +3,9 @@
 
 """Unit test for the helper_cluster library."""
 import itertools
-import re
+import os
 import socket
+import tempfile
 import unittest
 from unittest import mock
 from unittest.mock import MagicMock, Mock, patch
@@ -94,6 +95,7 @@ class TestOpenSearchTLS(unittest.TestCase):
         socket.getfqdn.return_value = "nebula"
 
         self.charm.opensearch.config = YamlConfigSetter(base_path="tests/unit/resources/config")
+        self.charm.opensearch.write_file = MagicMock()
 
     @patch(f"{PEER_CLUSTERS_MANAGER}.deployment_desc")
     @patch(f"{BASE_LIB_PATH}.opensearch_tls.get_host_public_ip")
@@ -455,7 +457,9 @@ class TestOpenSearchTLS(unittest.TestCase):
             (DeploymentType.FAILOVER_ORCHESTRATOR),
         ]
     )
-    @patch("charms.opensearch.v0.opensearch_tls.run_cmd")
+    @patch("charms.opensearch.v0.opensearch_tls.OpenSearchTLS._read_store", return_value={})
+    @patch("charms.opensearch.v0.opensearch_tls.pkcs12_truststore", return_value=b"truststore")
+    @patch("charms.opensearch.v0.opensearch_tls.pkcs12_keystore", return_value=b"keystore")
     @patch(f"{PEER_CLUSTERS_MANAGER}.deployment_desc")
     # Mocks to avoid I/O
     @patch("charms.opensearch.v0.opensearch_tls.OpenSearchTLS._read_stored_ca")
@@ -467,7 +471,9 @@ class TestOpenSearchTLS(unittest.TestCase):
         _,
         _read_stored_ca,
         deployment_desc,
-        run_cmd,
+        pkcs12_keystore,
+        pkcs12_truststore,
+        _read_store,
     ):
         """New certificate received.
 
@@ -529,16 +535,16 @@ class TestOpenSearchTLS(unittest.TestCase):
         # This is because the function that applies on normal units to save app certificate
         # is executed on top of the mechanism that recognizes that the leader
         # received a new app cert
-        assert run_cmd.call_count == 4
-
-        assert re.search(
-            "openssl pkcs12 -export .*-out "
-            "/var/snap/opensearch/current/etc/opensearch/certificates/app-admin.p12 .*-name app-admin",
-            run_cmd.call_args_list[0].args[0],
+        assert pkcs12_keystore.call_count == 2
+        pkcs12_keystore.assert_called_with(
+            alias="app-admin",
+            key=key,
+            cert=new_cert,
+            password="keystore_12345",
+            key_password=None,
         )
-        assert (
-            "sudo chmod +r /var/snap/opensearch/current/etc/opensearch/certificates/app-admin.p12"
-            in run_cmd.call_args_list[1].args[0]
+        self.charm.opensearch.write_file.assert_called_with(
+            "/var/snap/opensearch/current/etc/opensearch/certificates/app-admin.p12", b"keystore"
         )
 
         assert self.harness.model.app.status == original_status_app
@@ -567,7 +573,9 @@ class TestOpenSearchTLS(unittest.TestCase):
             [CertType.UNIT_HTTP.val, CertType.UNIT_TRANSPORT.val],
         )
     )
-    @patch("charms.opensearch.v0.opensearch_tls.run_cmd")
+    @patch("charms.opensearch.v0.opensearch_tls.OpenSearchTLS._read_store", return_value={})
+    @patch("charms.opensearch.v0.opensearch_tls.pkcs12_truststore", return_value=b"truststore")
+    @patch("charms.opensearch.v0.opensearch_tls.pkcs12_keystore", return_value=b"keystore")
     @patch(f"{PEER_CLUSTERS_MANAGER}.deployment_desc")
     # Mocks to avoid I/O
     @patch("charms.opensearch.v0.opensearch_tls.OpenSearchTLS._read_stored_ca")
@@ -581,7 +589,9 @@ class TestOpenSearchTLS(unittest.TestCase):
         _,
         _read_stored_ca,
         deployment_desc,
-        run_cmd,
+        pkcs12_keystore,
+        pkcs12_truststore,
+        _read_store,
     ):
         """New *unit* certificate received.
 
@@ -666,19 +676,18 @@ class TestOpenSearchTLS(unittest.TestCase):
         self.charm.tls._on_certificate_available(event_mock)
 
         # The new cert is saved to the keystore
-        if self.charm.unit.is_leader():
-            assert run_cmd.call_count == 2
-        else:
-            assert run_cmd.call_count == 4
-
-        assert re.search(
-            "openssl pkcs12 -export .*-out "
-            f"/var/snap/opensearch/current/etc/opensearch/certificates/{cert_type}.p12 .*-name {cert_type}",
-            run_cmd.call_args_list[0].args[0],
+        # NOTE: on non-leader units, the app-admin certificate is also stored
+        assert pkcs12_keystore.call_count == (1 if self.charm.unit.is_leader() else 2)
+        pkcs12_keystore.assert_any_call(
+            alias=cert_type,
+            key=key,
+            cert=new_cert,
+            password=keystore_password,
+            key_password=None,
         )
-        assert (
-            f"sudo chmod +r /var/snap/opensearch/current/etc/opensearch/certificates/{cert_type}.p12"
-            in run_cmd.call_args_list[1].args[0]
+        self.charm.opensearch.write_file.assert_any_call(
+            f"/var/snap/opensearch/current/etc/opensearch/certificates/{cert_type}.p12",
+            b"keystore",
         )
 
         assert self.harness.model.unit.status == original_status_unit
@@ -706,7 +715,9 @@ class TestOpenSearchTLS(unittest.TestCase):
             (DeploymentType.FAILOVER_ORCHESTRATOR),
         ]
     )
-    @patch("charms.opensearch.v0.opensearch_tls.run_cmd")
+    @patch("charms.opensearch.v0.opensearch_tls.OpenSearchTLS._read_store", return_value={})
+    @patch("charms.opensearch.v0.opensearch_tls.pkcs12_truststore", return_value=b"truststore")
+    @patch("charms.opensearch.v0.opensearch_tls.pkcs12_keystore", return_value=b"keystore")
     @patch("charms.opensearch.v0.opensearch_tls.OpenSearchTLS._read_stored_ca")
     @patch(f"{PEER_CLUSTERS_MANAGER}.deployment_desc")
     # Mocks to avoid I/O
@@ -718,7 +729,9 @@ class TestOpenSearchTLS(unittest.TestCase):
         _,
         deployment_desc,
         _read_stored_ca,
-        run_cmd,
+        pkcs12_keystore,
+        pkcs12_truststore,
+        _read_store,
     ):
         """Test CA rotation 1st stage.
 
@@ -786,19 +799,16 @@ class TestOpenSearchTLS(unittest.TestCase):
 
         self.harness.set_leader(is_leader=True)
         original_status = self.harness.model.unit.status
+        _read_store.return_value = {"ca": "old_ca"}
 
         self.charm.tls._on_certificate_available(event_mock)
 
         # Old CA cert is saved with corresponding alias, new new CA cert added to keystore
-        assert run_cmd.call_count == 3
-        assert re.search(
-            "keytool *-changealias *-alias ca *-destalias old-ca",
-            run_cmd.call_args_list[0].args[0],
+        pkcs12_truststore.assert_called_once_with(
+            {"old-ca": "old_ca", "ca": new_ca}, "truststore_12345"
         )
-        assert re.search("keytool *-importcert.* *-alias ca", run_cmd.call_args_list[1].args[0])
-        assert (
-            "chmod +r /var/snap/opensearch/current/etc/opensearch/certificates/ca.p12"
-            in run_cmd.call_args_list[2].args[0]
+        self.charm.opensearch.write_file.assert_called_once_with(
+            "/var/snap/opensearch/current/etc/opensearch/certificates/ca.p12", b"truststore"
         )
         # NOTE: The new cert and chain are NOT saved into the keystore (disk)
 
@@ -830,7 +840,9 @@ class TestOpenSearchTLS(unittest.TestCase):
             (DeploymentType.FAILOVER_ORCHESTRATOR),
         ]
     )
-    @patch("charms.opensearch.v0.opensearch_tls.run_cmd")
+    @patch("charms.opensearch.v0.opensearch_tls.OpenSearchTLS._read_store", return_value={})
+    @patch("charms.opensearch.v0.opensearch_tls.pkcs12_truststore", return_value=b"truststore")
+    @patch("charms.opensearch.v0.opensearch_tls.pkcs12_keystore", return_value=b"keystore")
     @patch("charms.opensearch.v0.opensearch_tls.OpenSearchTLS._read_stored_ca")
     @patch(f"{PEER_CLUSTERS_MANAGER}.deployment_desc")
     def test_on_certificate_available_ca_rotation_first_stage_any_cluster_non_leader(
@@ -839,7 +851,9 @@ class TestOpenSearchTLS(unittest.TestCase):
         deployment_type,
         deployment_desc,
         _read_stored_ca,
-        run_cmd,
+        pkcs12_keystore,
+        pkcs12_truststore,
+        _read_store,
     ):
         """'certificate-available' with an app cert and/or a CA cert.
 
@@ -885,7 +899,7 @@ class TestOpenSearchTLS(unittest.TestCase):
         self.charm.tls._on_certificate_available(event_mock)
 
         # No action taken, no change on status or certificates
-        assert run_cmd.call_count == 0
+        self.charm.opensearch.write_file.assert_not_called()
         assert self.harness.model.unit.status == original_status
         self.charm._restart_opensearch_event.emit.assert_not_called()
         assert self.secret_store.get_object(Scope.APP, CertType.APP_ADMIN.val) == {
@@ -1206,7 +1220,9 @@ class TestOpenSearchTLS(unittest.TestCase):
             (DeploymentType.FAILOVER_ORCHESTRATOR),
         ]
     )
-    @patch("charms.opensearch.v0.opensearch_tls.run_cmd")
+    @patch("charms.opensearch.v0.opensearch_tls.OpenSearchTLS._read_store", return_value={})
+    @patch("charms.opensearch.v0.opensearch_tls.pkcs12_truststore", return_value=b"truststore")
+    @patch("charms.opensearch.v0.opensearch_tls.pkcs12_keystore", return_value=b"keystore")
     @patch(f"{PEER_CLUSTERS_MANAGER}.deployment_desc")
     # Mocks to avoid I/O
     @patch("charms.opensearch.v0.opensearch_tls.OpenSearchTLS._read_stored_ca")
@@ -1218,7 +1234,9 @@ class TestOpenSearchTLS(unittest.TestCase):
         _,
         _read_stored_ca,
         deployment_desc,
-        run_cmd,
+        pkcs12_keystore,
+        pkcs12_truststore,
+        _read_store,
     ):
         """Test CA rotation 3rd stage -- *app* certificate.
 
@@ -1287,17 +1305,18 @@ class TestOpenSearchTLS(unittest.TestCase):
         self.charm.tls._on_certificate_available(event_mock)
 
         # NOTE: Currently store_new_tls_resources() is invoked twice for 'app-admin' cert!
-        assert run_cmd.call_count == 4
+        assert pkcs12_keystore.call_count == 2
 
         # Exporting new certs
-        assert re.search(
-            "openssl pkcs12 -export .* -out "
-            "/var/snap/opensearch/current/etc/opensearch/certificates/app-admin.p12 .* -name app-admin",
-            run_cmd.call_args_list[0].args[0],
+        pkcs12_keystore.assert_called_with(
+            alias="app-admin",
+            key=key,
+            cert=cert,
+            password=keystore_password,
+            key_password=None,
         )
-        assert (
-            "chmod +r /var/snap/opensearch/current/etc/opensearch/certificates/app-admin.p12"
-            in run_cmd.call_args_list[1].args[0]
+        self.charm.opensearch.write_file.assert_called_with(
+            "/var/snap/opensearch/current/etc/opensearch/certificates/app-admin.p12", b"keystore"
         )
         assert (
             self.harness.get_relation_data(self.rel_id, "opensearch/0")["tls_ca_renewed"] == "True"
@@ -1337,10 +1356,13 @@ class TestOpenSearchTLS(unittest.TestCase):
         )
     )
     @patch("charms.opensearch.v0.opensearch_tls.OpenSearchTLS.reload_tls_certificates")
-    @patch("charms.opensearch.v0.opensearch_tls.run_cmd")
+    @patch("charms.opensearch.v0.opensearch_tls.OpenSearchTLS._read_store", return_value={})
+    @patch("charms.opensearch.v0.opensearch_tls.pkcs12_truststore", return_value=b"truststore")
+    @patch("charms.opensearch.v0.opensearch_tls.pkcs12_keystore", return_value=b"keystore")
     @patch(f"{PEER_CLUSTERS_MANAGER}.deployment_desc")
     # Mocks to avoid I/O
     @patch("charms.opensearch.v0.opensearch_tls.OpenSearchTLS._read_stored_ca")
+    @patch("charms.opensearch.v0.opensearch_tls.cert_issuer", return_value="CN=ca")
     @patch("charms.opensearch.v0.opensearch_tls.exists", return_value=True)
     @patch("opensearch.OpenSearchSnap.write_file")
     @patch("builtins.open", side_effect=unittest.mock.mock_open())
@@ -1356,9 +1378,12 @@ class TestOpenSearchTLS(unittest.TestCase):
         __,
         ___,
         _____,
+        cert_issuer,
         _read_stored_ca,
         deployment_desc,
-        run_cmd,
+        pkcs12_keystore,
+        pkcs12_truststore,
+        _read_store,
         reload_tls_certificates,
     ):
         """Test CA rotation 3rd stage -- *unit* certificate.
@@ -1460,6 +1485,12 @@ class TestOpenSearchTLS(unittest.TestCase):
             )
 
         reload_tls_certificates.side_effect = None
+        # the stores on disk hold the certificates issued by the new CA, and the old CA
+        _read_store.side_effect = lambda path, _: (
+            {"ca": ca, "old-ca": "old_ca"}
+            if path.endswith("/ca.p12")
+            else {path.split("/")[-1].removesuffix(".p12"): "cert"}
+        )
         mock_response_put_transport_cert("1.1.1.1")
         mock_response_put_http_cert("1.1.1.1")
         original_status = self.harness.model.unit.status
@@ -1469,21 +1500,21 @@ class TestOpenSearchTLS(unittest.TestCase):
         # Saving new cert, cleaning up CA renewal flag, removing old CA from keystore
         # Note: the high number of operations come from the fact that on each certificate received
         # the 'issuer' is checked on each certificate that is saved on the disk.
-        if self.charm.unit.is_leader():
-            assert run_cmd.call_count == 14
-        else:
-            assert run_cmd.call_count == 16
-
-        assert re.search(
-            "openssl pkcs12 -export .* -out "
-            f"/var/snap/opensearch/current/etc/opensearch/certificates/{cert_type}.p12 .* -name {cert_type}",
-            run_cmd.call_args_list[0].args[0],
+        pkcs12_keystore.assert_any_call(
+            alias=cert_type,
+            key=key,
+            cert=cert,
+            password=keystore_password,
+            key_password=None,
         )
-        assert (
-            f"chmod +r /var/snap/opensearch/current/etc/opensearch/certificates/{cert_type}.p12"
-            in run_cmd.call_args_list[1].args[0]
+        self.charm.opensearch.write_file.assert_any_call(
+            f"/var/snap/opensearch/current/etc/opensearch/certificates/{cert_type}.p12",
+            b"keystore",
+        )
+        pkcs12_truststore.assert_called_once_with({"ca": ca}, "truststore_12345")
+        self.charm.opensearch.write_file.assert_called_with(
+            "/var/snap/opensearch/current/etc/opensearch/certificates/ca.p12", b"truststore"
         )
-        assert re.search("keytool .*-delete .*-alias old-ca", run_cmd.call_args_list[-1].args[0])
 
         assert "tls_ca_renewing" not in self.harness.get_relation_data(self.rel_id, "opensearch/0")
         assert "tls_ca_renewed" not in self.harness.get_relation_data(self.rel_id, "opensearch/0")
@@ -1506,7 +1537,9 @@ class TestOpenSearchTLS(unittest.TestCase):
             )
         )
     )
-    @patch("charms.opensearch.v0.opensearch_tls.run_cmd")
+    @patch("charms.opensearch.v0.opensearch_tls.OpenSearchTLS._read_store", return_value={})
+    @patch("charms.opensearch.v0.opensearch_tls.pkcs12_truststore", return_value=b"truststore")
+    @patch("charms.opensearch.v0.opensearch_tls.pkcs12_keystore", return_value=b"keystore")
     @patch(f"{PEER_CLUSTERS_MANAGER}.deployment_desc")
     # Mock to avoid I/O
     @patch("charms.opensearch.v0.opensearch_tls.OpenSearchTLS._read_stored_ca")
@@ -1519,7 +1552,9 @@ class TestOpenSearchTLS(unittest.TestCase):
         _,
         _read_stored_ca,
         deployment_desc,
-        run_cmd,
+        pkcs12_keystore,
+        pkcs12_truststore,
+        _read_store,
     ):
         """Additional 'certificate-available' event while processing CA rotation.
 
@@ -1576,7 +1611,7 @@ class TestOpenSearchTLS(unittest.TestCase):
         self.charm.tls._on_certificate_available(event_mock)
 
         # No action taken, no change on status or certificates
-        assert run_cmd.call_count == 0
+        self.charm.opensearch.write_file.assert_not_called()
         assert self.harness.model.unit.status == original_status
         self.charm.on.certificate_available.defer.called_once()
         assert self.secret_store.get_object(Scope.APP, CertType.APP_ADMIN.val) == {
@@ -1600,7 +1635,9 @@ class TestOpenSearchTLS(unittest.TestCase):
             )
         )
     )
-    @patch("charms.opensearch.v0.opensearch_tls.run_cmd")
+    @patch("charms.opensearch.v0.opensearch_tls.OpenSearchTLS._read_store", return_value={})
+    @patch("charms.opensearch.v0.opensearch_tls.pkcs12_truststore", return_value=b"truststore")
+    @patch("charms.opensearch.v0.opensearch_tls.pkcs12_keystore", return_value=b"keystore")
     @patch(f"{PEER_CLUSTERS_MANAGER}.deployment_desc")
     # Mock to avoid I/O
     @patch("charms.opensearch.v0.opensearch_tls.OpenSearchTLS._read_stored_ca")
@@ -1613,7 +1650,9 @@ class TestOpenSearchTLS(unittest.TestCase):
         _,
         _read_stored_ca,
         deployment_desc,
-        run_cmd,
+        pkcs12_keystore,
+        pkcs12_truststore,
+        _read_store,
     ):
         """Additional 'certificate-available' event while processing CA rotation.
 
@@ -1675,7 +1714,7 @@ class TestOpenSearchTLS(unittest.TestCase):
         self.charm.tls._on_certificate_available(event_mock)
 
         # No action taken, no change on status or certificates
-        assert run_cmd.call_count == 0
+        self.charm.opensearch.write_file.assert_not_called()
         assert self.harness.model.unit.status == original_status
         self.charm.on.certificate_available.defer.called_once()
         assert self.secret_store.get_object(Scope.APP, CertType.APP_ADMIN.val) == {
@@ -1685,3 +1724,41 @@ class TestOpenSearchTLS(unittest.TestCase):
             "ca-cert": "old_ca_cert",
             "cert": "old_cert",
         }
+
+    @patch(f"{BASE_LIB_PATH}.opensearch_tls.OpenSearchTLS._tls_resources_stored")
+    def test_all_tls_resources_stored_cached(self, _tls_resources_stored):
+        """Test the verification of the stores is only repeated after they changed on disk."""
+        certs_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(certs_dir.cleanup)
+        self.charm.tls.certs_path = certs_dir.name
+        for name in ["ca", "unit-transport", "unit-http", "app-admin"]:
+            with open(f"{certs_dir.name}/{name}.p12", "wb") as f:
+                f.write(b"store")
+
+        _tls_resources_stored.return_value = True
+        self.assertTrue(self.charm.tls.all_tls_resources_stored())
+        self.assertTrue(self.charm.tls.all_tls_resources_stored())
+        _tls_resources_stored.assert_called_once()
+
+        # the unit resources are verified on their own
+        self.assertTrue(self.charm.tls.all_tls_resources_stored(only_unit_resources=True))
+        self.assertEqual(_tls_resources_stored.call_count, 2)
+
+        # a store rewritten outside the charm is verified again
+        with open(f"{certs_dir.name}/unit-http.p12", "wb") as f:
+            f.write(b"new store")
+        _tls_resources_stored.return_value = False
+        self.assertFalse(self.charm.tls.all_tls_resources_stored())
+        self.assertFalse(self.charm.tls.all_tls_resources_stored())
+        self.assertEqual(_tls_resources_stored.call_count, 4)
+
+        # the writes of the charm drop the cached results
+        _tls_resources_stored.return_value = True
+        self.assertTrue(self.charm.tls.all_tls_resources_stored())
+        self.charm.tls._invalidate_tls_checks()
+        self.assertTrue(self.charm.tls.all_tls_resources_stored())
+        self.assertEqual(_tls_resources_stored.call_count, 6)
+
+        os.remove(f"{certs_dir.name}/ca.p12")
+        _tls_resources_stored.return_value = False
+        self.assertFalse(self.charm.tls.all_tls_resources_stored())
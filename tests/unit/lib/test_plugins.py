@@ -2,21 +2,32 @@
 # See LICENSE file for licensing details.
 
 """Unit test for the opensearch_plugins library."""
+import io
+import os
+import tarfile
+import tempfile
 import unittest
 from unittest.mock import MagicMock, PropertyMock, call, patch
 
 import charms
 from charms.opensearch.v0.constants_charm import PeerRelationName
 from charms.opensearch.v0.opensearch_backups import OpenSearchBackupPlugin
-from charms.opensearch.v0.opensearch_exceptions import OpenSearchCmdError
+from charms.opensearch.v0.opensearch_exceptions import (
+    OpenSearchCmdError,
+    OpenSearchHttpError,
+)
 from charms.opensearch.v0.opensearch_health import HealthColors
 from charms.opensearch.v0.opensearch_internal_data import Scope
 from charms.opensearch.v0.opensearch_plugins import (
+    OpenSearchPerformanceAnalyzer,
     OpenSearchPlugin,
     OpenSearchPluginConfig,
+    OpenSearchPluginError,
     OpenSearchPluginInstallError,
     OpenSearchPluginMissingConfigError,
     OpenSearchPluginMissingDepsError,
+    OpenSearchPluginSettingsError,
+    OpenSearchQueryInsights,
     PluginState,
 )
 from ops.testing import Harness
@@ -129,6 +140,7 @@ class TestOpenSearchPlugin(unittest.TestCase):
         self.charm.health.apply = MagicMock(return_value=HealthColors.GREEN)
         self.charm.opensearch.version = "2.9.0"
         self.plugin_manager._is_cluster_ready = MagicMock(return_value=True)
+        self.plugin_manager._data_nodes_capacity = MagicMock(return_value=None)
 
     @patch("charms.opensearch.v0.opensearch_plugin_manager.OpenSearchPluginManager._is_enabled")
     @patch("charms.opensearch.v0.opensearch_plugin_manager.OpenSearchPluginManager._is_installed")
@@ -219,6 +231,11 @@ class TestOpenSearchPlugin(unittest.TestCase):
         self.plugin_manager.run = MagicMock(return_value=False)
         self.charm.opensearch_config.update_host_if_needed = MagicMock(return_value=False)
         self.charm.opensearch.is_started = MagicMock(return_value=True)
+        self.charm.opensearch_config.set_jvm_heap_and_gc = MagicMock(return_value=False)
+        self.charm.opensearch_config.set_performance_profile = MagicMock(return_value=False)
+        self.charm.opensearch_config.set_tls_protocols = MagicMock(return_value=False)
+        self.charm.opensearch_config.set_compression = MagicMock(return_value=False)
+        self.charm.opensearch_config.set_ml_thread_pools = MagicMock(return_value=False)
         self.plugin_manager.check_plugin_manager_ready = MagicMock(return_value=True)
         self.harness.update_config({})
         self.plugin_manager.run.assert_called()
@@ -270,7 +287,7 @@ class TestOpenSearchPlugin(unittest.TestCase):
         self.plugin_manager._install_if_needed = MagicMock(return_value=False)
         self.plugin_manager._disable_if_needed = MagicMock(return_value=False)
         self.assertTrue(self.plugin_manager.run())
-        self.plugin_manager._keystore._add.assert_has_calls([call("key1", "secret1")])
+        self.plugin_manager._keystore._add.assert_called_once_with({"key1": "secret1"})
         self.charm.opensearch.config.put.assert_has_calls(
             [call("opensearch.yml", "param", "tested")]
         )
@@ -351,7 +368,7 @@ class TestOpenSearchPlugin(unittest.TestCase):
         ]
         charms.opensearch.v0.opensearch_plugin_manager.logger = MagicMock()
         self.assertTrue(self.plugin_manager.run())
-        self.plugin_manager._keystore._add.assert_has_calls([call("key1", "secret1")])
+        self.plugin_manager._keystore._add.assert_called_once_with({"key1": "secret1"})
         self.charm.opensearch.config.put.assert_has_calls(
             [call("opensearch.yml", "param", "tested")]
         )
@@ -360,6 +377,187 @@ class TestOpenSearchPlugin(unittest.TestCase):
             [call("POST", "_nodes/reload_secure_settings")]
         )
 
+    @patch(
+        "charms.opensearch.v0.opensearch_plugin_manager.OpenSearchPluginManager._installed_plugins"
+    )
+    def test_install_missing_plugins_from_artifacts(self, mock_installed_plugins) -> None:
+        """Install the missing plugins at once, from the artifacts resource when available."""
+
+        class OtherTestPlugin(TestPlugin):
+            __test__ = False
+
+            @property
+            def name(self):
+                return "other-test"
+
+        charms.opensearch.v0.opensearch_plugin_manager.ConfigExposedPlugins = {
+            "test": {"class": TestPlugin, "config": "plugin_test", "relation": None},
+            "other-test": {"class": OtherTestPlugin, "config": "plugin_test", "relation": None},
+        }
+        mock_installed_plugins.return_value = ["test-plugin-dependency"]
+        self.charm.opensearch.run_bin = MagicMock(return_value="")
+
+        # resource with the archive of the "test" plugin only
+        resource = io.BytesIO()
+        with tarfile.open(fileobj=resource, mode="w:gz") as tar:
+            for name, content in [("plugins/test.zip", b"zip"), ("../README", b"text")]:
+                info = tarfile.TarInfo(name)
+                info.size = len(content)
+                tar.addfile(info, io.BytesIO(content))
+        self.harness.add_resource("plugin-artifacts", resource.getvalue())
+
+        with tempfile.TemporaryDirectory() as artifacts_path:
+            self.plugin_manager._artifacts_path = artifacts_path
+            self.plugin_manager._preload_plugin_artifacts()
+            self.assertEqual(sorted(os.listdir(artifacts_path)), [".resource", "test.zip"])
+
+            self.plugin_manager._snapshot = {}
+            self.assertTrue(self.plugin_manager._install_missing_plugins())
+            self.charm.opensearch.run_bin.assert_called_once_with(
+                "opensearch-plugin", f"install --batch file://{artifacts_path}/test.zip other-test"
+            )
+            self.assertTrue(self.plugin_manager._is_installed(self.plugin_manager.plugins[1]))
+
+            # nothing left to install
+            self.charm.opensearch.run_bin.reset_mock()
+            self.assertFalse(self.plugin_manager._install_missing_plugins())
+            self.charm.opensearch.run_bin.assert_not_called()
+
+    def test_preload_plugin_artifacts_invalid_resource(self) -> None:
+        """An empty or corrupt plugin-artifacts resource leaves the local cache untouched."""
+        self.harness.add_resource("plugin-artifacts", b"")
+
+        with tempfile.TemporaryDirectory() as root:
+            artifacts_path = f"{root}/plugin-artifacts"
+            os.makedirs(artifacts_path)
+            for name in ["test.zip", ".resource"]:
+                with open(f"{artifacts_path}/{name}", "w") as f:
+                    f.write("previous")
+            self.plugin_manager._artifacts_path = artifacts_path
+
+            # empty resource: nothing to extract
+            self.plugin_manager._preload_plugin_artifacts()
+            self.assertEqual(sorted(os.listdir(artifacts_path)), [".resource", "test.zip"])
+
+            # corrupt resource: nothing half-extracted, no staging directory left behind
+            with open(self.charm.model.resources.fetch("plugin-artifacts"), "wb") as f:
+                f.write(b"not a tarball")
+            self.plugin_manager._preload_plugin_artifacts()
+            self.assertEqual(os.listdir(root), ["plugin-artifacts"])
+            self.assertEqual(sorted(os.listdir(artifacts_path)), [".resource", "test.zip"])
+            with open(f"{artifacts_path}/.resource") as f:
+                self.assertEqual(f.read(), "previous")
+
+    def test_capacity_of_smallest_data_node(self) -> None:
+        """The plugins are sized after the smallest data node, the current node as fallback.
+
+        The native memory is the smallest of each node, not the smallest memory minus the
+        smallest heap across the nodes.
+        """
+        gb = 1024**3
+        del self.plugin_manager._data_nodes_capacity
+        self.plugin_manager._opensearch.request = MagicMock(
+            side_effect=[
+                {
+                    "nodes": {
+                        "a": {
+                            "os": {"mem": {"total_in_bytes": 32 * gb}},
+                            "jvm": {"mem": {"heap_max_in_bytes": 28 * gb}},
+                        },
+                        "b": {
+                            "os": {"mem": {"total_in_bytes": 16 * gb}},
+                            "jvm": {"mem": {"heap_max_in_bytes": 8 * gb}},
+                        },
+                    }
+                },
+                {
+                    "nodes": {
+                        "a": {"os": {"allocated_processors": 4}},
+                        "b": {"os": {"allocated_processors": 8}},
+                    }
+                },
+            ]
+        )
+        self.assertEqual(
+            self.plugin_manager._capacity(),
+            {"node-native-memory": 4 * gb, "node-processors": 4},
+        )
+        # read once per hook
+        self.plugin_manager._capacity()
+        self.assertEqual(self.plugin_manager._opensearch.request.call_count, 2)
+
+        # cluster unreachable
+        self.plugin_manager._node_capacity = None
+        self.plugin_manager._opensearch.request = MagicMock(side_effect=OpenSearchHttpError())
+        self.plugin_manager._opensearch.memory_limit = MagicMock(return_value=4 * gb)
+        self.plugin_manager._opensearch.cpu_limit = MagicMock(return_value=2)
+        self.assertEqual(
+            self.plugin_manager._capacity(),
+            {"node-native-memory": 2 * gb, "node-processors": 2},
+        )
+
+    @patch("charms.opensearch.v0.opensearch_plugin_manager.ClusterTopology.get_cluster_settings")
+    def test_apply_dynamic_and_static_config(self, mock_get_cluster_settings) -> None:
+        """Dynamic settings are applied live, only static ones require a restart."""
+        mock_get_cluster_settings.return_value = {"static.param": "tested"}
+        self.plugin_manager._opensearch.request = MagicMock(return_value={"acknowledged": True})
+        self.plugin_manager._opensearch_config.add_plugin = MagicMock()
+
+        config = OpenSearchPluginConfig(
+            config_entries_to_add={"static.param": "tested", "dynamic.param": "tested"},
+            dynamic_config_entries=["dynamic.param"],
+        )
+        self.assertFalse(self.plugin_manager.apply_config(config))
+        self.plugin_manager._opensearch.request.assert_called_once_with(
+            "PUT", "/_cluster/settings", {"persistent": {"dynamic.param": "tested"}}
+        )
+        self.plugin_manager._opensearch_config.add_plugin.assert_not_called()
+
+        # the dynamic setting is now up-to-date, the static one changes
+        self.plugin_manager._opensearch.request.reset_mock()
+        config.config_entries_to_add["static.param"] = "changed"
+        self.assertTrue(self.plugin_manager.apply_config(config))
+        self.plugin_manager._opensearch.request.assert_not_called()
+        self.plugin_manager._opensearch_config.add_plugin.assert_called_once_with(
+            {"static.param": "changed"}
+        )
+
+    @patch("charms.opensearch.v0.opensearch_plugin_manager.ClusterTopology.get_cluster_settings")
+    def test_rejected_dynamic_settings_fail_own_plugin(self, mock_get_cluster_settings) -> None:
+        """Settings rejected by the cluster only fail their own plugin, the others proceed."""
+        mock_get_cluster_settings.return_value = {}
+        self.plugin_manager._opensearch.request = MagicMock(side_effect=OpenSearchHttpError())
+        config = OpenSearchPluginConfig(
+            config_entries_to_add={"dynamic.param": "tested"},
+            dynamic_config_entries=["dynamic.param"],
+        )
+        with self.assertRaises(OpenSearchPluginSettingsError):
+            self.plugin_manager.apply_config(config)
+
+        class OtherTestPlugin(TestPlugin):
+            __test__ = False
+
+            @property
+            def name(self):
+                return "other-test"
+
+        charms.opensearch.v0.opensearch_plugin_manager.ConfigExposedPlugins = {
+            "test": {"class": TestPlugin, "config": "plugin_test", "relation": None},
+            "other-test": {"class": OtherTestPlugin, "config": "plugin_test", "relation": None},
+        }
+        self.plugin_manager.status = MagicMock(return_value=PluginState.INSTALLED)
+        self.plugin_manager._install_if_needed = MagicMock(return_value=False)
+        self.plugin_manager._disable_if_needed = MagicMock(return_value=False)
+        self.plugin_manager._remove_if_needed = MagicMock(return_value=False)
+        self.plugin_manager._configure_if_needed = MagicMock(
+            side_effect=[OpenSearchPluginSettingsError("rejected"), False]
+        )
+        with self.assertRaises(OpenSearchPluginError) as e:
+            self.plugin_manager._run()
+        self.assertEqual(str(e.exception), "rejected")
+        self.assertEqual(self.plugin_manager._configure_if_needed.call_count, 2)
+        self.assertEqual(self.plugin_manager._remove_if_needed.call_count, 1)
+
     @patch("charms.opensearch.v0.opensearch_plugin_manager.ClusterTopology.get_cluster_settings")
     @patch("charms.opensearch.v0.opensearch_plugin_manager.OpenSearchPluginManager._extra_conf")
     @patch("charms.opensearch.v0.opensearch_plugin_manager.OpenSearchPluginManager._is_enabled")
@@ -416,6 +614,106 @@ class TestOpenSearchPlugin(unittest.TestCase):
         self.plugin_manager._keystore._add.assert_not_called()
         self.plugin_manager._keystore._delete.assert_called()
         self.plugin_manager._opensearch_config.delete_plugin.assert_has_calls([call(["param"])])
+        # the installed plugins are listed once for the whole run
+        mock_installed_plugins.assert_called_once()
+
+
+class TestOpenSearchPerformanceAnalyzer(unittest.TestCase):
+    def test_config(self) -> None:
+        """The plugin, RCA and batch metrics are toggled through a dynamic cluster setting."""
+        plugin = OpenSearchPerformanceAnalyzer("tests/unit/resources", extra_config={})
+        self.assertEqual(plugin.name, "opensearch-performance-analyzer")
+        self.assertEqual(
+            plugin.config().config_entries_to_add, {"cluster.metadata.perf_analyzer.state": "11"}
+        )
+        self.assertEqual(
+            plugin.disable().config_entries_to_add, {"cluster.metadata.perf_analyzer.state": "0"}
+        )
+        self.assertEqual(
+            plugin.config().dynamic_config_entries, ["cluster.metadata.perf_analyzer.state"]
+        )
+
+
+class TestOpenSearchQueryInsights(unittest.TestCase):
+    def setUp(self) -> None:
+        self.harness = Harness(OpenSearchOperatorCharm)
+        self.addCleanup(self.harness.cleanup)
+        self.harness.begin()
+        self.charm = self.harness.charm
+
+    def test_config(self) -> None:
+        """The top queries settings are dynamic, set for the requested metrics only."""
+        plugin = OpenSearchQueryInsights(
+            "tests/unit/resources",
+            extra_config={
+                "query_insights_metrics": "latency, cpu",
+                "query_insights_top_n_size": 20,
+                "query_insights_window_size": "10m",
+            },
+        )
+        config = plugin.config()
+        self.assertEqual(
+            config.config_entries_to_add,
+            {
+                "search.insights.top_queries.latency.enabled": "true",
+                "search.insights.top_queries.latency.top_n_size": "20",
+                "search.insights.top_queries.latency.window_size": "10m",
+                "search.insights.top_queries.cpu.enabled": "true",
+                "search.insights.top_queries.cpu.top_n_size": "20",
+                "search.insights.top_queries.cpu.window_size": "10m",
+                "search.insights.top_queries.memory.enabled": "false",
+            },
+        )
+        self.assertEqual(config.dynamic_config_entries, list(config.config_entries_to_add))
+        self.assertEqual(
+            set(plugin.disable().config_entries_to_add.values()),
+            {"false"},
+        )
+
+        with self.assertRaises(KeyError):
+            OpenSearchQueryInsights("tests/unit/resources", extra_config={}).config()
+
+        # invalid values are rejected before reaching the cluster
+        for option, value in [
+            ("query_insights_metrics", "latency, io"),
+            ("query_insights_metrics", ""),
+            ("query_insights_top_n_size", 0),
+            ("query_insights_top_n_size", 101),
+            ("query_insights_window_size", "2m"),
+            ("query_insights_window_size", "25h"),
+        ]:
+            plugin._extra_config = {
+                "query_insights_metrics": "latency",
+                "query_insights_top_n_size": 10,
+                "query_insights_window_size": "1h",
+                option: value,
+            }
+            with self.assertRaises(OpenSearchPluginMissingConfigError) as e:
+                plugin.config()
+            self.assertIn(option, str(e.exception))
+
+    def test_get_top_queries_action(self) -> None:
+        """The action returns the top queries of the requested metric."""
+        event = MagicMock()
+        event.params = {"metric": "cpu"}
+        self.charm.opensearch.is_node_up = MagicMock(return_value=True)
+        self.charm.opensearch.request = MagicMock(
+            return_value={"top_queries": [{"source": {"size": 10}, "measurements": {}}]}
+        )
+
+        self.charm._on_get_top_queries_action(event)
+        event.fail.assert_called_once()
+
+        with self.harness.hooks_disabled():
+            self.harness.update_config({"plugin_query_insights": True})
+        event.reset_mock()
+        self.charm._on_get_top_queries_action(event)
+        self.charm.opensearch.request.assert_called_once_with(
+            "GET", "/_insights/top_queries?type=cpu"
+        )
+        event.set_results.assert_called_once_with(
+            {"top-queries": '[{"source": {"size": 10}, "measurements": {}}]'}
+        )
 
 
 class TestOpenSearchBackupPlugin(unittest.TestCase):